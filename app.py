@@ -1,17 +1,31 @@
+import time
+# Início do rerun (no primeiro rerun do processo inclui as importações abaixo: cold start)
+_inicio_rerun = time.perf_counter()
+
 import streamlit as st
-from google import genai
 from urllib.parse import quote
-from dotenv import load_dotenv
 import os
-import time 
-from services import SaaSLogger, supabase
-from auth import tela_login, logout
+import functools
+from services import SaaSLogger, audit_writer, search_index, HISTORY_SEED_LIMIT
+from search import SEARCH_MAX_PER_USER
+from auth import tela_login, logout, restore_session, sync_session_cookie
+from llm import client_health
+from resilience import circuit_stats
+from cache import translation_cache
+from pipeline import gerar_com_credito, geracoes_em_andamento, MissingApiKeyError
+from history import history_cache
+from credits import free_credit_status
+from similarity import near_duplicate_index
+from batch import parse_batch, run_batch, results_to_csv, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS
+from metrics import metrics
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from urllib.parse import quote, urlencode
 
-# Carrega variáveis de ambiente
-load_dotenv()
+# O .env é carregado uma vez por processo, na importação de services/llm (não a cada rerun)
+
+# Rastro das etapas medidas neste rerun (painel de admin)
+metrics.start_trace(_inicio_rerun)
 
 # =============================
 # 1. Configuração Inicial e CSS
@@ -169,6 +183,24 @@ details summary svg {
 .whatsapp-btn:hover {
     transform: scale(1.02);
 }
+
+/* -------------------- PLACEHOLDERS -------------------- */
+input::placeholder {
+    color: #AAAAAA !important;
+    opacity: 1;
+}
+input::-moz-placeholder {
+    color: #AAAAAA !important;
+    opacity: 1;
+}
+input:-ms-input-placeholder {
+    color: #AAAAAA !important;
+}
+
+/* -------------------- HISTÓRICO -------------------- */
+details summary {
+    color: black !important;
+}
 </style>
 """, unsafe_allow_html=True)
 
@@ -203,7 +235,10 @@ if "tela" not in st.session_state:
 # 2. Autenticação (Porteiro)
 # =============================
 if "user_id" not in st.session_state:
-    st.session_state.user_id = None
+    # Reload/reconexão: tenta o cookie de sessão assinado antes de pedir login
+    st.session_state.user_id = restore_session()
+
+sync_session_cookie()
 
 if st.session_state.user_id is None:
     usuario_autenticado = tela_login() # Chama tela de login se não tiver user
@@ -216,10 +251,18 @@ if st.session_state.user_id is None:
 # 3. Lógica do App
 # =============================
 
+# Contagem de consultas ao banco deste rerun (painel de admin)
+SaaSLogger.reset_db_roundtrips()
+
+USER_ID_ATUAL = st.session_state.user_id
+INTERACOES_MAX = 10
+
 # Callbacks e Estado
 def limpar_tudo():
     st.session_state.mensagem_final = ""
     st.session_state.texto_processo = ""
+    # O campo de texto fica em outro fragmento: pede um rerun completo para ele aparecer vazio
+    st.session_state.rerun_completo = True
 
 if "mensagem_final" not in st.session_state:
     st.session_state.mensagem_final = ""
@@ -227,95 +270,123 @@ if "mensagem_final" not in st.session_state:
 if "texto_processo" not in st.session_state:
     st.session_state.texto_processo = ""
 
-# Interface Principal
-st.markdown("<h1>TraduzJur</h1>", unsafe_allow_html=True)
-st.markdown("<p class='caption-text'>Converta juridiquês em mensagens claras e envie para o cliente.</p>", unsafe_allow_html=True)
-
-st.markdown("""
-<style>
-        input::placeholder {
-            color: #AAAAAA !important;
-            opacity: 1;
-        }
-        input::-moz-placeholder {
-            color: #AAAAAA !important;
-            opacity: 1;
-        }
-        input:-ms-input-placeholder {
-            color: #AAAAAA !important;
-        }
-        </style>
-""", unsafe_allow_html=True)
-
-nome_cliente = st.text_input("Nome do Cliente", placeholder="Ex: Sr. João")
-
-# --- SIDEBAR ---
-with st.sidebar:
-    USER_ID_ATUAL = st.session_state.user_id
-
-    # Busca dados no Supabase
-    try:
-        dados = supabase.table("profiles").select("credits_balance, plan_status").eq("id", USER_ID_ATUAL).execute()
-        if dados.data:
-            info = dados.data[0]
-        else:
-            info = {"plan_status": "free", "credits_balance": 0} 
-    except:
-        info = {"plan_status": "erro", "credits_balance": 0}
-
-    with st.sidebar:
-        USER_ID_ATUAL = st.session_state.user_id
-
-        # ---------------------------------------------------------
-        # 1. BUSCA DADOS INICIAIS
-        # ---------------------------------------------------------
-        try:
-            dados = supabase.table("profiles").select("*").eq("id", USER_ID_ATUAL).execute()
-            info = dados.data[0] if dados.data else {"plan_status": "free", "credits_balance": 0, "last_credit_reset": None}
-        except:
-            info = {"plan_status": "free", "credits_balance": 0, "last_credit_reset": None}
-
-        # ---------------------------------------------------------
-        # 2. VERIFICAÇÃO DE RESET (CRÍTICO PARA O TEMPO APARECER CERTO)
-        # ---------------------------------------------------------
+if "interacoes" not in st.session_state:
+    st.session_state.interacoes = []
+
+# Interação desta execução completa do script (os fragmentos chamados abaixo se registram nela)
+st.session_state.rodada_atual = {"escopo": "app", "fragmentos": {}, "db": 0, "em_andamento": True}
+st.session_state.interacoes = (st.session_state.interacoes + [st.session_state.rodada_atual])[-INTERACOES_MAX:]
+
+
+def _registrar_fragmento(nome, consultas):
+    rodada = st.session_state.rodada_atual
+    if not rodada["em_andamento"]:
+        # Interação que reexecutou só este fragmento (o resto da página não rodou)
+        rodada = {"escopo": "fragmento", "fragmentos": {}, "db": 0, "em_andamento": False}
+        st.session_state.interacoes = (st.session_state.interacoes + [rodada])[-INTERACOES_MAX:]
+    rodada["fragmentos"][nome] = consultas
+    rodada["db"] += consultas
+
+
+def fragmento(nome):
+    """
+    st.fragment que mede cada execução: tempo ('fragmento.<nome>'), consultas ao banco
+    e registro na lista de interações do painel de admin.
+    """
+    def decorator(func):
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            antes = SaaSLogger.db_roundtrips()
+            try:
+                with metrics.timer(f"fragmento.{nome}"):
+                    func(*args, **kwargs)
+            finally:
+                # Registra também quando o fragmento termina com st.rerun()
+                consultas = SaaSLogger.db_roundtrips() - antes
+                _registrar_fragmento(nome, consultas)
+            if st.session_state.perfil["plan_status"] == "admin":
+                st.caption(f"🔁 {nome} · {consultas} consulta(s) ao banco")
+        return wrapper
+    return decorator
+
+
+# --- SIDEBAR: CONTA ---
+@fragmento("conta")
+def painel_conta(user_id):
+    # ---------------------------------------------------------
+    # 1. BUSCA DADOS INICIAIS (perfil em cache curto, 1 consulta no máximo)
+    # ---------------------------------------------------------
+    info = SaaSLogger.get_profile(user_id) or {"plan_status": "free", "credits_balance": 0, "last_credit_reset": None}
+
+    # ---------------------------------------------------------
+    # 2. RENOVAÇÃO DO FREE: só leitura. O job (main.py reset-credits) grava o reset em lote;
+    #    ciclo vencido que ele ainda não pegou já aparece renovado (o reserve_credit grava)
+    # ---------------------------------------------------------
+    creditos = free_credit_status(info) if info["plan_status"] == "free" else None
+
+    # Os outros fragmentos leem o plano daqui (sem consultar o banco de novo)
+    st.session_state.perfil = info
+
+    # ---------------------------------------------------------
+    # 3. VISUALIZAÇÃO (SEU CÓDIGO AQUI)
+    # ---------------------------------------------------------
+    with st.expander("👤 Minha Conta", expanded=True):
+        st.write(f"**Email:** {user_id}")
+        
+        # Define cor do status
+        status_color = "green" if info['plan_status'] != 'free' else "orange"
+        
+        # Se for Free, mostra saldo e tempo
         if info["plan_status"] == "free":
-            SaaSLogger.refresh_free_credits_if_needed(USER_ID_ATUAL)
-            dados_refresh = supabase.table("profiles").select("*").eq("id", USER_ID_ATUAL).execute()
-            if dados_refresh.data:
-                info = dados_refresh.data[0]
-
-        # ---------------------------------------------------------
-        # 3. VISUALIZAÇÃO (SEU CÓDIGO AQUI)
-        # ---------------------------------------------------------
-        with st.expander("👤 Minha Conta", expanded=True):
-            st.write(f"**Email:** {USER_ID_ATUAL}")
-            
-            # Define cor do status
-            status_color = "green" if info['plan_status'] != 'free' else "orange"
-            
-            # Se for Free, mostra saldo e tempo
-            if info["plan_status"] == "free":
-                st.write(f"**Plano:** Gratuito")
-                st.write(f"**Créditos:** {info['credits_balance']}")
-                
-                last_reset = info.get("last_credit_reset")
-                reset_em = SaaSLogger.time_until_next_reset(last_reset)
-
-                if info['credits_balance'] == 0:
+            st.write(f"**Plano:** Gratuito")
+            st.write(f"**Créditos:** {creditos['balance']}")
+
+            if creditos["due"]:
+                st.caption("🔄 Créditos do dia renovados")
+            else:
+                reset_em = SaaSLogger.time_until_next_reset(info.get("last_credit_reset"))
+                if creditos["balance"] == 0:
                     st.warning(f"⏳ Renova **{reset_em}**")
                 else:
                     st.caption(f"🔄 Renova **{reset_em}**")
 
-            # Para o plano Pro
-            elif info["plan_status"] == "pro_monthly":
-                st.write(f"**Plano:** Premium")
-                # Adicione aqui outras informações específicas do plano Premium se necessário
-                st.success("✅ Plano Premium ativo")
+        # Para o plano Pro
+        elif info["plan_status"] == "pro_monthly":
+            st.write(f"**Plano:** Premium")
+            # Adicione aqui outras informações específicas do plano Premium se necessário
+            st.success("✅ Plano Premium ativo")
+
+        elif info["plan_status"] == "admin":
+            stats = translation_cache.stats()
+            st.caption(
+                f"🗄️ Cache: {stats['hits_memory'] + stats['hits_disk']} hits / "
+                f"{stats['misses']} misses ({stats['hit_rate']:.0%})"
+            )
+            saude = client_health()
+            st.caption(
+                f"🔌 Gemini: {'ativo' if saude['active'] else 'inativo'} · "
+                f"{saude['uses']} usos · {saude['resets']} resets"
+            )
+            agrupados = geracoes_em_andamento.stats()
+            st.caption(
+                f"🔗 Pedidos idênticos: {agrupados['coalesced']} agrupados · "
+                f"{agrupados['in_flight']} em andamento"
+            )
+            circuitos = circuit_stats()
+            if circuitos:
+                st.caption("⚡ Circuitos: " + " · ".join(f"{modelo} {c['state']}" for modelo, c in circuitos.items()))
+            fila = audit_writer.stats()
+            st.caption(
+                f"📝 Auditoria: fila {fila['queue_depth']} · {fila['flushed']} gravados · "
+                f"{fila['spooled']} em spool · {fila['dropped']} descartados · "
+                f"último flush {fila['last_flush_ms']:.0f} ms"
+            )
 
     if info["plan_status"] == "free":
         
         stripe_link_base = os.getenv("LINK_STRIPE")    
-        link_final = f"{stripe_link_base}?client_reference_id={USER_ID_ATUAL}"
+        link_final = f"{stripe_link_base}?client_reference_id={user_id}"
 
         st.markdown(f"""
         <a href="{link_final}" target="_blank" style="text-decoration:none;">
@@ -336,133 +407,132 @@ with st.sidebar:
         </a>
         """, unsafe_allow_html=True)
 
+
+# --- SIDEBAR: CONFIGURAÇÃO ---
+@fragmento("configuracao")
+def painel_configuracao():
     st.markdown("<h2 style='color: black; margin-bottom: 10px;'>Configuração</h2>", unsafe_allow_html=True)
 
-    tipo_andamento = st.selectbox(
+    st.selectbox(
         "Tipo de documento:",
-        ["Despacho", "Decisão", "Intimação / Prazo", "Juntada", "Sentença"]
+        ["Despacho", "Decisão", "Intimação / Prazo", "Juntada", "Sentença"],
+        key="tipo_andamento"
     )
 
     st.write("Tom da mensagem:")
-    tom_de_voz = st.radio(
+    st.radio(
         "Tom da mensagem:",
         ["Empático", "Formal", "Direto"],
         horizontal=True,
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key="tom_de_voz"
     )
+
+    st.toggle("⚡ Mostrar resposta enquanto é gerada", value=True, key="modo_streaming")
     
     if st.button("🚪 Sair", key="btn_logout_sidebar"):
         logout()
 
-# --- ÁREA CENTRAL ---
-texto_input = st.text_area(
-    "Cole APENAS O DISPOSTIVO DO PROCESSO:",
-    height=200,
-    key="texto_processo",
-    placeholder="Ex: Certifico e dou fé que, em cumprimento ao r. despacho de fls..."
-)
 
-# Botão Principal de Ação
-if st.button("✨ GERAR EXPLICAÇÃO", type="primary"):
-    
-    # Validação
-    if not st.session_state.texto_processo.strip():
-        st.warning("⚠️ Por favor, cole o texto do processo primeiro.")
+# --- ÁREA CENTRAL: ENTRADA ---
+@fragmento("entrada")
+def formulario_entrada(user_id):
+    info = st.session_state.perfil
+    tipo_andamento = st.session_state.tipo_andamento
+    tom_de_voz = st.session_state.tom_de_voz
+
+    nome_cliente = st.text_input("Nome do Cliente", placeholder="Ex: Sr. João", key="nome_cliente")
+
+    st.text_area(
+        "Cole APENAS O DISPOSTIVO DO PROCESSO:",
+        height=200,
+        key="texto_processo",
+        placeholder="Ex: Certifico e dou fé que, em cumprimento ao r. despacho de fls..."
+    )
+
+    # Andamento quase igual a um já traduzido: oferece a tradução anterior na hora
+    if st.session_state.texto_processo.strip():
+        # Semeia só com as gerações mais recentes (não baixa a janela inteira do histórico)
+        near_duplicate_index.ensure_user(
+            user_id,
+            lambda: SaaSLogger.get_history(user_id, info["plan_status"], limit=HISTORY_SEED_LIMIT)
+        )
+        parecido = near_duplicate_index.find(user_id, st.session_state.texto_processo, tipo_andamento, tom_de_voz)
+        if parecido:
+            st.info(
+                f"♻️ Você já traduziu um andamento {parecido['similarity']:.0%} parecido com este. "
+                "Pode usar a tradução anterior como base (revise datas, nomes e números)."
+            )
+            if st.button("♻️ Usar tradução anterior"):
+                SaaSLogger.log_event(user_id, "near_duplicate_reused", f"similarity={parecido['similarity']:.2f}")
+                st.session_state.mensagem_final = parecido["output_text"]
+                st.rerun()
+
+    # Botão Principal de Ação
+    if st.button("✨ GERAR EXPLICAÇÃO", type="primary"):
         
-    else:
-        if not SaaSLogger.check_can_generate(USER_ID_ATUAL):
-             st.error("🔒 Seus créditos acabaram! Faça o upgrade para continuar.")
-             
+        # Validação
+        if not st.session_state.texto_processo.strip():
+            st.warning("⚠️ Por favor, cole o texto do processo primeiro.")
+            
         else:
-            api_key = os.getenv("GOOGLE_API_KEY")
-            if not api_key:
+            try:
+                # Reserva o crédito e gera; um pedido idêntico já em andamento (duplo clique,
+                # outra aba) é reaproveitado, sem nova chamada ao Gemini nem novo débito
+                if st.session_state.modo_streaming:
+                    # Renderiza a mensagem na página conforme os pedaços chegam
+                    area_streaming = st.empty()
+
+                    def mostrar_parcial(texto):
+                        with area_streaming.container():
+                            st.markdown("<h2 style='color: black; margin-bottom: 10px;'>Gerando mensagem...</h2>", unsafe_allow_html=True)
+                            st.markdown(texto)
+
+                    reserva, resultado, _ = gerar_com_credito(
+                        user_id,
+                        st.session_state.texto_processo,
+                        tipo_andamento,
+                        tom_de_voz,
+                        nome_cliente,
+                        on_text=mostrar_parcial
+                    )
+                else:
+                    with st.spinner("Analisando processo..."):
+                        reserva, resultado, _ = gerar_com_credito(
+                            user_id,
+                            st.session_state.texto_processo,
+                            tipo_andamento,
+                            tom_de_voz,
+                            nome_cliente
+                        )
+
+            except MissingApiKeyError:
                 st.error("Erro interno: API Key não configurada.")
+
+            except Exception as e:
+                SaaSLogger.log_event(user_id, "error_api", str(e))
+                st.error(f"Erro ao processar: {e}")
+
             else:
-                try:
-                    start_time = time.time()
-                    client = genai.Client(api_key=api_key)
-                    MODEL_NAME = "gemini-2.5-flash" 
-                    
-                    prompt = f"""
-                    Você é um advogado experiente traduzindo um andamento processual
-                    para um cliente leigo no WhatsApp.
-                    
-                    DADOS:
-                    - Tipo: {tipo_andamento}
-                    - Cliente: {nome_cliente if nome_cliente else 'Cliente'}
-                    - Tom: {tom_de_voz}
-                    - Texto Original: \"\"\"{st.session_state.texto_processo}\"\"\"
-
-                    REGRAS DE OURO:
-                    1. Traduza termos técnicos jurídicos para linguagem simples.
-                       - Se necessário, explique brevemente entre parênteses.
-                       - Ex: "conclusos" → "o processo foi enviado ao juiz para decisão".
-
-                    2. Se houver PRAZO ou DATA IMPORTANTE:
-                       - Destaque APENAS o prazo usando negrito com uma única estrela.
-                       - Exemplo correto: *15 dias*
-                       - Não use negrito para mais nada.
-
-                    3. Adote um tom:
-                       - Calmo, profissional e tranquilizador.
-                       - Nunca prometa resultado ou vitória no processo.
-
-                    4. Use parágrafos curtos e frases diretas.
-                       - Evite blocos longos de texto.
-                       - Priorize clareza em vez de formalidade.
-
-                    5. Se o nome do cliente não estiver informado:
-                       - Utilize o termo “Cliente”.
-
-                    6. Escreva como se estivesse explicando para alguém sem conhecimento jurídico.
-                    7. Coloque apenas dois arestisticos. Exemplo ("Olá, *Cliente*")
-                    8. Nunca coloque as respostas como vitória ou derrota processual, apenas como andamento.
-                    9. Leve muito em consideração o tom de voz passado.
-
-                    FORMATO DE SAÍDA (obrigatório):
-                    - 📌 O que aconteceu: resumo em **1 frase simples**, sem termos técnicos.
-                    - 📅 Prazos/Datas: informe apenas se houver prazo ou data relevante.
-                    - 👉 Próximo passo: explique claramente o que será feito a seguir e por quem.
-
-                    """
+                if reserva["reason"] == "rate_limit":
+                     st.error("⏳ Muitas requisições em pouco tempo. Aguarde alguns minutos.")
 
-                    with st.spinner("Analisando processo..."):
-                        response = client.models.generate_content(
-                            model=MODEL_NAME, 
-                            contents=prompt
-                        )
-                        
-                        end_time = time.time()
-                        duration = end_time - start_time
-                        usage = response.usage_metadata
-                        t_in = usage.prompt_token_count if usage else 0
-                        t_out = usage.candidates_token_count if usage else 0
-                        
-                        SaaSLogger.log_generation(
-                            user_id=USER_ID_ATUAL,
-                            input_text=st.session_state.texto_processo,
-                            output_text=response.text,
-                            model=MODEL_NAME,
-                            tokens_in=t_in,
-                            tokens_out=t_out,
-                            time_taken=duration
-                        )
-                        
-                        # Desconta Crédito
-                        SaaSLogger.debit_credit(USER_ID_ATUAL)
+                elif resultado is None:
+                     st.error("🔒 Seus créditos acabaram! Faça o upgrade para continuar.")
 
-                        st.session_state.mensagem_final = response.text
-                        st.rerun() 
+                else:
+                    # Só publica a mensagem depois que o stream terminou
+                    # (rerun completo: saldo na conta, resultado e histórico mudam juntos)
+                    st.session_state.mensagem_final = resultado["text"]
+                    st.rerun() 
 
-                except Exception as e:
-                    SaaSLogger.log_event(USER_ID_ATUAL, "error_api", str(e))
-                    st.error(f"Erro ao processar: {e}")
 
-tab_traducao, tab_historico = st.tabs(
-    ["📝 Tradução", "📜 Histórico"]
-)
 # --- RESULTADO ---
-with tab_traducao:
+@fragmento("resultado")
+def painel_resultado():
+    if st.session_state.pop("rerun_completo", False):
+        st.rerun()
+
     if st.session_state.mensagem_final:
         st.markdown("<h2 style='color: black; margin-bottom: 10px;'>Mensagem Pronta</h2>", unsafe_allow_html=True)
 
@@ -516,7 +586,13 @@ with tab_traducao:
             on_click=limpar_tudo,
             use_container_width=True
         )
-with tab_historico:
+
+
+# --- HISTÓRICO ---
+@fragmento("historico")
+def painel_historico(user_id):
+    info = st.session_state.perfil
+
     st.markdown("<h2 style='color: black; margin-bottom: 10px;'>Histórico de Traduções</h2>", unsafe_allow_html=True)
 
     if info["plan_status"] == "free":
@@ -524,28 +600,45 @@ with tab_historico:
     else:
         st.success("💎 Plano Premium: Visualizando histórico completo do mês.")
 
-    if st.button("🔄 Atualizar Histórico"):
-        st.rerun()
+    busca = st.text_input("🔎 Buscar no histórico", placeholder="Ex: audiência, prazo, penhora...")
+
+    if busca.strip():
+        # Índice semeado uma vez por usuário com a janela do plano (em páginas); depois só recebe as novas
+        search_index.ensure_user(
+            user_id,
+            lambda before, limit: SaaSLogger.get_history(user_id, info["plan_status"], limit=limit, before=before)
+        )
+        resultados, tempo_ms = search_index.search(
+            user_id,
+            busca,
+            since=SaaSLogger.history_window_start(info["plan_status"])
+        )
+        if search_index.is_partial(user_id):
+            st.caption(
+                f"{len(resultados)} resultado(s) em {tempo_ms:.1f} ms · "
+                f"busca só nas {SEARCH_MAX_PER_USER} gerações mais recentes do período"
+            )
+        else:
+            st.caption(f"{len(resultados)} resultado(s) em {tempo_ms:.1f} ms")
 
-    historico = SaaSLogger.get_history(
-        USER_ID_ATUAL,
-        info["plan_status"]
+        tz_sp = ZoneInfo("America/Sao_Paulo")
+        for resultado in resultados:
+            data_formatada = datetime.fromisoformat(resultado["created_at"]).astimezone(tz_sp).strftime("%d/%m/%Y %H:%M")
+            with st.expander(f"🔎 {data_formatada}"):
+                st.markdown(resultado["trecho"])
+                st.code(resultado["output_text"], language=None)
+
+        st.divider()
+
+    # Cache por usuário: primeira página uma vez, depois só os itens novos
+    historico, tem_mais = history_cache.get(
+        user_id,
+        info["plan_status"],
+        refresh=st.button("🔄 Atualizar Histórico")
     )
-    st.markdown("""
-    <style>
-    /* Setinha (arrow) do expander */
-    details summary svg {
-        fill: black !important;
-        stroke: black !important;
-    }
-
-    /* Texto do título do expander */
-    details summary {
-        color: black !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
 
+    if "historico_textos" not in st.session_state:
+        st.session_state.historico_textos = {}
 
     if not historico:
         st.write("Nenhum histórico encontrado para o período.")
@@ -557,6 +650,7 @@ with tab_historico:
             data_utc = datetime.fromisoformat(item["created_at"])
             data_sp = data_utc.astimezone(tz_sp)
             data_formatada = data_sp.strftime("%d/%m/%Y %H:%M")
+            textos = st.session_state.historico_textos.get(item["id"])
 
             with st.expander(f"📅 {data_formatada}"):
                 st.markdown(
@@ -564,6 +658,7 @@ with tab_historico:
                     unsafe_allow_html=True
                 )
 
+                preview = item["input_preview"] or ""
                 st.markdown(
                     f"""
                     <p style="
@@ -573,7 +668,7 @@ with tab_historico:
                         white-space: pre-wrap;
                         margin: 0;
                     ">
-                        {item["input_text"][:150] + "..." if len(item["input_text"]) > 150 else item["input_text"]}
+                        {preview + "..." if len(preview) >= 150 else preview}
                     </p>
                     """,
                     unsafe_allow_html=True
@@ -584,4 +679,148 @@ with tab_historico:
                     unsafe_allow_html=True
                 )
 
-                st.code(item["output_text"], language=None)
\ No newline at end of file
+                if textos:
+                    st.code(textos["output_text"], language=None)
+                elif st.button("👁️ Ver tradução", key=f"historico_ver_{item['id']}"):
+                    # Texto completo só é baixado quando o item é aberto
+                    textos = SaaSLogger.get_history_item(user_id, item["id"])
+                    if textos:
+                        st.session_state.historico_textos[item["id"]] = textos
+                        st.code(textos["output_text"], language=None)
+                    else:
+                        st.warning("Não foi possível carregar esta tradução.")
+
+        if tem_mais:
+            # Callback roda antes do rerun do fragmento: a próxima página já aparece nele
+            st.button(
+                "⬇️ Carregar mais",
+                on_click=history_cache.load_more,
+                args=(user_id, info["plan_status"]),
+                use_container_width=True
+            )
+
+
+# --- LOTE ---
+@fragmento("lote")
+def painel_lote(user_id):
+    st.markdown("<h2 style='color: black; margin-bottom: 10px;'>Tradução em Lote</h2>", unsafe_allow_html=True)
+    st.caption(
+        "Envie um CSV/JSONL (colunas: cliente, tipo, tom, texto) ou cole vários andamentos "
+        "separados por uma linha com ---. Campos vazios usam a configuração da barra lateral."
+    )
+
+    arquivo_lote = st.file_uploader("Arquivo do lote", type=["csv", "jsonl"])
+    texto_lote = st.text_area(
+        "Ou cole os andamentos:",
+        height=200,
+        key="texto_lote",
+        placeholder="Cliente: Sr. João\nTipo: Despacho\nConclusos para despacho.\n---\nCliente: Sra. Maria\nJuntada de petição."
+    )
+    concorrencia = st.slider("Traduções simultâneas", 1, BATCH_MAX_CONCURRENCY, min(2, BATCH_MAX_CONCURRENCY))
+
+    if st.button("📦 Processar Lote"):
+        padrao = {
+            "tipo_andamento": st.session_state.tipo_andamento,
+            "tom_de_voz": st.session_state.tom_de_voz,
+            "nome_cliente": st.session_state.nome_cliente
+        }
+        try:
+            if arquivo_lote is not None:
+                formato = "jsonl" if arquivo_lote.name.endswith(".jsonl") else "csv"
+                itens = parse_batch(arquivo_lote.getvalue().decode("utf-8-sig"), formato, padrao)
+            else:
+                itens = parse_batch(texto_lote, "colado", padrao)
+        except Exception as e:
+            itens = []
+            st.error(f"Não foi possível ler o lote: {e}")
+
+        if not itens:
+            st.warning("⚠️ Nenhum andamento encontrado no lote.")
+        elif len(itens) > BATCH_MAX_ITEMS:
+            st.warning(f"⚠️ O lote pode ter no máximo {BATCH_MAX_ITEMS} andamentos.")
+        else:
+            progresso = st.progress(0.0, text=f"0 de {len(itens)} concluídos")
+            # Um espaço reservado por item, preenchido assim que a tradução termina
+            areas = [st.empty() for _ in itens]
+            resultados = [None] * len(itens)
+
+            for concluidos, (indice, resultado) in enumerate(run_batch(user_id, itens, concorrencia), start=1):
+                resultados[indice] = resultado
+                with areas[indice].container():
+                    titulo = f"{'✅' if resultado['status'] == 'ok' else '⚠️'} {indice + 1}. {resultado['nome_cliente'] or 'Cliente'} · {resultado['tipo_andamento']}"
+                    with st.expander(titulo, expanded=resultado["status"] != "ok"):
+                        st.code(resultado["mensagem"], language=None)
+                progresso.progress(concluidos / len(itens), text=f"{concluidos} de {len(itens)} concluídos")
+
+            st.session_state.resultados_lote = resultados
+
+    if st.session_state.get("resultados_lote"):
+        st.download_button(
+            "⬇️ Baixar resultados (CSV)",
+            data=results_to_csv(st.session_state.resultados_lote),
+            file_name="traducoes_lote.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+
+
+# Cada bloco roda como fragmento: digitar, trocar o tom ou editar a mensagem
+# reexecuta só o bloco afetado, sem reconsultar perfil e histórico
+with st.sidebar:
+    painel_conta(USER_ID_ATUAL)
+    # Preenchido no fim do script, quando todas as consultas do rerun já rodaram
+    painel_debug = st.empty()
+    painel_configuracao()
+
+# Interface Principal
+st.markdown("<h1>TraduzJur</h1>", unsafe_allow_html=True)
+st.markdown("<p class='caption-text'>Converta juridiquês em mensagens claras e envie para o cliente.</p>", unsafe_allow_html=True)
+
+formulario_entrada(USER_ID_ATUAL)
+
+tab_traducao, tab_lote, tab_historico = st.tabs(
+    ["📝 Tradução", "📦 Lote", "📜 Histórico"]
+)
+with tab_traducao:
+    painel_resultado()
+with tab_historico:
+    painel_historico(USER_ID_ATUAL)
+with tab_lote:
+    painel_lote(USER_ID_ATUAL)
+
+st.session_state.rodada_atual["em_andamento"] = False
+total_rerun_ms = metrics.finish_trace()
+
+if st.session_state.perfil["plan_status"] == "admin":
+    etapas_rerun, _ = metrics.trace()
+    with painel_debug.container():
+        st.caption(f"🛢️ Consultas ao banco neste rerun: {SaaSLogger.db_roundtrips()}")
+        st.caption(f"🚀 Cold start do processo (importações): {metrics.cold_start_ms:.0f} ms")
+        with st.expander("🔁 Últimas interações (fragmentos · consultas)"):
+            st.code(
+                "\n".join(
+                    f"{'página inteira' if rodada['escopo'] == 'app' else 'só fragmento'}: "
+                    + ", ".join(f"{nome} ({consultas})" for nome, consultas in rodada["fragmentos"].items())
+                    + f" · {rodada['db']} consulta(s)"
+                    for rodada in reversed(st.session_state.interacoes)
+                ),
+                language=None
+            )
+        with st.expander(f"⏱️ Etapas deste rerun ({total_rerun_ms:.0f} ms)"):
+            st.code(
+                "\n".join(f"{'  ' * etapa['depth']}{etapa['stage']}: {etapa['ms']:.1f} ms" for etapa in etapas_rerun)
+                or "Nenhuma etapa medida.",
+                language=None
+            )
+            snapshot = metrics.snapshot()["histograms"]
+            st.dataframe(
+                [{"etapa": nome, **valores} for nome, valores in sorted(snapshot.items())],
+                hide_index=True,
+                use_container_width=True
+            )
+            st.download_button(
+                "⬇️ Métricas (Prometheus)",
+                data=metrics.to_prometheus(),
+                file_name="metrics.prom",
+                mime="text/plain"
+            )
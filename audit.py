@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from collections import defaultdict
+
+
+class AuditWriter:
+    """
+    Fila write-behind para os logs de auditoria (generation_logs, system_events).
+    Uma thread em segundo plano agrupa as linhas e grava com inserts multi-linha
+    quando a fila atinge max_batch ou a cada flush_interval_s.
+    Se o banco estiver fora, as linhas vão para um arquivo local (append-only)
+    e são reenviadas quando o banco voltar.
+    """
+
+    def __init__(self, insert_rows, spool_path, max_batch=50, flush_interval_s=1.0, max_queue=10000, replay_interval_s=30.0):
+        self.insert_rows = insert_rows
+        self.spool_path = spool_path
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self.replay_interval_s = replay_interval_s
+        self._last_replay = 0.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, table, row):
+        """Enfileira uma linha; retorna False se a fila estiver cheia (linha descartada)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((table, row))
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+
+        with self._lock:
+            self._stats["enqueued"] += 1
+        if self._queue.qsize() >= self.max_batch:
+            self._wakeup.set()
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+
+    def _drain(self):
+        rows = []
+        while len(rows) < self.max_batch:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def flush(self):
+        """Grava tudo o que estiver na fila (e tenta reenviar o spool)"""
+        with self._flush_lock:
+            if self._queue.empty():
+                self._replay_spool()
+                return
+
+            while True:
+                rows = self._drain()
+                if not rows:
+                    break
+                self._write(rows)
+
+            self._replay_spool()
+
+    def _write(self, rows):
+        por_tabela = defaultdict(list)
+        for table, row in rows:
+            por_tabela[table].append(row)
+
+        for table, linhas in por_tabela.items():
+            start = time.perf_counter()
+            try:
+                self.insert_rows(table, linhas)
+            except Exception as e:
+                print(f"⚠️ Falha ao gravar {len(linhas)} logs em {table}, salvando em spool: {e}")
+                self._spool(table, linhas)
+                continue
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats["flushed"] += len(linhas)
+                self._stats["flushes"] += 1
+                self._stats["last_flush_ms"] = elapsed_ms
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+
+    def _spool(self, table, linhas, novas=True):
+        try:
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for row in linhas:
+                    f.write(json.dumps({"table": table, "row": row}, ensure_ascii=False, default=str) + "\n")
+            if novas:
+                with self._lock:
+                    self._stats["spooled"] += len(linhas)
+        except Exception as e:
+            print(f"🔥 Não foi possível gravar o spool de auditoria: {e}")
+            with self._lock:
+                self._stats["dropped"] += len(linhas)
+
+    def _replay_spool(self, force=False):
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        if not force and time.monotonic() - self._last_replay < self.replay_interval_s:
+            return
+        self._last_replay = time.monotonic()
+
+        # Renomeia antes de ler: novas falhas continuam indo para um spool novo
+        replay_path = self.spool_path + ".replay"
+        try:
+            os.replace(self.spool_path, replay_path)
+            with open(replay_path, encoding="utf-8") as f:
+                pendentes = [json.loads(linha) for linha in f if linha.strip()]
+        except Exception as e:
+            print(f"⚠️ Erro lendo spool de auditoria: {e}")
+            return
+
+        por_tabela = defaultdict(list)
+        for item in pendentes:
+            por_tabela[item["table"]].append(item["row"])
+
+        for table, linhas in por_tabela.items():
+            for i in range(0, len(linhas), self.max_batch):
+                lote = linhas[i:i + self.max_batch]
+                try:
+                    self.insert_rows(table, lote)
+                    with self._lock:
+                        self._stats["replayed"] += len(lote)
+                except Exception:
+                    self._spool(table, linhas[i:], novas=False)
+                    break
+
+        os.remove(replay_path)
+
+    def close(self, timeout=5.0):
+        """Esvazia a fila antes do processo terminar"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        self._replay_spool(force=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+
+def create_audit_writer(insert_rows):
+    writer = AuditWriter(
+        insert_rows,
+        spool_path=os.getenv("AUDIT_SPOOL_PATH", "audit_spool.jsonl"),
+        max_batch=int(os.getenv("AUDIT_MAX_BATCH", "50")),
+        flush_interval_s=float(os.getenv("AUDIT_FLUSH_INTERVAL_S", "1.0")),
+        max_queue=int(os.getenv("AUDIT_MAX_QUEUE", "10000"))
+    )
+    atexit.register(writer.close)
+    return writer
@@ -1,8 +1,31 @@
 import streamlit as st
 import bcrypt
-from services import supabase
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from services import SaaSLogger
+from sessions import SessionManager
 import time
 
+SESSION_COOKIE = "traduzjur_session"
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_DAYS", "7")) * 86400
+SESSION_ROTATE_AFTER_S = float(os.getenv("SESSION_ROTATE_AFTER_H", "24")) * 3600
+SESSION_COOKIE_SECURE = os.getenv("SESSION_COOKIE_SECURE", "true").lower() == "true"
+
+_session_secret = os.getenv("SESSION_SECRET")
+if not _session_secret:
+    # Sem segredo fixo as sessões não sobrevivem a um restart do servidor
+    print("⚠️ SESSION_SECRET não configurado: usando segredo temporário deste processo.")
+    _session_secret = secrets.token_hex(32)
+
+session_manager = SessionManager(
+    secret=_session_secret.encode("utf-8"),
+    ttl_s=SESSION_TTL_S,
+    rotate_after_s=SESSION_ROTATE_AFTER_S,
+    load_revoked=SaaSLogger.get_revoked_sessions,
+    store_revocation=SaaSLogger.revoke_session
+)
+
 def hash_password(password):
     """Transforma '123456' em uma sopa de letrinhas segura"""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -29,14 +52,13 @@ def tela_login():
             
             try:
                 # Busca usuário pelo email
-                response = supabase.table("profiles").select("*").eq("email", email).execute()
-                data = response.data
+                user = SaaSLogger.get_profile_by_email(email)
                 
-                if data:
-                    user = data[0]
+                if user:
                     # Verifica a senha
                     if user.get('password_hash') and check_password(senha, user['password_hash']):
                         st.success("Logado com sucesso!")
+                        start_session(user['id'])
                         time.sleep(1)
                         return user['id'] # Retorna o ID Real
                     else:
@@ -60,21 +82,22 @@ def tela_login():
             else:
                 try:
                     # Verifica se email já existe
-                    check = supabase.table("profiles").select("id").eq("email", new_email).execute()
-                    if check.data:
+                    if SaaSLogger.get_profile_by_email(new_email):
                         st.error("Esse email já tem conta.")
                     else:
                         # Cria novo usuário
                         user_id = new_email  # Simplificação: Usando email como ID (ou gere UUID)
                         hashed = hash_password(new_senha)
                         
-                        supabase.table("profiles").insert({
+                        SaaSLogger.create_profile({
                             "id": user_id,
                             "email": new_email,
                             "password_hash": hashed,
                             "plan_status": "free",
-                            "credits_balance": 3
-                        }).execute()
+                            "credits_balance": 3,
+                            # Começa o ciclo de 24h (o job de reset só renova ciclos vencidos)
+                            "last_credit_reset": datetime.now(timezone.utc).isoformat()
+                        })
                         
                         st.success("Conta criada! Vá para a aba 'Entrar'.")
                         st.balloons()
@@ -83,6 +106,61 @@ def tela_login():
     
     return None
 
+def start_session(user_id):
+    """Login real: emite o token; o cookie é gravado no próximo render (sync_session_cookie)"""
+    token = session_manager.issue(user_id)
+    st.session_state.session_token = token
+    st.session_state.cookie_action = ("set", token)
+
+
+def restore_session():
+    """
+    Recupera o usuário pelo cookie assinado (sem banco e sem bcrypt).
+    Tokens antigos são rotacionados. Retorna o user_id ou None.
+    """
+    token = st.context.cookies.get(SESSION_COOKIE)
+    payload = session_manager.validate(token)
+    if payload is None:
+        return None
+
+    if session_manager.needs_rotation(payload):
+        token = session_manager.rotate(token)
+        st.session_state.cookie_action = ("set", token)
+
+    st.session_state.session_token = token
+    return payload["uid"]
+
+
+def sync_session_cookie():
+    """Aplica no navegador a gravação/remoção pendente do cookie de sessão"""
+    acao = st.session_state.pop("cookie_action", None)
+    if acao is None:
+        return
+
+    # Import tardio: o componente só é renderizado quando há algo para gravar
+    import extra_streamlit_components as stx
+    cookie_manager = stx.CookieManager(key="session_cookie_manager")
+
+    if acao[0] == "set":
+        cookie_manager.set(
+            SESSION_COOKIE,
+            acao[1],
+            key="session_cookie_set",
+            expires_at=datetime.now() + timedelta(seconds=SESSION_TTL_S),
+            secure=SESSION_COOKIE_SECURE
+        )
+    else:
+        try:
+            cookie_manager.delete(SESSION_COOKIE, key="session_cookie_delete")
+        except KeyError:
+            # O componente ainda não devolveu os cookies atuais; a remoção já foi enviada
+            pass
+
+
 def logout():
+    token = st.session_state.pop("session_token", None)
+    if token:
+        session_manager.revoke(token)
+    st.session_state.cookie_action = ("delete",)
     st.session_state.user_id = None
     st.rerun()
\ No newline at end of file
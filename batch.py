@@ -0,0 +1,144 @@
+import os
+import io
+import csv
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from services import SaaSLogger, BATCH_RATE_LIMIT_MAX, RATE_LIMIT_WINDOW_S
+from pipeline import gerar_com_credito, MissingApiKeyError
+from singleflight import SINGLEFLIGHT_WORKERS
+
+load_dotenv()
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+# Itens de lote em andamento no processo inteiro (todos os usuários): cada um ocupa uma
+# thread do pool do single-flight, que também atende as gerações interativas
+BATCH_PROCESS_MAX_IN_FLIGHT = int(os.getenv("BATCH_PROCESS_MAX_IN_FLIGHT", str(max(1, SINGLEFLIGHT_WORKERS // 2))))
+
+_vagas_no_processo = threading.BoundedSemaphore(BATCH_PROCESS_MAX_IN_FLIGHT)
+
+# Nomes de coluna aceitos no CSV/JSONL (minúsculos, sem acento)
+CAMPOS = {
+    "nome_cliente": ["nome_cliente", "cliente", "nome"],
+    "tipo_andamento": ["tipo_andamento", "tipo", "documento"],
+    "tom_de_voz": ["tom_de_voz", "tom"],
+    "texto_processo": ["texto_processo", "texto", "andamento", "movimentacao"],
+}
+
+SEPARADOR_COLADO = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+CABECALHO_COLADO = re.compile(r"^\s*(cliente|tipo|tom)\s*:\s*(.*)$", re.IGNORECASE)
+
+
+def _normalizar_item(bruto, padrao):
+    """Mapeia as chaves aceitas para os campos do app, completando com os padrões da sidebar"""
+    chaves = {str(k).strip().lower(): v for k, v in bruto.items()}
+    item = {}
+    for campo, aliases in CAMPOS.items():
+        valor = next((chaves[a] for a in aliases if chaves.get(a)), None)
+        item[campo] = str(valor).strip() if valor else padrao.get(campo, "")
+    return item
+
+
+def _parse_colado(texto, padrao):
+    """
+    Entradas separadas por uma linha com '---'.
+    Cada entrada pode começar com 'Cliente:', 'Tipo:' e 'Tom:'.
+    """
+    itens = []
+    for bloco in SEPARADOR_COLADO.split(texto):
+        bruto = {}
+        linhas_texto = []
+        for linha in bloco.strip().splitlines():
+            match = CABECALHO_COLADO.match(linha)
+            if match and not linhas_texto:
+                bruto[match.group(1).lower()] = match.group(2)
+            else:
+                linhas_texto.append(linha)
+        bruto["texto"] = "\n".join(linhas_texto).strip()
+        itens.append(_normalizar_item(bruto, padrao))
+    return itens
+
+
+def parse_batch(conteudo, formato, padrao):
+    """
+    Converte o conteúdo enviado em uma lista de itens.
+    formato: 'csv', 'jsonl' ou 'colado'. padrao: valores da sidebar para campos vazios.
+    """
+    if formato == "csv":
+        leitor = csv.DictReader(io.StringIO(conteudo))
+        itens = [_normalizar_item(linha, padrao) for linha in leitor]
+    elif formato == "jsonl":
+        itens = [
+            _normalizar_item(json.loads(linha), padrao)
+            for linha in conteudo.splitlines() if linha.strip()
+        ]
+    else:
+        itens = _parse_colado(conteudo, padrao)
+
+    return [item for item in itens if item["texto_processo"]]
+
+
+def _traduzir_item(user_id, item):
+    """Roda uma tradução do lote (reserva crédito e loga individualmente)"""
+    try:
+        with _vagas_no_processo:
+            reserva, resultado, _ = gerar_com_credito(
+                user_id,
+                item["texto_processo"],
+                item["tipo_andamento"],
+                item["tom_de_voz"],
+                item["nome_cliente"],
+                # Item já contado na cota do lote (run_batch)
+                check_rate_limit=False
+            )
+    except MissingApiKeyError:
+        return {**item, "status": "erro", "mensagem": "Erro interno: API Key não configurada."}
+    except Exception as e:
+        SaaSLogger.log_event(user_id, "error_api_batch", str(e))
+        return {**item, "status": "erro", "mensagem": f"Erro ao processar: {e}"}
+
+    if resultado is None:
+        return {**item, "status": "sem_credito", "mensagem": "Créditos esgotados."}
+    return {**item, "status": "ok", "mensagem": resultado["text"]}
+
+
+def run_batch(user_id, itens, max_workers=BATCH_MAX_CONCURRENCY):
+    """
+    Executa o lote em paralelo (no máximo max_workers chamadas simultâneas).
+    Gera (indice, resultado) na ordem em que cada item termina.
+    Cada item conta na cota do lote (reservada inteira antes de começar); os créditos são
+    reservados por item.
+    """
+    permitido, restantes = SaaSLogger.reserve_batch_quota(user_id, len(itens))
+    if not permitido:
+        mensagem = (
+            f"Limite de {BATCH_RATE_LIMIT_MAX} andamentos em lote a cada {int(RATE_LIMIT_WINDOW_S // 60)} min "
+            f"(restam {restantes}). Envie um lote menor ou tente novamente em alguns minutos."
+        )
+        for indice, item in enumerate(itens):
+            yield indice, {**item, "status": "limite", "mensagem": mensagem}
+        return
+
+    max_workers = max(1, min(max_workers, BATCH_MAX_CONCURRENCY))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lote") as executor:
+        futuros = {
+            executor.submit(_traduzir_item, user_id, item): indice
+            for indice, item in enumerate(itens)
+        }
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
+
+
+def results_to_csv(resultados):
+    """CSV para download com as mensagens geradas"""
+    saida = io.StringIO()
+    colunas = ["nome_cliente", "tipo_andamento", "tom_de_voz", "texto_processo", "status", "mensagem"]
+    escritor = csv.DictWriter(saida, fieldnames=colunas, extrasaction="ignore")
+    escritor.writeheader()
+    for resultado in resultados:
+        escritor.writerow(resultado)
+    return saida.getvalue()
@@ -0,0 +1,801 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import sqlite3
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+# Sem credenciais reais: o benchmark nunca fala com o Supabase nem com o Google
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_KEY"] = ""
+# O backend é trocado pelo Supabase falso em install_fakes; até lá, SQLite em memória
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = ":memory:"
+os.environ.setdefault("SESSION_SECRET", "benchmark")
+# Spool da auditoria (só usado com erro injetado no banco) num diretório temporário
+os.environ.setdefault("AUDIT_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="traduzjur-bench-"), "audit_spool.jsonl"))
+
+import bcrypt
+from streamlit.testing.v1 import AppTest
+
+import llm
+import auth
+import services
+from services import SaaSLogger, HISTORY_SEED_LIMIT
+from metrics import metrics
+from history import history_cache
+from similarity import near_duplicate_index
+from pipeline import gerar_com_credito
+from singleflight import register_propagator
+from credits import FREE_DAILY_CREDITS, free_credit_status
+from storage import SupabaseStorage, SqliteStorage
+import textstore
+from textstore import TextStore, text_hash
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SENHA = "benchmark123"
+
+# Andamentos de exemplo (o índice da sessão é anexado para não virar acerto de cache)
+TEXTOS = [
+    "Intimação da parte autora para se manifestar sobre a contestação no prazo de 15 dias.",
+    "Defiro o pedido de tutela de urgência. Cite-se o réu para contestar no prazo legal.",
+    "Designo audiência de conciliação para o dia 10/03, às 14h, na sala 2 do CEJUSC.",
+    "Julgo procedente o pedido para condenar o réu ao pagamento de R$ 10.000,00 a título de danos morais.",
+    "Conclusos para despacho",
+]
+
+
+class FakeError(Exception):
+    """Falha injetada pelo benchmark"""
+
+
+def _espera(latencia_ms, jitter):
+    if latencia_ms > 0:
+        time.sleep(max(0.0, random.gauss(latencia_ms, latencia_ms * jitter)) / 1000)
+
+
+# ---------------------------------------------------------------
+# Supabase falso: mesma superfície de query builder usada no app
+# ---------------------------------------------------------------
+class _Response:
+    def __init__(self, data=None, count=None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, banco, tabela):
+        self.banco = banco
+        self.tabela = tabela
+        self.filtros = []
+        self.operacao = "select"
+        self.payload = None
+        self.ordem = None
+        self.limite = None
+        self.conflito = None
+
+    def select(self, colunas="*", count=None):
+        return self
+
+    def _filtro(self, funcao):
+        self.filtros.append(funcao)
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(lambda row: row.get(coluna) == valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(lambda row: str(row.get(coluna) or "") > valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(lambda row: str(row.get(coluna) or "") >= valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(lambda row: str(row.get(coluna) or "") < valor)
+
+    def in_(self, coluna, valores):
+        valores = set(valores)
+        return self._filtro(lambda row: row.get(coluna) in valores)
+
+    def order(self, coluna, desc=False):
+        self.ordem = (coluna, desc)
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    def insert(self, payload):
+        self.operacao, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False):
+        self.operacao, self.payload, self.conflito = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self.operacao, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operacao = "delete"
+        return self
+
+    def execute(self):
+        return self.banco.execute(self)
+
+
+class _Rpc:
+    def __init__(self, banco, nome, params):
+        self.banco = banco
+        self.nome = nome
+        self.params = params
+
+    def execute(self):
+        return self.banco.execute(self)
+
+
+class FakeSupabase:
+    """Banco em memória com latência e taxa de erro configuráveis por ida ao banco"""
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, jitter=0.2):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.tables = {}
+        self.roundtrips = 0
+        self.background_roundtrips = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def thread_roundtrips(self):
+        """Idas ao banco feitas pela thread atual (nunca zera)"""
+        return getattr(self._local, "roundtrips", 0)
+
+    def _start_thread(self):
+        self._local.inicio = self.thread_roundtrips()
+
+    def _take_thread(self):
+        return self.thread_roundtrips() - getattr(self._local, "inicio", 0)
+
+    def _add_thread(self, n):
+        self._local.roundtrips = self.thread_roundtrips() + n
+
+    def table(self, nome):
+        return _Query(self, nome)
+
+    def rpc(self, nome, params):
+        return _Rpc(self, nome, params)
+
+    def execute(self, query):
+        _espera(self.latency_ms, self.jitter)
+        self._local.roundtrips = self.thread_roundtrips() + 1
+        with self._lock:
+            self.roundtrips += 1
+            if threading.current_thread().name == "audit-writer":
+                self.background_roundtrips += 1
+            if random.random() < self.error_rate:
+                raise FakeError("falha injetada no banco")
+            if isinstance(query, _Rpc):
+                return self._rpc(query)
+            return self._query(query)
+
+    def _query(self, query):
+        rows = self.tables.setdefault(query.tabela, [])
+
+        if query.operacao in ("insert", "upsert"):
+            novos = query.payload if isinstance(query.payload, list) else [query.payload]
+            existentes = {row.get(query.conflito) for row in rows} if query.operacao == "upsert" else set()
+            for row in novos:
+                if query.operacao == "upsert" and row.get(query.conflito) in existentes:
+                    continue
+                row = dict(row)
+                row.setdefault("id", len(rows) + 1)
+                row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                rows.append(row)
+            return _Response(novos)
+
+        filtradas = [row for row in rows if all(filtro(row) for filtro in query.filtros)]
+        if query.operacao == "update":
+            for row in filtradas:
+                row.update(query.payload)
+            return _Response([dict(row) for row in filtradas])
+        if query.operacao == "delete":
+            self.tables[query.tabela] = [row for row in rows if row not in filtradas]
+            return _Response(filtradas)
+
+        if query.ordem:
+            coluna, desc = query.ordem
+            filtradas.sort(key=lambda row: str(row.get(coluna) or ""), reverse=desc)
+        if query.limite:
+            filtradas = filtradas[:query.limite]
+        return _Response([dict(row) for row in filtradas])
+
+    def _rpc(self, rpc):
+        # Mesma semântica de sql/004_reserve_credit.sql e sql/011_free_credit_reset.sql
+        perfil = next((row for row in self.tables.get("profiles", []) if row["id"] == rpc.params["p_user_id"]), None)
+        if perfil is None:
+            return _Response([] if rpc.nome == "reserve_credit" else None)
+
+        if rpc.nome == "reserve_credit":
+            if perfil["plan_status"] == "free" and free_credit_status(perfil)["due"]:
+                perfil["credits_balance"] = FREE_DAILY_CREDITS
+                perfil["last_credit_reset"] = datetime.now(timezone.utc).isoformat()
+            permitido = perfil["plan_status"] != "free" or perfil["credits_balance"] > 0
+            if permitido and perfil["plan_status"] == "free":
+                perfil["credits_balance"] -= 1
+            return _Response([{"allowed": permitido, "plan_status": perfil["plan_status"], "credits_balance": perfil["credits_balance"]}])
+
+        if perfil["plan_status"] == "free":
+            perfil["credits_balance"] = min(perfil["credits_balance"] + 1, FREE_DAILY_CREDITS)
+        return _Response(perfil["credits_balance"])
+
+
+# ---------------------------------------------------------------
+# Gemini falso: generate_content / generate_content_stream
+# ---------------------------------------------------------------
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _Chunk:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _FakeModels:
+    def __init__(self, dono):
+        self.dono = dono
+
+    def _resposta(self, contents):
+        return (
+            "Olá, *Cliente*!\n\n📌 O que aconteceu: houve uma movimentação no processo.\n\n"
+            "👉 Próximo passo: nós acompanhamos e avisamos você."
+        ), _Usage(len(contents) // 4, 60)
+
+    def generate_content(self, model, contents, config=None):
+        self.dono.chamar()
+        texto, usage = self._resposta(contents)
+        return _Chunk(texto, usage)
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.dono.chamar()
+        texto, usage = self._resposta(contents)
+        partes = texto.split(" ")
+        for i, parte in enumerate(partes):
+            yield _Chunk(parte + " ", usage if i == len(partes) - 1 else None)
+
+
+class FakeGemini:
+    """Cliente Gemini falso com latência (por chamada) e taxa de erro configuráveis"""
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, jitter=0.2):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.jitter = jitter
+        self.calls = 0
+        self.models = _FakeModels(self)
+        self._lock = threading.Lock()
+
+    def chamar(self):
+        with self._lock:
+            self.calls += 1
+        _espera(self.latency_ms, self.jitter)
+        if random.random() < self.error_rate:
+            raise FakeError("falha injetada no Gemini")
+
+    def close(self):
+        pass
+
+
+def install_fakes(db, gemini):
+    """Troca os clientes do processo pelos falsos (backend de dados e Gemini)"""
+    services.storage = SupabaseStorage(db, on_roundtrip=services._count_roundtrip)
+    llm._client = gemini
+    # A geração roda no pool do single-flight: as idas ao banco de lá contam na sessão que pediu
+    register_propagator(db._start_thread, db._take_thread, db._add_thread)
+
+
+def seed_users(db, n_sessions, historico=30):
+    """Perfis (metade FREE, metade PRO) com histórico recente"""
+    password_hash = bcrypt.hashpw(SENHA.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+    agora = datetime.now(timezone.utc)
+    db.tables["profiles"] = []
+    db.tables["generation_logs"] = []
+    db.tables["texts"] = []
+    textos_gravados = set()
+    for i in range(n_sessions):
+        email = f"bench{i}@traduzjur.test"
+        db.tables["profiles"].append({
+            "id": email,
+            "email": email,
+            "password_hash": password_hash,
+            "plan_status": "free" if i % 2 else "pro_monthly",
+            "credits_balance": FREE_DAILY_CREDITS,
+            "last_credit_reset": agora.isoformat(),
+        })
+        for j in range(historico):
+            texto = f"{TEXTOS[j % len(TEXTOS)]} (histórico {j})"
+            saida = "📌 O que aconteceu: ..."
+            for conteudo in (texto, saida):
+                if text_hash(conteudo) not in textos_gravados:
+                    textos_gravados.add(text_hash(conteudo))
+                    db.tables["texts"].append({"hash": text_hash(conteudo), "encoding": "raw", "content": conteudo})
+            db.tables["generation_logs"].append({
+                "id": len(db.tables["generation_logs"]) + 1,
+                "user_id": email,
+                "created_at": (agora - timedelta(hours=j)).isoformat(),
+                "input_hash": text_hash(texto),
+                "output_hash": text_hash(saida),
+                "input_preview": texto[:150],
+            })
+
+
+# ---------------------------------------------------------------
+# Sessões simuladas: login → sidebar → gerar → histórico
+# ---------------------------------------------------------------
+def _texto(indice):
+    return f"{TEXTOS[indice % len(TEXTOS)]} Processo nº {indice}-{time.time_ns()}."
+
+
+def _botao(at, prefixo):
+    return next(botao for botao in at.button if botao.label.startswith(prefixo))
+
+
+def _registrar(amostras, nome, acao, contador, falhou=lambda: False):
+    """Executa a etapa e registra (etapa, ms, idas_ao_banco, ok); contador() lê as idas ao banco"""
+    antes = contador()
+    inicio = time.perf_counter()
+    try:
+        acao()
+        ok = not falhou()
+    except Exception as e:
+        print(f"⚠️ Etapa {nome} falhou: {e}")
+        ok = False
+    amostras.append((nome, (time.perf_counter() - inicio) * 1000, contador() - antes, ok))
+    return ok
+
+
+def run_session_apptest(indice, db, amostras, timeout_s):
+    """Sessão pela interface real (AppTest); registra (etapa, ms, idas_ao_banco, ok)"""
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout_s)
+
+    def login():
+        at.run()
+        at.text_input[0].input(f"bench{indice}@traduzjur.test")
+        at.text_input[1].input(SENHA)
+        _botao(at, "Entrar").click()
+        at.run()
+
+    def gerar():
+        at.text_area(key="texto_processo").input(_texto(indice))
+        at.run()
+        _botao(at, "✨").click()
+        at.run()
+
+    # O script roda numa thread do AppTest: conta tudo, menos a gravação da auditoria em segundo plano
+    def contador():
+        return db.roundtrips - db.background_roundtrips
+
+    def etapa(nome, acao):
+        return _registrar(amostras, nome, acao, contador, falhou=lambda: bool(at.exception))
+
+    if not etapa("login", login):
+        return
+    etapa("sidebar", at.run)
+    etapa("gerar", gerar)
+    etapa("historico", lambda: (_botao(at, "🔄").click(), at.run()))
+
+
+def _rerun(user_id, refresh_historico=False):
+    """Leituras que o app.py faz em todo rerun logado (sidebar + aba de histórico)"""
+    SaaSLogger.reset_db_roundtrips()
+    info = SaaSLogger.get_profile(user_id) or {"plan_status": "free", "credits_balance": 0, "last_credit_reset": None}
+    if info["plan_status"] == "free" and not free_credit_status(info)["due"]:
+        SaaSLogger.time_until_next_reset(info.get("last_credit_reset"))
+    history_cache.get(user_id, info["plan_status"], refresh=refresh_historico)
+    return info
+
+
+def run_session_direct(indice, db, amostras):
+    """
+    Mesma sequência de chamadas do app.py, sem a camada do Streamlit.
+    Permite sessões realmente simultâneas (o AppTest usa um Runtime global).
+    """
+    email = f"bench{indice}@traduzjur.test"
+    estado = {}
+
+    def login():
+        usuario = SaaSLogger.get_profile_by_email(email)
+        if not auth.check_password(SENHA, usuario["password_hash"]):
+            raise FakeError("senha recusada")
+        token = auth.session_manager.issue(usuario["id"])
+        estado["user_id"] = auth.session_manager.validate(token)["uid"]
+
+    def gerar():
+        user_id = estado["user_id"]
+        info = _rerun(user_id)
+        texto = _texto(indice)
+        near_duplicate_index.ensure_user(user_id, lambda: SaaSLogger.get_history(user_id, info["plan_status"], limit=HISTORY_SEED_LIMIT))
+        near_duplicate_index.find(user_id, texto, "Despacho", "Empático")
+        reserva, resultado, _ = gerar_com_credito(user_id, texto, "Despacho", "Empático", "Cliente", on_text=lambda parcial: None)
+        if resultado is None:
+            raise FakeError(f"crédito negado: {reserva['reason']}")
+        _rerun(user_id)
+
+    if not _registrar(amostras, "login", login, db.thread_roundtrips):
+        return
+    _registrar(amostras, "sidebar", lambda: _rerun(estado["user_id"]), db.thread_roundtrips)
+    _registrar(amostras, "gerar", gerar, db.thread_roundtrips)
+    _registrar(amostras, "historico", lambda: _rerun(estado["user_id"], refresh_historico=True), db.thread_roundtrips)
+
+
+# Roda num processo novo: importações do app e primeiro rerun (cold) x reruns seguintes (warm)
+_STARTUP_CHILD = """
+import json, time, sys
+inicio = time.perf_counter()
+import services, auth, llm, cache, pipeline, history, similarity, batch, metrics
+importacoes = (time.perf_counter() - inicio) * 1000
+sdks = {}
+for nome in ("supabase", "google.genai"):
+    t = time.perf_counter()
+    __import__(nome)
+    sdks[nome] = (time.perf_counter() - t) * 1000
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+tempos = []
+for _ in range(6):
+    t = time.perf_counter()
+    at.run()
+    tempos.append((time.perf_counter() - t) * 1000)
+print(json.dumps({"imports_ms": importacoes, "lazy_sdk_ms": sdks, "reruns_ms": tempos}))
+"""
+
+
+def _import_breakdown(top):
+    """Tempo próprio (self) somado por pacote de primeiro nível nas importações do app (python -X importtime)"""
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import services, auth, llm, cache, pipeline, history, similarity, batch, metrics"],
+        cwd=os.path.dirname(APP_PATH), capture_output=True, text=True, env=os.environ.copy()
+    )
+    pacotes = {}
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "|" not in linha:
+            continue
+        proprio, _, modulo = linha.split("|")
+        proprio = proprio.replace("import time:", "").strip()
+        if not proprio.isdigit():
+            continue  # cabeçalho
+        pacote = modulo.strip().split(".")[0]
+        pacotes[pacote] = pacotes.get(pacote, 0) + int(proprio) / 1000
+    return dict(sorted(pacotes.items(), key=lambda item: -item[1])[:top])
+
+
+def profile_startup(top=12):
+    """Cold start em processo novo: importações por pacote, SDKs adiados e tempo de rerun (tela de login)"""
+    processo = subprocess.run(
+        [sys.executable, "-c", _STARTUP_CHILD, APP_PATH],
+        cwd=os.path.dirname(APP_PATH), capture_output=True, text=True, env=os.environ.copy()
+    )
+    medidas = json.loads(processo.stdout.strip().splitlines()[-1])
+    reruns = medidas["reruns_ms"]
+    return {
+        "imports_ms": round(medidas["imports_ms"], 1),
+        "lazy_sdk_ms": {nome: round(ms, 1) for nome, ms in medidas["lazy_sdk_ms"].items()},
+        "first_rerun_ms": round(reruns[0], 1),
+        "rerun_p50_ms": round(_percentil(reruns[1:], 0.50), 1),
+        "imports_by_package_ms": {nome: round(ms, 1) for nome, ms in _import_breakdown(top).items()},
+    }
+
+
+# ---------------------------------------------------------------
+# Textos fora de generation_logs: tamanho e tempo de varredura
+# ---------------------------------------------------------------
+FRASES_DECISAO = [
+    "Trata-se de ação de indenização por danos morais ajuizada em face da empresa ré.",
+    "A parte autora alega que teve seu nome inscrito indevidamente nos cadastros de inadimplentes.",
+    "Devidamente citada, a ré apresentou contestação, arguindo preliminar de ilegitimidade passiva.",
+    "É o relatório. Fundamento e decido.",
+    "Rejeito a preliminar arguida, pois a relação jurídica restou comprovada nos autos.",
+    "No mérito, o pedido é procedente, nos termos do art. 14 do Código de Defesa do Consumidor.",
+    "Condeno a ré ao pagamento de custas processuais e honorários advocatícios de 10% sobre o valor da condenação.",
+    "Intimem-se as partes para, querendo, especificarem as provas que pretendem produzir.",
+    "Defiro os benefícios da justiça gratuita à parte autora.",
+    "Após o trânsito em julgado, arquivem-se os autos com as cautelas de praxe.",
+]
+ANDAMENTOS_PADRAO = TEXTOS + [
+    "Juntada de petição",
+    "Decorrido prazo sem manifestação",
+    "Remetidos os autos ao Contador",
+    "Ato ordinatório praticado",
+    "Recebidos os autos",
+    "Expedida intimação eletrônica",
+    "Publicado o despacho no DJe",
+]
+LAYOUT_INLINE = """
+CREATE TABLE generation_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, input_text TEXT, output_text TEXT,
+    input_preview TEXT, tipo_andamento TEXT, tom_de_voz TEXT, latency_ms INTEGER, created_at TEXT NOT NULL
+);
+CREATE INDEX idx_generation_logs_user_created_at ON generation_logs (user_id, created_at DESC);
+"""
+
+
+def _logs_realistas(n, usuarios, rng):
+    """Volume parecido com o real: ~60% andamentos padronizados (repetidos), o resto decisões únicas"""
+    agora = datetime.now(timezone.utc)
+    for i in range(n):
+        tom = rng.choice(["Empático", "Formal", "Direto"])
+        if rng.random() < 0.6:
+            entrada = rng.choice(ANDAMENTOS_PADRAO)
+            # Glossário/cache: mesma entrada e tom geram a mesma mensagem
+            saida = f"📌 O que aconteceu: {entrada}\n\n👉 Próximo passo: aguardar ({tom})."
+        else:
+            entrada = " ".join(rng.choice(FRASES_DECISAO) for _ in range(rng.randint(6, 30))) + f" Processo nº {i:07d}."
+            saida = f"📌 O que aconteceu: decisão no processo {i:07d}.\n\n" + " ".join(
+                rng.choice(FRASES_DECISAO) for _ in range(rng.randint(3, 6))
+            )
+        yield {
+            "user_id": f"u{rng.randrange(usuarios)}",
+            "input_text": entrada,
+            "output_text": saida,
+            "tipo_andamento": "Despacho",
+            "tom_de_voz": tom,
+            "latency_ms": rng.randint(300, 3000),
+            "created_at": (agora - timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat(),
+        }
+
+
+def _tamanho_sqlite(caminho):
+    conn = sqlite3.connect(caminho)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    return os.path.getsize(caminho)
+
+
+def _cronometrar(funcao, repeticoes=3):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, (time.perf_counter() - inicio) * 1000)
+    return round(melhor, 2)
+
+
+def measure_text_store(n_rows, usuarios=200, seed=42):
+    """
+    Mesmo volume de logs em dois layouts SQLite: textos dentro de generation_logs (anterior)
+    x hashes + tabela texts (atual, para cada compressão). Compara tamanho em disco, a
+    varredura da janela do rate limit/métricas e o histórico completo de todos os usuários.
+    """
+    pasta = tempfile.mkdtemp(prefix="traduzjur-textstore-")
+    logs = list(_logs_realistas(n_rows, usuarios, random.Random(seed)))
+    desde = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat(timespec="microseconds")
+    usuarios_ids = sorted({log["user_id"] for log in logs})
+    resultado = {}
+
+    caminho = os.path.join(pasta, "inline.db")
+    conn = sqlite3.connect(caminho, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(LAYOUT_INLINE)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO generation_logs (user_id, input_text, output_text, input_preview, tipo_andamento, tom_de_voz, latency_ms, created_at) "
+        "VALUES (:user_id, :input_text, :output_text, substr(:input_text, 1, 150), :tipo_andamento, :tom_de_voz, :latency_ms, :created_at)",
+        logs
+    )
+    conn.execute("COMMIT")
+    resultado["inline"] = {
+        "bytes": _tamanho_sqlite(caminho),
+        "scan_window_ms": _cronometrar(lambda: conn.execute(
+            "SELECT user_id, count(*), avg(latency_ms) FROM generation_logs WHERE created_at >= ? GROUP BY user_id", (desde,)
+        ).fetchall()),
+        "history_all_users_ms": _cronometrar(lambda: [conn.execute(
+            "SELECT input_text, output_text, created_at, tipo_andamento, tom_de_voz FROM generation_logs "
+            "WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC", (u, desde)
+        ).fetchall() for u in usuarios_ids]),
+    }
+    conn.close()
+
+    for compressao in ("", "zlib", "zstd"):
+        if compressao == "zstd" and textstore._zstd() is None:
+            print("ℹ️ zstandard não instalado: layout com zstd não medido")
+            continue
+        caminho = os.path.join(pasta, f"texts_{compressao or 'raw'}.db")
+        banco = SqliteStorage(caminho)
+        textos = TextStore(fetch=banco.get_texts, compression=compressao)
+        linhas_texto, linhas_log = [], []
+        for log in logs:
+            input_hash, linha_in = textos.prepare(log["input_text"])
+            output_hash, linha_out = textos.prepare(log["output_text"])
+            linhas_texto.extend(linha for linha in (linha_in, linha_out) if linha)
+            linhas_log.append({
+                **{k: v for k, v in log.items() if k not in ("input_text", "output_text")},
+                "input_hash": input_hash,
+                "output_hash": output_hash,
+                "input_preview": log["input_text"][:150],
+            })
+        banco.insert_rows("texts", linhas_texto)
+        banco.insert_rows("generation_logs", linhas_log)
+
+        def historico(leitor=None):
+            # Sem leitor: LRU vazio, todo texto vem do banco (processo recém-iniciado)
+            leitor = leitor or TextStore(fetch=banco.get_texts, compression=compressao)
+            for u in usuarios_ids:
+                leitor.resolve_rows(banco.get_history(u, desde))
+
+        # LRU do tamanho do volume medido: o caso de um processo que já serviu esses históricos
+        aquecido = TextStore(fetch=banco.get_texts, max_entries=len(linhas_texto), compression=compressao)
+
+        resultado[f"texts_{compressao or 'raw'}"] = {
+            "bytes": _tamanho_sqlite(caminho),
+            "distinct_texts": len(linhas_texto),
+            "scan_window_ms": _cronometrar(lambda: banco._query(
+                "SELECT user_id, count(*), avg(latency_ms) FROM generation_logs WHERE created_at >= ? GROUP BY user_id", (desde,)
+            )),
+            "history_all_users_ms": _cronometrar(historico),
+            "history_warm_ms": _cronometrar(lambda: historico(aquecido)),
+        }
+
+    base = resultado["inline"]
+    print(f"\n📦 {n_rows} logs · {len(usuarios_ids)} usuários")
+    print(f"{'layout':<12}{'MB':>9}{'textos':>9}{'janela ms':>11}{'histórico ms':>14}{'c/ LRU ms':>11}")
+    for nome, medida in resultado.items():
+        print(
+            f"{nome:<12}{medida['bytes'] / 1e6:>9.2f}{medida.get('distinct_texts', 2 * n_rows):>9}"
+            f"{medida['scan_window_ms']:>11.1f}{medida['history_all_users_ms']:>14.1f}"
+            f"{medida.get('history_warm_ms', medida['history_all_users_ms']):>11.1f}"
+            + ("" if nome == "inline" else f"   ({medida['bytes'] / base['bytes'] - 1:+.0%} em disco)")
+        )
+    return resultado
+
+
+def _percentil(valores, q):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def summarize(amostras, duracao_s, reruns):
+    etapas = {}
+    for nome in dict.fromkeys(nome for nome, *_ in amostras):
+        linhas = [a for a in amostras if a[0] == nome]
+        tempos = [ms for _, ms, _, _ in linhas]
+        etapas[nome] = {
+            "count": len(linhas),
+            "errors": sum(1 for *_, ok in linhas if not ok),
+            "p50_ms": round(_percentil(tempos, 0.50), 1),
+            "p95_ms": round(_percentil(tempos, 0.95), 1),
+            "db_per_step": round(sum(db for _, _, db, _ in linhas) / len(linhas), 2),
+        }
+
+    return {
+        "steps": etapas,
+        "requests": len(amostras),
+        "requests_per_s": round(len(amostras) / duracao_s, 2) if duracao_s else 0.0,
+        "reruns": reruns,
+        "db_roundtrips_per_rerun": round(sum(db for _, _, db, _ in amostras) / reruns, 2) if reruns else 0.0,
+        "duration_s": round(duracao_s, 2),
+    }
+
+
+def compare(resultado, baseline, tolerancia):
+    """Lista de regressões em relação ao baseline salvo"""
+    regressoes = []
+    if resultado["requests_per_s"] < baseline["requests_per_s"] * (1 - tolerancia):
+        regressoes.append(f"req/s {resultado['requests_per_s']} < baseline {baseline['requests_per_s']}")
+    if resultado["db_roundtrips_per_rerun"] > baseline["db_roundtrips_per_rerun"] * (1 + tolerancia):
+        regressoes.append(f"DB/rerun {resultado['db_roundtrips_per_rerun']} > baseline {baseline['db_roundtrips_per_rerun']}")
+    for nome, etapa in resultado["steps"].items():
+        anterior = baseline["steps"].get(nome)
+        if anterior and etapa["p95_ms"] > anterior["p95_ms"] * (1 + tolerancia):
+            regressoes.append(f"{nome} p95 {etapa['p95_ms']} ms > baseline {anterior['p95_ms']} ms")
+        # Consultas por etapa: mais idas ao banco por etapa é regressão mesmo com p95 estável
+        if anterior and etapa["db_per_step"] > anterior["db_per_step"] * (1 + tolerancia):
+            regressoes.append(f"{nome} DB/etapa {etapa['db_per_step']} > baseline {anterior['db_per_step']}")
+    if resultado.get("startup") and baseline.get("startup"):
+        for medida in ("imports_ms", "first_rerun_ms", "rerun_p50_ms"):
+            atual, anterior = resultado["startup"][medida], baseline["startup"][medida]
+            if atual > anterior * (1 + tolerancia):
+                regressoes.append(f"startup {medida} {atual} ms > baseline {anterior} ms")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline (Supabase e Gemini falsos) do fluxo login → sidebar → gerar → histórico")
+    parser.add_argument("--mode", choices=["direct", "apptest"], default="direct",
+                        help="direct: chamadas do app.py em threads; apptest: interface real, uma sessão por vez")
+    parser.add_argument("--sessions", type=int, default=16, help="sessões simuladas")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessões rodando ao mesmo tempo (modo direct)")
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-s", type=float, default=60.0, help="timeout de cada rerun do AppTest")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como novo baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora aceita em relação ao baseline (0.25 = 25%%)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--startup", action="store_true", help="inclui o perfil de cold start (processo novo)")
+    parser.add_argument("--text-store", type=int, default=0, metavar="LOGS",
+                        help="só mede o armazenamento de textos (layout anterior x tabela texts) com LOGS linhas")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    if args.text_store:
+        measure_text_store(args.text_store, seed=args.seed)
+        return 0
+
+    db = FakeSupabase(args.db_latency_ms, args.db_error_rate)
+    gemini = FakeGemini(args.llm_latency_ms, args.llm_error_rate)
+    seed_users(db, args.sessions)
+    install_fakes(db, gemini)
+
+    if args.mode == "apptest":
+        # O AppTest troca o Runtime global do Streamlit a cada run: sessões em sequência
+        args.concurrency = 1
+        sessao = lambda i: run_session_apptest(i, db, amostras, args.timeout_s)
+    else:
+        sessao = lambda i: run_session_direct(i, db, amostras)
+
+    amostras = []
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="bench") as executor:
+        list(executor.map(sessao, range(args.sessions)))
+    duracao = time.perf_counter() - inicio
+
+    # Cada rerun logado zera o contador de consultas uma vez (app.py, seção 3)
+    reruns = metrics.snapshot()["histograms"].get("saas.reset_db_roundtrips", {}).get("count", 0)
+    resultado = summarize(amostras, duracao, reruns)
+    resultado["config"] = {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "tolerance", "startup", "text_store")}
+    resultado["gemini_calls"] = gemini.calls
+
+    print(f"\n📊 {args.sessions} sessões ({args.concurrency} simultâneas) em {resultado['duration_s']} s")
+    print(f"{'etapa':<10} {'n':>4} {'erros':>6} {'p50 ms':>9} {'p95 ms':>9} {'DB/etapa':>9}")
+    for nome, etapa in resultado["steps"].items():
+        print(f"{nome:<10} {etapa['count']:>4} {etapa['errors']:>6} {etapa['p50_ms']:>9} {etapa['p95_ms']:>9} {etapa['db_per_step']:>9}")
+    print(f"\nreq/s: {resultado['requests_per_s']} · DB por rerun: {resultado['db_roundtrips_per_rerun']} · chamadas Gemini: {gemini.calls}")
+
+    if args.startup:
+        resultado["startup"] = startup = profile_startup()
+        print(f"\n🚀 Cold start: importações {startup['imports_ms']} ms · primeiro rerun {startup['first_rerun_ms']} ms · rerun seguinte (p50) {startup['rerun_p50_ms']} ms")
+        print("   SDKs adiados para o primeiro uso: " + " · ".join(f"{nome} {ms} ms" for nome, ms in startup["lazy_sdk_ms"].items()))
+        for pacote, ms in startup["imports_by_package_ms"].items():
+            print(f"   {pacote:<24} {ms:>8} ms")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"💾 Baseline salvo em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️ Sem baseline para comparar (use --save-baseline).")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as arquivo:
+        baseline = json.load(arquivo)
+    if baseline.get("config") != resultado["config"]:
+        print("⚠️ Configuração diferente da do baseline: a comparação é apenas indicativa.")
+
+    regressoes = compare(resultado, baseline, args.tolerance)
+    for regressao in regressoes:
+        print(f"🔻 Regressão: {regressao}")
+    if not regressoes:
+        print("✅ Dentro do baseline.")
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
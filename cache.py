@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def normalize_text(texto):
+    """Normaliza o texto para gerar a mesma chave para andamentos iguais"""
+    texto = unicodedata.normalize("NFC", texto or "")
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+class TranslationCache:
+    """
+    Cache de traduções endereçado pelo conteúdo.
+    - Camada 1: LRU em memória (compartilhada entre sessões do mesmo processo)
+    - Camada 2 (opcional): SQLite em disco, sobrevive a restarts
+    """
+
+    def __init__(self, max_entries=512, disk_path=None):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0}
+        self._disk = None
+
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    " key TEXT PRIMARY KEY,"
+                    " output_text TEXT NOT NULL,"
+                    " created_at TEXT NOT NULL)"
+                )
+                self._disk.commit()
+            except Exception as e:
+                print(f"⚠️ Cache em disco indisponível ({disk_path}): {e}")
+                self._disk = None
+
+    @staticmethod
+    def make_key(texto_processo, tipo_andamento, tom_de_voz, nome_cliente, model, prompt_version):
+        """Hash das entradas normalizadas + modelo + versão do prompt"""
+        payload = json.dumps([
+            normalize_text(texto_processo),
+            tipo_andamento,
+            tom_de_voz,
+            normalize_text(nome_cliente) or "Cliente",
+            model,
+            prompt_version,
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return self._memory[key]
+
+            if self._disk is not None:
+                try:
+                    row = self._disk.execute(
+                        "SELECT output_text FROM translations WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    print(f"⚠️ Erro lendo cache em disco: {e}")
+                    row = None
+
+                if row:
+                    self._stats["hits_disk"] += 1
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, output_text):
+        with self._lock:
+            self._remember(key, output_text)
+
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO translations (key, output_text, created_at) VALUES (?, ?, ?)",
+                        (key, output_text, datetime.now(timezone.utc).isoformat())
+                    )
+                    self._disk.commit()
+                except Exception as e:
+                    print(f"⚠️ Erro gravando cache em disco: {e}")
+
+    def _remember(self, key, output_text):
+        self._memory[key] = output_text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """Contadores de hit/miss desde o início do processo"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._memory)
+        hits = stats["hits_memory"] + stats["hits_disk"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
+
+
+# Instância única por processo (reaproveitada por todas as sessões do Streamlit)
+translation_cache = TranslationCache(
+    max_entries=int(os.getenv("TRANSLATION_CACHE_SIZE", "512")),
+    disk_path=os.getenv("TRANSLATION_CACHE_PATH") or None
+)
@@ -0,0 +1,81 @@
+import os
+import json
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from credits import parse_reset_time
+
+load_dotenv()
+
+CREDIT_RESET_PAGE_SIZE = int(os.getenv("CREDIT_RESET_PAGE_SIZE", "1000"))
+# Onde a execução guarda o progresso (apagado quando termina)
+CREDIT_RESET_CHECKPOINT = os.getenv("CREDIT_RESET_CHECKPOINT", "credit_reset.checkpoint.json")
+
+
+def _ler_checkpoint(caminho):
+    if not caminho or not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except Exception as e:
+        print(f"⚠️ Checkpoint do reset ilegível ({caminho}), começando do zero: {e}")
+        return None
+
+
+def _gravar_checkpoint(caminho, estado):
+    if not caminho:
+        return
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(estado, arquivo)
+    os.replace(temporario, caminho)
+
+
+def run_credit_reset(storage, page_size=CREDIT_RESET_PAGE_SIZE, checkpoint_path=CREDIT_RESET_CHECKPOINT, now=None):
+    """
+    Renova os créditos de todos os perfis FREE com ciclo vencido, em páginas por id
+    (um UPDATE por página, ver storage.reset_free_credits).
+    Idempotente: quem foi renovado sai do filtro. Retomável: o checkpoint guarda o 'agora'
+    da execução e o último id; uma execução interrompida continua dali com o mesmo corte.
+    Devolve {'reset', 'pages', 'seconds', 'rows_per_s', 'resumed'}; reset inclui o que a execução
+    interrompida já tinha renovado, rows_per_s só o desta.
+    """
+    estado = _ler_checkpoint(checkpoint_path)
+    retomada = estado is not None
+    if retomada:
+        now = parse_reset_time(estado["now"])
+        depois_de = estado["last_id"]
+        renovados = estado.get("reset", 0)
+        print(f"↪️ Retomando reset de {now.isoformat()} após o id {depois_de} ({renovados} já renovados)")
+    else:
+        now = now or datetime.now(timezone.utc)
+        depois_de = None
+        renovados = 0
+
+    paginas = 0
+    renovados_antes = renovados
+    inicio = time.perf_counter()
+    while True:
+        pagina = storage.reset_free_credits(depois_de, page_size, now)
+        if pagina["last_id"] is None:
+            break
+        renovados += pagina["reset"]
+        paginas += 1
+        depois_de = pagina["last_id"]
+        _gravar_checkpoint(checkpoint_path, {"now": now.isoformat(), "last_id": depois_de, "reset": renovados})
+        if pagina["reset"] < page_size:
+            # Página incompleta: não há mais perfis vencidos depois deste id
+            break
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "reset": renovados,
+        "pages": paginas,
+        "seconds": round(segundos, 3),
+        "rows_per_s": round((renovados - renovados_antes) / segundos, 1) if segundos > 0 else 0.0,
+        "resumed": retomada,
+    }
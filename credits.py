@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+FREE_DAILY_CREDITS = 3
+PAID_PLANS = ["pro_monthly", "pro_annual", "admin"]
+# Ciclo do FREE: o saldo volta a FREE_DAILY_CREDITS 24h depois do último reset
+FREE_RESET_INTERVAL = timedelta(hours=24)
+
+
+def parse_reset_time(valor):
+    """last_credit_reset do banco (texto ISO ou datetime) em UTC; datas sem fuso são UTC"""
+    if valor is None:
+        return None
+    data = valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc)
+
+
+def free_credit_status(profile, now=None):
+    """
+    Saldo FREE como o usuário vê, só com a leitura do perfil (sem gravar nada).
+    Ciclo vencido (ou nunca iniciado) conta como renovado: quem grava a renovação é o job
+    de reset (main.py reset-credits) ou o próximo reserve_credit.
+    Devolve {'balance', 'due', 'next_reset'}; next_reset é None quando due.
+    """
+    now = now or datetime.now(timezone.utc)
+    ultimo_reset = parse_reset_time(profile.get("last_credit_reset"))
+    if ultimo_reset is None or now - ultimo_reset >= FREE_RESET_INTERVAL:
+        return {"balance": FREE_DAILY_CREDITS, "due": True, "next_reset": None}
+    return {"balance": profile.get("credits_balance") or 0, "due": False, "next_reset": ultimo_reset + FREE_RESET_INTERVAL}
+
+
+class SupabaseCreditStore:
+    """
+    Reserva/estorno de crédito em uma única ida ao banco.
+    Usa as funções reserve_credit/refund_credit (sql/004_reserve_credit.sql) via RPC.
+    """
+
+    def __init__(self, client, execute=None):
+        self.client = client
+        self._execute = execute or (lambda query: query.execute())
+
+    def reserve(self, user_id):
+        """Débito condicional atômico: {'allowed', 'plan_status', 'balance'}"""
+        response = self._execute(self.client.rpc("reserve_credit", {"p_user_id": user_id}))
+        if not response.data:
+            return {"allowed": False, "plan_status": None, "balance": None}
+
+        row = response.data[0]
+        return {
+            "allowed": bool(row["allowed"]),
+            "plan_status": row["plan_status"],
+            "balance": row["credits_balance"],
+        }
+
+    def refund(self, user_id):
+        """Devolve o crédito reservado (só planos FREE, sem passar do limite diário)"""
+        response = self._execute(self.client.rpc("refund_credit", {"p_user_id": user_id}))
+        return response.data
+
+    def reset_free(self, after, limit, now):
+        """Uma página do reset em lote (sql/011_free_credit_reset.sql): {'reset', 'last_id'}"""
+        response = self._execute(self.client.rpc("reset_free_credits", {
+            "p_after": after,
+            "p_limit": limit,
+            "p_now": now.isoformat(),
+        }))
+        row = response.data[0] if response.data else {}
+        return {"reset": row.get("reset_count") or 0, "last_id": row.get("last_id")}
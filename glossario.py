@@ -0,0 +1,221 @@
+import os
+import re
+import unicodedata
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Só tenta o atalho em movimentações curtas (uma linha do andamento)
+GLOSSARIO_MAX_CHARS = int(os.getenv("GLOSSARIO_MAX_CHARS", "120"))
+GLOSSARIO_VERSION = "glossario-v1"
+
+# Palavras que podem sobrar sem mudar o sentido da movimentação
+PALAVRAS_NEUTRAS = {
+    "de", "do", "da", "dos", "das", "o", "a", "os", "as", "e", "em", "no", "na", "nos", "nas",
+    "ao", "aos", "para", "pelo", "pela", "com", "ref", "referente", "autos", "processo",
+}
+# Números só são aceitos como referência (fls. 12, ID 345, evento 7), nunca como prazo/data
+PALAVRAS_REFERENCIA = {"fls", "fl", "id", "evento", "mov", "seq", "n", "no", "num"}
+
+# Movimentações padronizadas: variações (sem acento, minúsculas) → explicação fixa
+MOVIMENTACOES = {
+    "conclusos": {
+        "padroes": [
+            "conclusos para despacho", "conclusos para decisao", "conclusos para sentenca",
+            "conclusos ao juiz", "conclusos ao magistrado", "conclusos para julgamento", "conclusos",
+            "concluso para despacho", "concluso para decisao", "concluso para sentenca", "concluso",
+        ],
+        "o_que": "O processo foi enviado ao juiz para que ele analise e decida o próximo passo.",
+        "proximo": "Agora é aguardar a manifestação do juiz. Não há nada que você precise fazer neste momento, nós acompanhamos.",
+    },
+    "juntada": {
+        "padroes": [
+            "juntada de peticao", "juntada de documento", "juntada de documentos", "juntada de mandado",
+            "juntada de ar", "juntada de aviso de recebimento", "juntada de oficio", "juntada de certidao",
+            "juntada de procuracao", "juntada",
+        ],
+        "o_que": "Um novo documento foi anexado ao processo.",
+        "proximo": "O documento será analisado no andamento normal do processo. Se for necessário algo de você, avisaremos.",
+    },
+    "decorrido_prazo": {
+        "padroes": ["decorrido prazo", "decorrido o prazo", "decurso de prazo", "decurso do prazo", "prazo decorrido"],
+        "o_que": "Terminou o prazo que havia sido dado para uma das partes se manifestar no processo.",
+        "proximo": "O processo segue para a próxima etapa. Nós acompanhamos e avisamos quando houver novidade.",
+    },
+    "intimacao_expedida": {
+        "padroes": [
+            "expedicao de intimacao", "expedida intimacao", "intimacao expedida",
+            "expedicao de mandado", "expedido mandado", "mandado expedido",
+        ],
+        "o_que": "O tribunal emitiu uma comunicação oficial para informar uma das partes sobre o processo.",
+        "proximo": "Assim que a comunicação for entregue, acompanhamos se há algum prazo e avisamos você.",
+    },
+    "publicacao": {
+        "padroes": ["publicado no dje", "disponibilizado no dje", "publicacao no dje", "disponibilizado no diario", "publicado", "publicacao"],
+        "o_que": "Uma decisão do processo foi publicada no diário oficial da Justiça.",
+        "proximo": "Nós analisamos o conteúdo publicado e avisamos se houver algum prazo ou providência.",
+    },
+    "recebidos": {
+        "padroes": ["recebidos os autos", "autos recebidos", "recebimento dos autos"],
+        "o_que": "O processo chegou a um novo setor do tribunal para continuar andando.",
+        "proximo": "É uma etapa interna do tribunal. Não há nada que você precise fazer agora.",
+    },
+    "remessa": {
+        "padroes": ["remetidos os autos", "remessa dos autos", "autos remetidos"],
+        "o_que": "O processo foi enviado para outro setor do tribunal, para a próxima etapa.",
+        "proximo": "É uma etapa interna do tribunal. Seguimos acompanhando.",
+    },
+    "ato_ordinatorio": {
+        "padroes": ["ato ordinatorio praticado", "ato ordinatorio", "mero expediente", "despacho de mero expediente"],
+        "o_que": "O cartório fez um ato de rotina para organizar o andamento do processo.",
+        "proximo": "Não há decisão nem prazo para você. O processo segue normalmente.",
+    },
+    "transito_julgado": {
+        "padroes": ["transitado em julgado", "transito em julgado", "certidao de transito em julgado"],
+        "o_que": "A decisão do processo se tornou definitiva, pois não cabe mais recurso.",
+        "proximo": "Vamos avaliar as providências necessárias a partir de agora e entramos em contato.",
+    },
+    "arquivamento": {
+        "padroes": ["arquivado definitivamente", "arquivamento definitivo", "baixa definitiva", "arquivados os autos"],
+        "o_que": "O processo foi arquivado, ou seja, foi encerrado no tribunal.",
+        "proximo": "Se houver qualquer dúvida sobre o encerramento, estamos à disposição.",
+    },
+    "redistribuicao": {
+        "padroes": ["redistribuido", "redistribuicao", "redistribuidos os autos"],
+        "o_que": "O processo foi transferido para outro juiz ou vara.",
+        "proximo": "É uma mudança administrativa. O processo continua normalmente e nós seguimos acompanhando.",
+    },
+}
+
+SAUDACOES = {
+    "Empático": "Olá, *{nome}*! Tudo bem? Passando para te atualizar sobre o seu processo.",
+    "Formal": "Prezado(a) *{nome}*, segue uma atualização sobre o seu processo.",
+    "Direto": "*{nome}*, atualização do seu processo:",
+}
+
+
+def _fold(texto):
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+class AhoCorasick:
+    """Casamento de vários padrões numa única passada pelo texto"""
+
+    def __init__(self, padroes):
+        self._goto = [{}]
+        self._fail = [0]
+        self._saida = [[]]
+        for padrao, valor in padroes:
+            self._add(padrao, valor)
+        self._build()
+
+    def _add(self, padrao, valor):
+        estado = 0
+        for c in padrao:
+            if c not in self._goto[estado]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._saida.append([])
+                self._goto[estado][c] = len(self._goto) - 1
+            estado = self._goto[estado][c]
+        self._saida[estado].append((len(padrao), valor))
+
+    def _build(self):
+        fila = deque(self._goto[0].values())
+        while fila:
+            estado = fila.popleft()
+            for c, proximo in self._goto[estado].items():
+                fila.append(proximo)
+                if estado == 0:
+                    continue
+                falha = self._fail[estado]
+                while falha and c not in self._goto[falha]:
+                    falha = self._fail[falha]
+                self._fail[proximo] = self._goto[falha].get(c, 0)
+                self._saida[proximo] = self._saida[proximo] + self._saida[self._fail[proximo]]
+
+    def find_all(self, texto):
+        """Gera (inicio, fim, valor) de cada ocorrência"""
+        estado = 0
+        for i, c in enumerate(texto):
+            while estado and c not in self._goto[estado]:
+                estado = self._fail[estado]
+            estado = self._goto[estado].get(c, 0)
+            for tamanho, valor in self._saida[estado]:
+                yield i - tamanho + 1, i + 1, valor
+
+
+_automato = AhoCorasick(
+    (padrao, chave) for chave, mov in MOVIMENTACOES.items() for padrao in mov["padroes"]
+)
+
+
+def _limite_palavra(texto, inicio, fim):
+    antes = inicio == 0 or not texto[inicio - 1].isalnum()
+    depois = fim == len(texto) or not texto[fim].isalnum()
+    return antes and depois
+
+
+def match_movement(texto_processo):
+    """
+    Identifica uma movimentação padronizada que cubra o texto inteiro.
+    Retorna a chave da movimentação ou None (texto longo, mais de uma movimentação
+    ou qualquer conteúdo que o glossário não explica — ex: prazos e datas).
+    """
+    if not texto_processo or len(texto_processo) > GLOSSARIO_MAX_CHARS:
+        return None
+
+    texto = _fold(texto_processo)
+
+    # Fica com as ocorrências mais longas, sem sobreposição
+    ocorrencias = sorted(
+        (m for m in _automato.find_all(texto) if _limite_palavra(texto, m[0], m[1])),
+        key=lambda m: (m[0], -(m[1] - m[0]))
+    )
+    coberto = [False] * len(texto)
+    movimentos = set()
+    for inicio, fim, chave in ocorrencias:
+        if any(coberto[inicio:fim]):
+            continue
+        coberto[inicio:fim] = [True] * (fim - inicio)
+        movimentos.add(chave)
+
+    if len(movimentos) != 1:
+        return None
+
+    # Tudo o que sobrou precisa ser neutro (preposições, referências de folhas/IDs)
+    anterior = None
+    for match in re.finditer(r"\w+", texto):
+        if all(coberto[match.start():match.end()]):
+            anterior = None
+            continue
+        palavra = match.group()
+        if palavra.isdigit():
+            if anterior not in PALAVRAS_REFERENCIA:
+                return None
+        elif palavra not in PALAVRAS_NEUTRAS and palavra not in PALAVRAS_REFERENCIA:
+            return None
+        anterior = palavra
+
+    return movimentos.pop()
+
+
+def render_template(chave, tom_de_voz, nome_cliente):
+    """Mensagem no formato 📌 / 👉 a partir do glossário (sem prazo: não há prazo nessas movimentações)"""
+    mov = MOVIMENTACOES[chave]
+    saudacao = SAUDACOES.get(tom_de_voz, SAUDACOES["Formal"]).format(nome=nome_cliente or "Cliente")
+    return (
+        f"{saudacao}\n\n"
+        f"📌 O que aconteceu: {mov['o_que']}\n\n"
+        f"👉 Próximo passo: {mov['proximo']}"
+    )
+
+
+def try_glossary(texto_processo, tom_de_voz, nome_cliente):
+    """Atalho determinístico: mensagem pronta ou None (cai para o modelo)"""
+    chave = match_movement(texto_processo)
+    if chave is None:
+        return None
+    return render_template(chave, tom_de_voz, nome_cliente)
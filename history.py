@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from services import SaaSLogger
+
+load_dotenv()
+
+HISTORY_CACHE_USERS = int(os.getenv("HISTORY_CACHE_USERS", "1000"))
+# Logs são gravados em lote (audit_writer): a sincronização relê uma pequena folga para trás
+HISTORY_SYNC_OVERLAP_S = float(os.getenv("HISTORY_SYNC_OVERLAP_S", "30"))
+# Depois de uma geração, continua sincronizando até o novo item aparecer (no máximo esse tempo)
+HISTORY_STALE_S = float(os.getenv("HISTORY_STALE_S", "10"))
+
+
+def _parse(created_at):
+    dt = datetime.fromisoformat(created_at)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class HistoryCache:
+    """
+    Histórico (só prévias) por usuário, compartilhado entre as sessões do processo.
+    Depois da primeira página, cada atualização busca apenas os itens mais novos
+    que o último created_at visto; itens fora da janela do plano são descartados localmente.
+    """
+
+    def __init__(self, max_users=HISTORY_CACHE_USERS):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id, plan_status):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry["plan_status"] == plan_status:
+                self._users.move_to_end(user_id)
+                return entry
+
+        itens, tem_mais = SaaSLogger.get_history_page(user_id, plan_status)
+        entry = {
+            "plan_status": plan_status,
+            "itens": itens,
+            "tem_mais": tem_mais,
+            "stale_until": 0.0,
+            "lock": threading.Lock(),
+        }
+        with self._lock:
+            self._users[user_id] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return entry
+
+    def _evict_expired(self, entry):
+        inicio = SaaSLogger.history_window_start(entry["plan_status"])
+        entry["itens"] = [item for item in entry["itens"] if _parse(item["created_at"]) >= inicio]
+
+    def _sync(self, user_id, entry):
+        """Busca só o que é mais novo que o último item visto; devolve quantos chegaram"""
+        if entry["itens"]:
+            desde = _parse(entry["itens"][0]["created_at"]) - timedelta(seconds=HISTORY_SYNC_OVERLAP_S)
+        else:
+            desde = SaaSLogger.history_window_start(entry["plan_status"])
+
+        novos = SaaSLogger.get_history_since(user_id, entry["plan_status"], desde)
+        conhecidos = {item["id"] for item in entry["itens"]}
+        novos = [item for item in novos if item["id"] not in conhecidos]
+
+        if novos:
+            entry["itens"] = sorted(novos + entry["itens"], key=lambda item: _parse(item["created_at"]), reverse=True)
+        return len(novos)
+
+    def get(self, user_id, plan_status, refresh=False):
+        """Itens em cache; refresh=True (ou geração recente) faz a sincronização incremental"""
+        entry = self._entry(user_id, plan_status)
+
+        with entry["lock"]:
+            if refresh or time.monotonic() < entry["stale_until"]:
+                if self._sync(user_id, entry):
+                    entry["stale_until"] = 0.0
+            self._evict_expired(entry)
+            return list(entry["itens"]), entry["tem_mais"]
+
+    def load_more(self, user_id, plan_status):
+        """Página seguinte (mais antiga) do histórico"""
+        entry = self._entry(user_id, plan_status)
+
+        with entry["lock"]:
+            if not entry["tem_mais"] or not entry["itens"]:
+                return
+            mais, tem_mais = SaaSLogger.get_history_page(
+                user_id,
+                plan_status,
+                before=entry["itens"][-1]["created_at"]
+            )
+            conhecidos = {item["id"] for item in entry["itens"]}
+            entry["itens"] += [item for item in mais if item["id"] not in conhecidos]
+            entry["tem_mais"] = tem_mais
+
+    def mark_stale(self, user_id):
+        """Chamado após uma geração: as próximas leituras sincronizam até o log aparecer"""
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is not None:
+            entry["stale_until"] = time.monotonic() + HISTORY_STALE_S
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_NAME = "gemini-2.5-flash"
+
+# Incrementar sempre que o texto do prompt mudar (invalida o cache de traduções)
+PROMPT_VERSION = "v1"
+
+# Pool HTTP do cliente Gemini (compartilhado por todas as sessões do processo)
+GEMINI_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "60"))
+GEMINI_CONNECT_TIMEOUT_S = float(os.getenv("GEMINI_CONNECT_TIMEOUT_S", "5"))
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_MAX_KEEPALIVE = int(os.getenv("GEMINI_MAX_KEEPALIVE", "10"))
+GEMINI_KEEPALIVE_EXPIRY_S = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY_S", "120"))
+
+_client = None
+_client_lock = threading.Lock()
+_client_info = {"created_at": None, "uses": 0, "resets": 0, "last_error": None}
+
+
+def _create_client(api_key):
+    # SDK importado só na primeira geração (~400 ms a menos no cold start do app)
+    import httpx
+    from google import genai
+    from google.genai import types
+
+    http_options = types.HttpOptions(
+        timeout=int(GEMINI_TIMEOUT_S * 1000),
+        client_args={
+            "limits": httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=GEMINI_MAX_KEEPALIVE,
+                keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY_S
+            ),
+            "timeout": httpx.Timeout(GEMINI_TIMEOUT_S, connect=GEMINI_CONNECT_TIMEOUT_S)
+        }
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def get_client():
+    """
+    Devolve o cliente Gemini único do processo, criando na primeira chamada.
+    Retorna None se a GOOGLE_API_KEY não estiver configurada.
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    return None
+                _client = _create_client(api_key)
+                _client_info["created_at"] = time.time()
+
+    _client_info["uses"] += 1
+    return _client
+
+
+def reset_client(reason=None):
+    """Descarta o cliente atual (ex: conexão quebrada); o próximo get_client recria"""
+    global _client
+
+    with _client_lock:
+        antigo, _client = _client, None
+        _client_info["resets"] += 1
+        _client_info["last_error"] = str(reason) if reason else None
+
+    if antigo is not None:
+        try:
+            antigo.close()
+        except Exception as e:
+            print(f"⚠️ Erro ao fechar cliente Gemini: {e}")
+
+
+class AttemptTimeoutError(TimeoutError):
+    """Tentativa passou do prazo"""
+
+
+def handle_client_error(error):
+    """Reseta o cliente apenas para falhas de transporte (rede/TLS), não para erros da API"""
+    # Sem httpx carregado ainda não existe cliente, então não há conexão para resetar
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        print(f"🔌 Cliente Gemini resetado após erro de conexão: {error}")
+        reset_client(error)
+
+
+def client_health():
+    """Estado do cliente compartilhado (para o painel de admin)"""
+    return {
+        "active": _client is not None,
+        "uptime_s": int(time.time() - _client_info["created_at"]) if _client is not None and _client_info["created_at"] else 0,
+        "uses": _client_info["uses"],
+        "resets": _client_info["resets"],
+        "last_error": _client_info["last_error"],
+    }
+
+
+def build_prompt(texto_processo, tipo_andamento, tom_de_voz, nome_cliente):
+    """Monta o prompt enviado ao Gemini"""
+    return f"""
+    Você é um advogado experiente traduzindo um andamento processual
+    para um cliente leigo no WhatsApp.
+
+    DADOS:
+    - Tipo: {tipo_andamento}
+    - Cliente: {nome_cliente if nome_cliente else 'Cliente'}
+    - Tom: {tom_de_voz}
+    - Texto Original: \"\"\"{texto_processo}\"\"\"
+
+    REGRAS DE OURO:
+    1. Traduza termos técnicos jurídicos para linguagem simples.
+       - Se necessário, explique brevemente entre parênteses.
+       - Ex: "conclusos" → "o processo foi enviado ao juiz para decisão".
+
+    2. Se houver PRAZO ou DATA IMPORTANTE:
+       - Destaque APENAS o prazo usando negrito com uma única estrela.
+       - Exemplo correto: *15 dias*
+       - Não use negrito para mais nada.
+
+    3. Adote um tom:
+       - Calmo, profissional e tranquilizador.
+       - Nunca prometa resultado ou vitória no processo.
+
+    4. Use parágrafos curtos e frases diretas.
+       - Evite blocos longos de texto.
+       - Priorize clareza em vez de formalidade.
+
+    5. Se o nome do cliente não estiver informado:
+       - Utilize o termo “Cliente”.
+
+    6. Escreva como se estivesse explicando para alguém sem conhecimento jurídico.
+    7. Coloque apenas dois arestisticos. Exemplo ("Olá, *Cliente*")
+    8. Nunca coloque as respostas como vitória ou derrota processual, apenas como andamento.
+    9. Leve muito em consideração o tom de voz passado.
+
+    FORMATO DE SAÍDA (obrigatório):
+    - 📌 O que aconteceu: resumo em **1 frase simples**, sem termos técnicos.
+    - 📅 Prazos/Datas: informe apenas se houver prazo ou data relevante.
+    - 👉 Próximo passo: explique claramente o que será feito a seguir e por quem.
+
+    """
+
+
+def build_chunk_prompt(trecho, parte, total_partes, tipo_andamento):
+    """Prompt da etapa de resumo de um trecho de documento longo (map)"""
+    return f"""
+    Você é um advogado experiente. Abaixo está a parte {parte} de {total_partes}
+    de um documento processual do tipo "{tipo_andamento}".
+
+    Resuma este trecho em no máximo 8 linhas, para outro advogado.
+    - Preserve TODOS os prazos, datas, valores, nomes de partes e determinações do juiz.
+    - Preserve o que foi decidido (deferido, indeferido, procedente, improcedente, etc).
+    - Não invente nada que não esteja no trecho.
+
+    Trecho: \"\"\"{trecho}\"\"\"
+    """
+
+
+def _request_config(timeout_s):
+    """Timeout por chamada (menor que o do cliente) para a rota poder cair no próximo modelo"""
+    if not timeout_s:
+        return None
+    from google.genai import types
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=int(timeout_s * 1000)))
+
+
+def generate(client, model, prompt, timeout_s=None):
+    """Chamada simples (sem streaming); devolve (texto, usage_metadata)"""
+    response = client.models.generate_content(model=model, contents=prompt, config=_request_config(timeout_s))
+    return response.text, response.usage_metadata
+
+
+def stream_generate(client, model, prompt, on_text=None, start_time=None, timeout_s=None, deadline=None):
+    """
+    Gera a resposta em streaming.
+    Chama on_text(texto_parcial) a cada pedaço recebido e devolve
+    (texto_completo, usage_metadata, segundos_ate_primeiro_token).
+    O TTFT é medido a partir de start_time (padrão: início da chamada).
+    deadline: time.time() limite da tentativa; passado o prazo o stream é fechado
+    (AttemptTimeoutError), mesmo que os pedaços continuem chegando.
+    """
+    start_time = start_time or time.time()
+    first_token_at = None
+    usage = None
+    partes = []
+
+    if deadline:
+        # O timeout HTTP cobre o stream parado (sem pedaços); o deadline, o stream lento
+        timeout_s = min(timeout_s or GEMINI_TIMEOUT_S, max(0.001, deadline - time.time()))
+
+    stream = client.models.generate_content_stream(model=model, contents=prompt, config=_request_config(timeout_s))
+    for chunk in stream:
+        if deadline and time.time() > deadline:
+            fechar = getattr(stream, "close", None)
+            if fechar:
+                fechar()
+            raise AttemptTimeoutError(f"streaming do Gemini passou do prazo ({len(partes)} pedaços recebidos)")
+
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata
+
+        if not chunk.text:
+            continue
+
+        if first_token_at is None:
+            first_token_at = time.time()
+
+        partes.append(chunk.text)
+        if on_text:
+            on_text("".join(partes))
+
+    ttft = (first_token_at - start_time) if first_token_at else None
+    return "".join(partes), usage, ttft
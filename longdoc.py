@@ -0,0 +1,145 @@
+import os
+import re
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from dotenv import load_dotenv
+from llm import build_prompt, build_chunk_prompt
+
+load_dotenv()
+
+# Acima deste tamanho estimado o texto vai para o modo documento longo (map-reduce)
+LONG_DOC_TOKEN_BUDGET = int(os.getenv("LONG_DOC_TOKEN_BUDGET", "6000"))
+LONG_DOC_CHUNK_TOKENS = int(os.getenv("LONG_DOC_CHUNK_TOKENS", "2500"))
+LONG_DOC_MAX_PARALLEL = int(os.getenv("LONG_DOC_MAX_PARALLEL", "4"))
+
+# Média para português jurídico no tokenizer do Gemini (estimativa conservadora)
+CHARS_PER_TOKEN = 3.5
+
+# Marcos da estrutura de decisões/sentenças: começam um novo trecho sempre que possível
+MARCOS_ESTRUTURA = re.compile(
+    r"^\s*(RELATÓRIO|FUNDAMENTAÇÃO|FUNDAMENTOS|DISPOSITIVO|DECIDO|É o relatório|"
+    r"Ante o exposto|Diante do exposto|Isto posto|Posto isso|Pelo exposto)",
+    re.IGNORECASE
+)
+FIM_DE_FRASE = re.compile(r"(?<=[.;:!?])\s+")
+
+
+def estimate_tokens(texto):
+    """Estimativa local de tokens (sem chamada à API)"""
+    return math.ceil(len(texto or "") / CHARS_PER_TOKEN)
+
+
+def _split_long_paragraph(paragrafo, max_tokens):
+    """Quebra um parágrafo gigante em frases, agrupando até max_tokens"""
+    partes, atual = [], ""
+    for frase in FIM_DE_FRASE.split(paragrafo):
+        if atual and estimate_tokens(atual) + estimate_tokens(frase) > max_tokens:
+            partes.append(atual)
+            atual = ""
+        atual = f"{atual} {frase}".strip()
+    if atual:
+        partes.append(atual)
+    return partes
+
+
+def split_legal_chunks(texto, max_tokens=LONG_DOC_CHUNK_TOKENS):
+    """
+    Divide o documento em trechos de até max_tokens, quebrando em parágrafos
+    e abrindo um trecho novo nos marcos (RELATÓRIO, DISPOSITIVO, "Ante o exposto"...).
+    """
+    paragrafos = []
+    for paragrafo in re.split(r"\n\s*\n|\n(?=\s*[A-ZÁÉÍÓÚÂÊÔÃÕÇ]{4,})", texto):
+        paragrafo = paragrafo.strip()
+        if not paragrafo:
+            continue
+        if estimate_tokens(paragrafo) > max_tokens:
+            paragrafos.extend(_split_long_paragraph(paragrafo, max_tokens))
+        else:
+            paragrafos.append(paragrafo)
+
+    trechos, atual = [], []
+    for paragrafo in paragrafos:
+        tamanho_atual = estimate_tokens("\n\n".join(atual))
+        novo_marco = MARCOS_ESTRUTURA.match(paragrafo) and tamanho_atual > max_tokens // 4
+        if atual and (novo_marco or tamanho_atual + estimate_tokens(paragrafo) > max_tokens):
+            trechos.append("\n\n".join(atual))
+            atual = []
+        atual.append(paragrafo)
+    if atual:
+        trechos.append("\n\n".join(atual))
+    return trechos
+
+
+def _usage_tokens(usage):
+    return (usage.prompt_token_count if usage else 0) or 0, (usage.candidates_token_count if usage else 0) or 0
+
+
+def map_reduce_generate(gerar, texto_processo, tipo_andamento, tom_de_voz, nome_cliente, on_text=None):
+    """
+    Documento longo: resume os trechos em paralelo (map) e gera a mensagem final
+    de 3 seções a partir dos resumos (reduce).
+    gerar(prompt, on_text=None) -> (texto, usage, ttft, modelo) faz uma chamada com prazo, retry,
+    disjuntor e modelo reserva próprios (pipeline.py): um trecho que falha é refeito sozinho,
+    sem repetir os que já deram certo.
+    Devolve (texto, tokens_in, tokens_out, ttft, etapas, modelo_do_reduce).
+    """
+    trechos = split_legal_chunks(texto_processo)
+
+    def resumir(indice):
+        inicio = time.time()
+        prompt = build_chunk_prompt(trechos[indice], indice + 1, len(trechos), tipo_andamento)
+        resumo, usage, _, modelo = gerar(prompt)
+        t_in, t_out = _usage_tokens(usage)
+        etapa = {
+            "stage": "map",
+            "part": indice + 1,
+            "model": modelo,
+            "tokens_est": estimate_tokens(trechos[indice]),
+            "tokens_in": t_in,
+            "tokens_out": t_out,
+            "ms": int((time.time() - inicio) * 1000),
+        }
+        return resumo, etapa
+
+    with ThreadPoolExecutor(max_workers=max(1, LONG_DOC_MAX_PARALLEL), thread_name_prefix="map") as executor:
+        futuros = [executor.submit(resumir, indice) for indice in range(len(trechos))]
+        feitos, pendentes = wait(futuros, return_when=FIRST_EXCEPTION)
+        # Um trecho falhou de vez (todos os modelos / prazo da geração): não começa os que faltam
+        for futuro in pendentes:
+            futuro.cancel()
+        erro = next((futuro.exception() for futuro in feitos if futuro.exception()), None)
+        if erro is not None:
+            raise erro
+        resultados = [futuro.result() for futuro in futuros]
+
+    resumos = [resumo for resumo, _ in resultados]
+    etapas = [etapa for _, etapa in resultados]
+
+    texto_condensado = "\n\n".join(
+        f"[Parte {i + 1} de {len(resumos)}]\n{resumo}" for i, resumo in enumerate(resumos)
+    )
+    prompt_final = build_prompt(
+        f"(Documento longo resumido por partes)\n{texto_condensado}",
+        tipo_andamento,
+        tom_de_voz,
+        nome_cliente
+    )
+
+    inicio = time.time()
+    texto_final, usage, ttft, modelo = gerar(prompt_final, on_text=on_text)
+
+    t_in, t_out = _usage_tokens(usage)
+    etapas.append({
+        "stage": "reduce",
+        "part": None,
+        "model": modelo,
+        "tokens_est": estimate_tokens(prompt_final),
+        "tokens_in": t_in,
+        "tokens_out": t_out,
+        "ms": int((time.time() - inicio) * 1000),
+    })
+
+    tokens_in = sum(etapa["tokens_in"] for etapa in etapas)
+    tokens_out = sum(etapa["tokens_out"] for etapa in etapas)
+    return texto_final, tokens_in, tokens_out, ttft, etapas, modelo
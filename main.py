@@ -1,6 +1,40 @@
-def main():
-    print("Hello from translateprocessual!")
+import sys
+import time
+import argparse
+from credit_reset import run_credit_reset, CREDIT_RESET_PAGE_SIZE, CREDIT_RESET_CHECKPOINT
+
+
+def reset_credits(args):
+    """Reset em lote dos créditos FREE; --every repete sem precisar de cron"""
+    from storage import create_storage
+    storage = create_storage()
+
+    while True:
+        resultado = run_credit_reset(storage, page_size=args.page_size, checkpoint_path=args.checkpoint)
+        print(
+            f"✅ Créditos renovados: {resultado['reset']} perfis em {resultado['pages']} página(s) · "
+            f"{resultado['seconds']:.2f} s · {resultado['rows_per_s']:.0f} linhas/s"
+            + (" (retomado)" if resultado["resumed"] else "")
+        )
+        if not args.every:
+            return 0
+        time.sleep(args.every * 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tarefas de manutenção do TraduzJur")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    reset = comandos.add_parser("reset-credits", help="renova em lote os créditos diários dos planos FREE")
+    reset.add_argument("--page-size", type=int, default=CREDIT_RESET_PAGE_SIZE, help="perfis por UPDATE")
+    reset.add_argument("--checkpoint", default=CREDIT_RESET_CHECKPOINT,
+                       help="arquivo de progresso para retomar uma execução interrompida ('' desliga)")
+    reset.add_argument("--every", type=float, default=0, metavar="MIN", help="repete a cada MIN minutos")
+    reset.set_defaults(func=reset_credits)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH")
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH")
+METRICS_DUMP_INTERVAL_S = float(os.getenv("METRICS_DUMP_INTERVAL_S", "60"))
+
+# Limites dos buckets (ms) no estilo Prometheus; os percentis usam as últimas amostras
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+AMOSTRAS_MAX = 2048
+
+
+class Histogram:
+    """Buckets cumulativos (exportação) + janela das últimas amostras (p50/p95/p99)"""
+
+    def __init__(self):
+        self.count = 0
+        self.sum_ms = 0.0
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.samples = deque(maxlen=AMOSTRAS_MAX)
+
+    def observe(self, ms):
+        self.count += 1
+        self.sum_ms += ms
+        indice = bisect.bisect_left(BUCKETS_MS, ms)
+        if indice < len(self.buckets):
+            self.buckets[indice] += 1
+        self.samples.append(ms)
+
+    def percentiles(self):
+        ordenadas = sorted(self.samples)
+        if not ordenadas:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+
+        def p(q):
+            return ordenadas[min(len(ordenadas) - 1, int(q * len(ordenadas)))]
+
+        return {"p50": p(0.50), "p95": p(0.95), "p99": p(0.99)}
+
+
+class MetricsRegistry:
+    """
+    Histogramas de latência e contadores do processo, mais o rastro de etapas
+    do rerun atual (por thread: cada sessão do Streamlit roda na sua).
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.cold_start_ms = None
+
+    def observe(self, name, ms):
+        with self._lock:
+            histograma = self._histograms.get(name)
+            if histograma is None:
+                histograma = self._histograms[name] = Histogram()
+            histograma.observe(ms)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def percentiles(self, name, min_samples=1):
+        """p50/p95/p99 recentes de um histograma; None se ainda não houver amostras suficientes"""
+        with self._lock:
+            histograma = self._histograms.get(name)
+            if histograma is None or len(histograma.samples) < min_samples:
+                return None
+            return histograma.percentiles()
+
+    @contextmanager
+    def timer(self, name):
+        """Mede o bloco: histograma 'name', contador 'name.errors' e etapa no rastro do rerun"""
+        profundidade = getattr(self._local, "depth", 0)
+        self._local.depth = profundidade + 1
+        # Entra no rastro na ordem de início (as etapas internas ficam abaixo da externa)
+        etapa = {"stage": name, "ms": None, "depth": profundidade}
+        rastro = getattr(self._local, "trace", None)
+        if rastro is not None:
+            rastro.append(etapa)
+        inicio = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f"{name}.errors")
+            raise
+        finally:
+            etapa["ms"] = (time.perf_counter() - inicio) * 1000
+            self._local.depth = profundidade
+            self.observe(name, etapa["ms"])
+
+    def timed(self, name):
+        """Decorator equivalente ao timer()"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument_class(self, prefix):
+        """Decorator de classe: mede todos os staticmethods como '<prefix>.<método>'"""
+        def decorator(cls):
+            for nome, atributo in list(vars(cls).items()):
+                if isinstance(atributo, staticmethod):
+                    setattr(cls, nome, staticmethod(self.timed(f"{prefix}.{nome}")(atributo.__func__)))
+            return cls
+        return decorator
+
+    def start_trace(self, started=None):
+        """
+        Começa um rastro novo de etapas nesta thread (início do rerun).
+        started: perf_counter do topo do app.py; no primeiro rerun do processo o trecho
+        até aqui são as importações (registrado uma vez como 'app.cold_start').
+        """
+        agora = time.perf_counter()
+        self._local.trace = []
+        self._local.trace_started = started or agora
+        with self._lock:
+            primeiro = self.cold_start_ms is None
+            if primeiro:
+                self.cold_start_ms = (agora - self._local.trace_started) * 1000
+        if primeiro:
+            self.observe("app.cold_start", self.cold_start_ms)
+
+    def finish_trace(self):
+        """Fim do rerun: registra o tempo total do script em 'app.rerun'"""
+        _, total = self.trace()
+        self.observe("app.rerun", total)
+        return total
+
+    def begin_capture(self):
+        """Rastro novo nesta thread para trabalho feito em nome de outra (pool do single-flight)"""
+        self._local.trace = []
+        self._local.trace_started = time.perf_counter()
+        self._local.depth = 0
+
+    def end_capture(self):
+        """Etapas capturadas desde o begin_capture; a thread volta a não ter rastro"""
+        etapas = [etapa for etapa in getattr(self._local, "trace", None) or [] if etapa["ms"] is not None]
+        self._local.trace = None
+        self._local.trace_started = None
+        return etapas
+
+    def merge_trace(self, etapas):
+        """Junta ao rastro desta thread etapas medidas em outra (abaixo da etapa em andamento)"""
+        rastro = getattr(self._local, "trace", None)
+        if rastro is None:
+            return
+        profundidade = getattr(self._local, "depth", 0)
+        rastro.extend({**etapa, "depth": etapa["depth"] + profundidade} for etapa in etapas)
+
+    def trace(self):
+        """Etapas já concluídas nesta thread desde o start_trace (ordem de início) e o total (ms)"""
+        inicio = getattr(self._local, "trace_started", None)
+        total = (time.perf_counter() - inicio) * 1000 if inicio else 0.0
+        etapas = [dict(etapa) for etapa in getattr(self._local, "trace", None) or [] if etapa["ms"] is not None]
+        return etapas, total
+
+    def snapshot(self):
+        with self._lock:
+            histogramas = {
+                nome: {"count": h.count, "sum_ms": round(h.sum_ms, 3), **{k: round(v, 3) for k, v in h.percentiles().items()}}
+                for nome, h in self._histograms.items()
+            }
+            return {"histograms": histogramas, "counters": dict(self._counters), "ts": time.time()}
+
+    def to_prometheus(self):
+        """Texto no formato de exposição do Prometheus (histogramas em segundos)"""
+        linhas = ["# TYPE traduzjur_stage_seconds histogram"]
+        with self._lock:
+            for nome, h in sorted(self._histograms.items()):
+                linhas.append(f'traduzjur_stage_seconds_sum{{stage="{nome}"}} {h.sum_ms / 1000:.6f}')
+                linhas.append(f'traduzjur_stage_seconds_count{{stage="{nome}"}} {h.count}')
+                acumulado = 0
+                for limite, quantidade in zip(BUCKETS_MS, h.buckets):
+                    acumulado += quantidade
+                    linhas.append(f'traduzjur_stage_seconds_bucket{{stage="{nome}",le="{limite / 1000:g}"}} {acumulado}')
+                linhas.append(f'traduzjur_stage_seconds_bucket{{stage="{nome}",le="+Inf"}} {h.count}')
+            linhas.append("# TYPE traduzjur_events_total counter")
+            for nome, valor in sorted(self._counters.items()):
+                linhas.append(f'traduzjur_events_total{{name="{nome}"}} {valor}')
+        return "\n".join(linhas) + "\n"
+
+    def dump(self):
+        """Grava o snapshot (JSON) e/ou o texto Prometheus (coletor textfile) de forma atômica"""
+        for caminho, conteudo in (
+            (METRICS_DUMP_PATH, lambda: json.dumps(self.snapshot(), ensure_ascii=False)),
+            (METRICS_PROM_PATH, self.to_prometheus),
+        ):
+            if not caminho:
+                continue
+            try:
+                temporario = f"{caminho}.tmp"
+                with open(temporario, "w", encoding="utf-8") as arquivo:
+                    arquivo.write(conteudo())
+                os.replace(temporario, caminho)
+            except Exception as e:
+                print(f"⚠️ Erro ao exportar métricas para {caminho}: {e}")
+
+    def start_dump_thread(self, interval_s=METRICS_DUMP_INTERVAL_S):
+        if not (METRICS_DUMP_PATH or METRICS_PROM_PATH):
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                self.dump()
+
+        threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+
+
+metrics = MetricsRegistry()
+metrics.start_dump_thread()
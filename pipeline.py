@@ -0,0 +1,232 @@
+import time
+import json
+import hashlib
+from services import SaaSLogger
+from cache import TranslationCache, translation_cache, normalize_text
+from history import history_cache
+from similarity import near_duplicate_index
+from glossario import try_glossary, GLOSSARIO_VERSION
+from llm import PROMPT_VERSION, build_prompt, generate, stream_generate, get_client
+from longdoc import map_reduce_generate, LONG_DOC_TOKEN_BUDGET
+from router import choose_route, run_with_fallback
+from resilience import GEMINI_DEADLINE_S
+from metrics import metrics
+from singleflight import SingleFlight
+
+
+class MissingApiKeyError(Exception):
+    """GOOGLE_API_KEY não configurada no servidor"""
+
+
+# Pedidos idênticos simultâneos (duplo clique, duas abas, itens repetidos no lote)
+geracoes_em_andamento = SingleFlight("geracao")
+
+
+@metrics.timed("pipeline.gerar_traducao")
+def gerar_traducao(user_id, texto_processo, tipo_andamento, tom_de_voz, nome_cliente, on_text=None, plan_status=None):
+    """
+    Pipeline de uma geração: glossário → rota → cache → Gemini (com fallback) → log de auditoria → cache.
+    O crédito deve ser reservado antes (SaaSLogger.reserve_credit) e estornado se der erro.
+    Se on_text for passado, usa streaming e chama on_text(texto_parcial) a cada pedaço.
+    Não usa Streamlit (pode rodar em threads do modo lote).
+    """
+    start_time = time.time()
+
+    with metrics.timer("pipeline.glossario"):
+        texto_glossario = try_glossary(texto_processo, tom_de_voz, nome_cliente)
+    if texto_glossario is not None:
+        # Movimentação padronizada (ex: "Conclusos para despacho"): resposta pronta, sem Gemini
+        duration = time.time() - start_time
+        SaaSLogger.log_generation(
+            user_id=user_id,
+            input_text=texto_processo,
+            output_text=texto_glossario,
+            model=GLOSSARIO_VERSION,
+            tokens_in=0,
+            tokens_out=0,
+            time_taken=duration,
+            tipo_andamento=tipo_andamento,
+            tom_de_voz=tom_de_voz,
+            route="glossario"
+        )
+        history_cache.mark_stale(user_id)
+        return {"text": texto_glossario, "cache_hit": False, "latency": duration}
+
+    # Modelo escolhido pelo tamanho, tipo e plano (tabela em router.py)
+    decisao = choose_route(texto_processo, tipo_andamento, plan_status)
+
+    with metrics.timer("pipeline.cache_get"):
+        cache_key = TranslationCache.make_key(
+            texto_processo,
+            tipo_andamento,
+            tom_de_voz,
+            nome_cliente,
+            decisao["models"][0],
+            PROMPT_VERSION
+        )
+        texto_em_cache = translation_cache.get(cache_key)
+
+    if texto_em_cache is not None:
+        # Mesmo andamento já traduzido: responde sem chamar o Gemini
+        duration = time.time() - start_time
+        SaaSLogger.log_generation(
+            user_id=user_id,
+            input_text=texto_processo,
+            output_text=texto_em_cache,
+            model=decisao["models"][0],
+            tokens_in=0,
+            tokens_out=0,
+            time_taken=duration,
+            cache_hit=True,
+            tipo_andamento=tipo_andamento,
+            tom_de_voz=tom_de_voz,
+            route=decisao["route"]
+        )
+        history_cache.mark_stale(user_id)
+        return {"text": texto_em_cache, "cache_hit": True, "latency": duration}
+
+    # Cliente compartilhado pelo processo (pool de conexões já aquecido)
+    client_start = time.time()
+    with metrics.timer("pipeline.client"):
+        client = get_client()
+    client_time = time.time() - client_start
+
+    if client is None:
+        raise MissingApiKeyError("API Key não configurada.")
+
+    def chamar(model, timeout_s, deadline=None):
+        # get_client de novo: um erro de conexão na tentativa anterior recria o cliente
+        cliente = get_client() or client
+        prompt = build_prompt(texto_processo, tipo_andamento, tom_de_voz, nome_cliente)
+        ttft = None
+        if on_text:
+            texto, usage, ttft = stream_generate(
+                cliente,
+                model,
+                prompt,
+                on_text=on_text,
+                start_time=start_time,
+                timeout_s=timeout_s,
+                deadline=deadline
+            )
+        else:
+            texto, usage = generate(cliente, model, prompt, timeout_s=timeout_s)
+        t_in = usage.prompt_token_count if usage else 0
+        t_out = usage.candidates_token_count if usage else 0
+        return texto, t_in, t_out, ttft, None
+
+    def gerar_etapa(prompt, on_text=None):
+        """Uma chamada do map-reduce, com prazo/retry/disjuntor/modelo reserva próprios"""
+        def chamada(model, timeout_s, deadline=None):
+            cliente = get_client() or client
+            if on_text:
+                return stream_generate(
+                    cliente, model, prompt, on_text=on_text, start_time=start_time, timeout_s=timeout_s, deadline=deadline
+                )
+            texto, usage = generate(cliente, model, prompt, timeout_s=timeout_s)
+            return texto, usage, None
+
+        modelo, (texto, usage, ttft), tentativas_etapa = run_with_fallback(
+            decisao,
+            chamada,
+            user_id=user_id,
+            inline=on_text is not None,
+            deadline=prazo_geracao
+        )
+        tentativas.extend(tentativas_etapa)
+        return texto, usage, ttft, modelo
+
+    model_start = time.time()
+    # Prazo da geração inteira (retries, modelos reserva e, no map-reduce, todas as chamadas)
+    prazo_geracao = time.time() + GEMINI_DEADLINE_S
+    with metrics.timer("pipeline.modelo"):
+        if decisao["tokens_est"] > LONG_DOC_TOKEN_BUDGET:
+            # Documento longo: resumo por trechos em paralelo + mensagem final. Cada chamada
+            # tem o prazo da rota; o conjunto só tem o prazo da geração inteira
+            tentativas = []
+            texto_gerado, t_in, t_out, ttft, etapas, model_usado = map_reduce_generate(
+                gerar_etapa,
+                texto_processo,
+                tipo_andamento,
+                tom_de_voz,
+                nome_cliente,
+                on_text=on_text
+            )
+        else:
+            model_usado, (texto_gerado, t_in, t_out, ttft, etapas), tentativas = run_with_fallback(
+                decisao,
+                chamar,
+                user_id=user_id,
+                # Hedge só sem streaming (não dá para mostrar duas respostas)
+                hedge=on_text is None,
+                inline=on_text is not None,
+                deadline=prazo_geracao
+            )
+
+    end_time = time.time()
+    duration = end_time - start_time
+    model_time = end_time - model_start
+
+    SaaSLogger.log_generation(
+        user_id=user_id,
+        input_text=texto_processo,
+        output_text=texto_gerado,
+        model=model_usado,
+        tokens_in=t_in,
+        tokens_out=t_out,
+        time_taken=duration,
+        ttft=ttft,
+        client_time=client_time,
+        model_time=model_time,
+        stages=etapas,
+        tipo_andamento=tipo_andamento,
+        tom_de_voz=tom_de_voz,
+        route=decisao["route"],
+        route_attempts=tentativas
+    )
+
+    with metrics.timer("pipeline.pos_geracao"):
+        history_cache.mark_stale(user_id)
+        translation_cache.set(cache_key, texto_gerado)
+        near_duplicate_index.add(user_id, texto_processo, tipo_andamento, tom_de_voz, texto_gerado)
+
+    return {"text": texto_gerado, "cache_hit": False, "latency": duration}
+
+
+def gerar_com_credito(user_id, texto_processo, tipo_andamento, tom_de_voz, nome_cliente, on_text=None, check_rate_limit=True):
+    """
+    Reserva o crédito e gera a tradução, uma única vez por pedido idêntico em andamento
+    (mesmo usuário + entradas normalizadas): os repetidos esperam a mesma chamada ao Gemini
+    e o crédito é debitado uma vez só. Se a geração falhar, o crédito é estornado.
+    check_rate_limit=False: o chamador já contou o pedido no rate limit (itens do lote).
+    Devolve (reserva, resultado, compartilhado); resultado é None se a reserva foi negada.
+    """
+    chave = hashlib.sha256(json.dumps([
+        user_id,
+        normalize_text(texto_processo),
+        tipo_andamento,
+        tom_de_voz,
+        normalize_text(nome_cliente) or "Cliente",
+    ], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def executar(publicar):
+        reserva = SaaSLogger.reserve_credit(user_id, check_rate_limit=check_rate_limit)
+        if not reserva["allowed"]:
+            return reserva, None
+        try:
+            resultado = gerar_traducao(
+                user_id,
+                texto_processo,
+                tipo_andamento,
+                tom_de_voz,
+                nome_cliente,
+                on_text=publicar if on_text else None,
+                plan_status=reserva["plan_status"]
+            )
+        except Exception:
+            SaaSLogger.refund_credit(user_id)
+            raise
+        return reserva, resultado
+
+    (reserva, resultado), compartilhado = geracoes_em_andamento.do(chave, executar, on_text=on_text)
+    return reserva, resultado, compartilhado
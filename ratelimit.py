@@ -0,0 +1,140 @@
+import time
+import sqlite3
+import threading
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    """
+    Rate limit em janela deslizante, em memória do processo.
+    seed(key, desde) é chamado só na primeira vez que a chave aparece
+    (cold start) e deve devolver os timestamps (epoch) já usados na janela.
+    Chaves com a janela vazia saem do dicionário (varredura no máximo uma vez por janela).
+    """
+
+    def __init__(self, limit, window_s, seed=None):
+        self.limit = limit
+        self.window_s = window_s
+        self.seed = seed
+        self._hits = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    def _sweep(self, now):
+        """Remove as chaves sem requisições na janela (chamado com o lock)"""
+        if now - self._last_sweep < self.window_s:
+            return
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window_s]:
+            del self._hits[key]
+        self._last_sweep = now
+
+    def _seed(self, key, now):
+        if not self.seed:
+            return deque()
+        try:
+            return deque(sorted(t for t in self.seed(key, now - self.window_s) if t > now - self.window_s))
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar histórico do rate limit: {e}")
+            return deque()
+
+    def allow(self, key, n=1):
+        """Registra n requisições (todas ou nenhuma) e diz se elas cabem no limite"""
+        now = time.time()
+
+        with self._lock:
+            hits = self._hits.get(key)
+
+        if hits is None:
+            # Seed fora do lock: é uma consulta ao banco
+            seeded = self._seed(key, now)
+            with self._lock:
+                hits = self._hits.setdefault(key, seeded)
+
+        with self._lock:
+            self._sweep(now)
+            # A varredura pode ter tirado a chave (janela vazia): volta com a mesma fila
+            hits = self._hits.setdefault(key, hits)
+            while hits and hits[0] <= now - self.window_s:
+                hits.popleft()
+
+            if len(hits) + n > self.limit:
+                return False
+
+            hits.extend([now] * n)
+            return True
+
+    def remaining(self, key):
+        with self._lock:
+            hits = self._hits.get(key) or ()
+            now = time.time()
+            return max(0, self.limit - sum(1 for t in hits if t > now - self.window_s))
+
+
+class SqliteSlidingWindowLimiter:
+    """
+    Mesma janela deslizante, persistida num arquivo SQLite.
+    Sobrevive a restarts e é compartilhada entre processos/réplicas que montam o mesmo arquivo.
+    """
+
+    def __init__(self, path, limit, window_s, seed=None):
+        self.limit = limit
+        self.window_s = window_s
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_hits (key TEXT NOT NULL, ts REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limit_hits ON rate_limit_hits (key, ts)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_seeded (key TEXT PRIMARY KEY)")
+
+    def _fetch_seed(self, key, now):
+        """
+        Timestamps do banco para uma chave ainda não semeada (None se já foi).
+        Roda fora do lock e da transação: é uma consulta pela rede.
+        """
+        if not self.seed:
+            return None
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM rate_limit_seeded WHERE key = ?", (key,)).fetchone():
+                return None
+        try:
+            return [t for t in self.seed(key, now - self.window_s) if t > now - self.window_s]
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar histórico do rate limit: {e}")
+            return []
+
+    def _apply_seed(self, key, timestamps):
+        """Grava o seed dentro da transação; outra thread/processo pode ter semeado antes"""
+        if timestamps is None:
+            return
+        cursor = self._conn.execute("INSERT OR IGNORE INTO rate_limit_seeded (key) VALUES (?)", (key,))
+        if cursor.rowcount:
+            self._conn.executemany("INSERT INTO rate_limit_hits (key, ts) VALUES (?, ?)", [(key, t) for t in timestamps])
+
+    def allow(self, key, n=1):
+        now = time.time()
+        timestamps = self._fetch_seed(key, now)
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._apply_seed(key, timestamps)
+                self._conn.execute("DELETE FROM rate_limit_hits WHERE key = ? AND ts <= ?", (key, now - self.window_s))
+                (total,) = self._conn.execute("SELECT COUNT(*) FROM rate_limit_hits WHERE key = ?", (key,)).fetchone()
+
+                allowed = total + n <= self.limit
+                if allowed:
+                    self._conn.executemany("INSERT INTO rate_limit_hits (key, ts) VALUES (?, ?)", [(key, now)] * n)
+                self._conn.execute("COMMIT")
+                return allowed
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def remaining(self, key):
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COUNT(*) FROM rate_limit_hits WHERE key = ? AND ts > ?",
+                (key, time.time() - self.window_s)
+            ).fetchone()
+        return max(0, self.limit - total)
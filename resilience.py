@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from llm import handle_client_error, AttemptTimeoutError
+from services import SaaSLogger
+from metrics import metrics
+
+load_dotenv()
+
+# Novas tentativas no mesmo modelo (só para erros temporários: 429, 5xx, timeout, rede)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_BACKOFF_BASE_S = float(os.getenv("GEMINI_BACKOFF_BASE_S", "0.5"))
+GEMINI_BACKOFF_MAX_S = float(os.getenv("GEMINI_BACKOFF_MAX_S", "8"))
+# Prazo da geração inteira (todas as tentativas e modelos da rota)
+GEMINI_DEADLINE_S = float(os.getenv("GEMINI_DEADLINE_S", "90"))
+
+# Hedge: segunda requisição igual quando a primeira passa do p95 do modelo (desligado por padrão)
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "0") == "1"
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_HEDGE_MIN_DELAY_S = float(os.getenv("GEMINI_HEDGE_MIN_DELAY_S", "1"))
+
+# Disjuntor por modelo
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_S = float(os.getenv("CIRCUIT_RESET_S", "30"))
+
+GEMINI_ATTEMPT_WORKERS = int(os.getenv("GEMINI_ATTEMPT_WORKERS", "16"))
+
+STATUS_RETENTAVEIS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Disjuntor do modelo aberto: falha na hora, sem chamar o Gemini"""
+
+
+def is_retryable(error):
+    """Erro temporário do upstream (vale tentar de novo) ou erro do próprio pedido"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    codigo = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return codigo in STATUS_RETENTAVEIS
+
+
+def backoff_delay(tentativa):
+    """Backoff exponencial com jitter completo: sorteio entre 0 e base * 2^tentativa (com teto)"""
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX_S, GEMINI_BACKOFF_BASE_S * 2 ** tentativa))
+
+
+class CircuitBreaker:
+    """
+    Disjuntor de um modelo: depois de failure_threshold falhas seguidas do upstream
+    fica aberto por reset_s (as chamadas falham na hora); depois deixa passar
+    uma chamada de teste (half_open) que fecha ou reabre o circuito.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_s=CIRCUIT_RESET_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.time() - self.opened_at < self.reset_s:
+                    return False
+                self.state = "half_open"
+                self._probe_in_flight = False
+            # half_open: uma chamada de teste por vez
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"🟢 Circuito do {self.name} fechado")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.time()
+                metrics.inc(f"circuito.{self.name}.aberturas")
+                print(f"🔴 Circuito do {self.name} aberto por {self.reset_s:.0f} s após {self.failures} falhas")
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Tentativas sem streaming rodam aqui: o prazo é respeitado mesmo se a requisição travar
+_executor = ThreadPoolExecutor(max_workers=GEMINI_ATTEMPT_WORKERS, thread_name_prefix="gemini")
+
+
+def breaker_for(model):
+    with _breakers_lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker(model)
+        return _breakers[model]
+
+
+def circuit_stats():
+    """Estado dos disjuntores (para o painel de admin)"""
+    with _breakers_lock:
+        disjuntores = list(_breakers.values())
+    return {disjuntor.name: disjuntor.stats() for disjuntor in disjuntores}
+
+
+def _hedge_delay(model):
+    """p95 das tentativas bem-sucedidas do modelo; None enquanto houver poucas amostras"""
+    percentis = metrics.percentiles(f"modelo.{model}", min_samples=GEMINI_HEDGE_MIN_SAMPLES)
+    if percentis is None:
+        return None
+    return max(GEMINI_HEDGE_MIN_DELAY_S, percentis["p95"] / 1000)
+
+
+def _run_attempt(chamada, prazo_s=None, atraso_hedge_s=None, inline=False):
+    """
+    Executa uma tentativa; devolve (resultado, hedge_enviado, hedge_venceu).
+    inline: roda na própria thread (streaming, que atualiza a página); chamada(deadline=...)
+    recebe o limite da tentativa e fecha o stream quando ele passa.
+    """
+    if inline:
+        return chamada(deadline=time.time() + prazo_s if prazo_s else None), False, False
+
+    primeiro = _executor.submit(chamada)
+    futuros = [primeiro]
+    limite = time.time() + prazo_s if prazo_s else None
+
+    if atraso_hedge_s and (not prazo_s or atraso_hedge_s < prazo_s):
+        feitos, _ = wait(futuros, timeout=atraso_hedge_s)
+        if not feitos:
+            futuros.append(_executor.submit(chamada))
+
+    ultimo_erro = None
+    pendentes = set(futuros)
+    while pendentes:
+        restante = None if limite is None else max(0, limite - time.time())
+        feitos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+        if not feitos:
+            # As requisições atrasadas continuam até o timeout HTTP, mas o resultado é descartado
+            raise AttemptTimeoutError(f"sem resposta do Gemini em {prazo_s:.1f} s")
+        for futuro in feitos:
+            if futuro.exception() is None:
+                return futuro.result(), len(futuros) > 1, futuro is not primeiro
+            ultimo_erro = futuro.exception()
+
+    raise ultimo_erro
+
+
+def _registrar(tentativas, user_id, route, model, numero, ms, erro=None, hedged=False, hedge_won=False):
+    tentativa = {"model": model, "attempt": numero, "ok": erro is None, "ms": int(ms)}
+    if hedged:
+        tentativa["hedged"] = True
+        tentativa["hedge_won"] = hedge_won
+    if erro is not None:
+        tentativa["error"] = type(erro).__name__
+        tentativa["retryable"] = is_retryable(erro)
+        metrics.inc(f"modelo.{model}.errors")
+    tentativas.append(tentativa)
+    SaaSLogger.log_event(user_id, "gemini_attempt", json.dumps({"route": route, **tentativa}))
+
+
+def call_with_resilience(model, chamada, timeout_s=None, user_id=None, route=None, hedge=False, inline=False, deadline=None):
+    """
+    Chama chamada() em um modelo com prazo por tentativa, novas tentativas com backoff
+    (só erros temporários), hedge opcional e disjuntor. Cada tentativa vai para o log_event.
+    deadline: time.time() limite da geração inteira.
+    Devolve (resultado, tentativas); em caso de falha relança o último erro com e.attempts.
+    """
+    disjuntor = breaker_for(model)
+    tentativas = []
+
+    for numero in range(1, GEMINI_MAX_RETRIES + 2):
+        restante = deadline - time.time() if deadline else None
+        if restante is not None and restante <= 0:
+            erro = AttemptTimeoutError(f"prazo de {GEMINI_DEADLINE_S:.0f} s da geração esgotado")
+            _registrar(tentativas, user_id, route, model, numero, 0, erro)
+            erro.attempts = tentativas
+            raise erro
+
+        if not disjuntor.allow():
+            erro = CircuitOpenError(f"Gemini ({model}) indisponível no momento. Tente de novo em instantes.")
+            _registrar(tentativas, user_id, route, model, numero, 0, erro)
+            erro.attempts = tentativas
+            raise erro
+
+        prazo_s = min((p for p in (timeout_s, restante) if p), default=None)
+        atraso_hedge_s = _hedge_delay(model) if hedge and GEMINI_HEDGE and not inline else None
+        inicio = time.time()
+        try:
+            resultado, hedged, hedge_venceu = _run_attempt(chamada, prazo_s, atraso_hedge_s, inline)
+        except Exception as e:
+            ms = (time.time() - inicio) * 1000
+            handle_client_error(e)
+            retentavel = is_retryable(e)
+            if retentavel:
+                disjuntor.record_failure()
+            else:
+                # O upstream respondeu; o erro é do pedido (ex: 400), não conta para o disjuntor
+                disjuntor.record_success()
+            _registrar(tentativas, user_id, route, model, numero, ms, e)
+
+            if not retentavel or numero > GEMINI_MAX_RETRIES:
+                e.attempts = tentativas
+                raise
+
+            espera = backoff_delay(numero - 1)
+            if deadline:
+                espera = min(espera, max(0, deadline - time.time()))
+            metrics.inc(f"modelo.{model}.retries")
+            print(f"🔁 Tentativa {numero} no {model} falhou ({type(e).__name__}); nova tentativa em {espera:.1f} s")
+            time.sleep(espera)
+            continue
+
+        ms = (time.time() - inicio) * 1000
+        disjuntor.record_success()
+        # Latência por tentativa: base do p95 usado no hedge
+        metrics.observe(f"modelo.{model}", ms)
+        if hedged:
+            metrics.inc(f"modelo.{model}.hedges")
+            if hedge_venceu:
+                metrics.inc(f"modelo.{model}.hedge_wins")
+        _registrar(tentativas, user_id, route, model, numero, ms, hedged=hedged, hedge_won=hedge_venceu)
+        return resultado, tentativas
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import functools
+from dotenv import load_dotenv
+from llm import MODEL_NAME
+from longdoc import estimate_tokens
+from metrics import metrics
+from resilience import call_with_resilience, GEMINI_DEADLINE_S
+
+load_dotenv()
+
+# Tabela de rotas: a primeira regra que casar decide a lista de modelos (principal + reservas).
+# Condições opcionais: max_tokens / min_tokens (estimados), tipos (tipo_andamento), planos (plan_status).
+# timeout_s: limite por tentativa antes de cair para o próximo modelo.
+ROTAS_PADRAO = [
+    {
+        "name": "curto_lite",
+        "max_tokens": 600,
+        "tipos": ["Despacho", "Juntada", "Intimação / Prazo"],
+        "models": ["gemini-2.5-flash-lite", MODEL_NAME],
+        "timeout_s": 20,
+    },
+    {
+        "name": "decisao",
+        "tipos": ["Decisão", "Sentença"],
+        "models": [MODEL_NAME, "gemini-2.5-flash-lite"],
+        "timeout_s": 45,
+    },
+    {
+        "name": "padrao",
+        "models": [MODEL_NAME, "gemini-2.5-flash-lite"],
+        "timeout_s": 45,
+    },
+]
+
+
+def load_routes():
+    """
+    Rotas do MODEL_ROUTES (JSON) ou do arquivo MODEL_ROUTES_PATH; senão as rotas padrão.
+    Uma tabela inválida não derruba o app: volta para o padrão.
+    """
+    try:
+        bruto = os.getenv("MODEL_ROUTES")
+        caminho = os.getenv("MODEL_ROUTES_PATH")
+        if not bruto and caminho:
+            with open(caminho, encoding="utf-8") as arquivo:
+                bruto = arquivo.read()
+        if not bruto:
+            return ROTAS_PADRAO
+
+        rotas = json.loads(bruto)
+        for rota in rotas:
+            if not rota.get("name") or not rota.get("models"):
+                raise ValueError(f"rota sem name/models: {rota}")
+        return rotas
+    except Exception as e:
+        print(f"⚠️ Tabela de rotas inválida, usando a padrão: {e}")
+        return ROTAS_PADRAO
+
+
+ROTAS = load_routes()
+
+
+def choose_route(texto_processo, tipo_andamento, plan_status=None, rotas=None):
+    """Decide a rota da geração; devolve {'route', 'models', 'timeout_s', 'tokens_est'}"""
+    tokens = estimate_tokens(texto_processo)
+
+    for rota in rotas or ROTAS:
+        if "max_tokens" in rota and tokens > rota["max_tokens"]:
+            continue
+        if "min_tokens" in rota and tokens < rota["min_tokens"]:
+            continue
+        if rota.get("tipos") and tipo_andamento not in rota["tipos"]:
+            continue
+        if rota.get("planos") and plan_status not in rota["planos"]:
+            continue
+        return {"route": rota["name"], "models": list(rota["models"]), "timeout_s": rota.get("timeout_s"), "tokens_est": tokens}
+
+    return {"route": "padrao", "models": [MODEL_NAME], "timeout_s": None, "tokens_est": tokens}
+
+
+def run_with_fallback(decisao, chamada, user_id=None, hedge=False, inline=False, deadline=None):
+    """
+    Executa chamada(model, timeout_s) com cada modelo da rota, em ordem, até um dar certo.
+    Com inline (streaming), chamada(model, timeout_s, deadline=...) recebe o limite da tentativa.
+    Em cada modelo: prazo por tentativa, retry com backoff, hedge e disjuntor (resilience.py).
+    deadline: time.time() limite compartilhado por várias chamadas da mesma geração (map-reduce).
+    Devolve (modelo_usado, resultado, tentativas); se todos falharem, relança o último erro
+    com as tentativas em e.route_attempts.
+    """
+    tentativas = []
+    ultimo_erro = None
+    # Prazo da geração inteira: limita a cauda mesmo com retries e modelos reserva
+    deadline = deadline or time.time() + GEMINI_DEADLINE_S
+
+    for model in decisao["models"]:
+        inicio = time.time()
+        try:
+            resultado, tentativas_modelo = call_with_resilience(
+                model,
+                functools.partial(chamada, model, decisao["timeout_s"]),
+                timeout_s=decisao["timeout_s"],
+                user_id=user_id,
+                route=decisao["route"],
+                hedge=hedge,
+                inline=inline,
+                deadline=deadline
+            )
+        except Exception as e:
+            tentativas.extend(getattr(e, "attempts", []))
+            print(f"🔀 Falha no modelo {model} (rota {decisao['route']}): {e}")
+            ultimo_erro = e
+            continue
+
+        tentativas.extend(tentativas_modelo)
+        # Latência da rota (com retries), para comparar as rotas entre si
+        metrics.observe(f"rota.{decisao['route']}", (time.time() - inicio) * 1000)
+        return model, resultado, tentativas
+
+    ultimo_erro.route_attempts = tentativas
+    raise ultimo_erro
@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Teto de gerações indexadas por usuário (as mais antigas saem primeiro); cobre um mês de uso intenso
+SEARCH_MAX_PER_USER = int(os.getenv("SEARCH_MAX_PER_USER", "20000"))
+# Gerações lidas do banco por página ao semear um usuário
+SEARCH_SEED_PAGE_SIZE = int(os.getenv("SEARCH_SEED_PAGE_SIZE", "500"))
+SEARCH_EVICT_INTERVAL_S = 3600
+
+
+def _epoch(created_at):
+    dt = datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def build_match_query(texto):
+    """Converte a busca do usuário em uma consulta FTS5 (todas as palavras, com prefixo)"""
+    termos = re.findall(r"\w+", texto or "")
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+
+class HistorySearchIndex:
+    """
+    Índice de busca (SQLite FTS5) sobre input_text/output_text do histórico.
+    O tokenizer unicode61 com remove_diacritics ignora acentos ("decisao" acha "Decisão").
+    Cada usuário é carregado uma vez do banco (janela inteira do plano, em páginas), na
+    primeira busca; depois o índice recebe as gerações novas dele a cada log_generation.
+    Quem nunca buscou não ocupa o índice. A limpeza (idade e teto por usuário) roda nas escritas;
+    usuários que passaram do teto ficam marcados como parciais (is_partial).
+    """
+
+    def __init__(self, path=":memory:", retention_days=31, max_per_user=SEARCH_MAX_PER_USER):
+        self.retention_s = retention_days * 86400
+        self.max_per_user = max_per_user
+        self._last_evict = time.time()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5("
+            " user_id UNINDEXED, log_key UNINDEXED, created_at UNINDEXED,"
+            " input_text, output_text,"
+            " tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        self._lock = threading.Lock()
+        self._loaded = set()
+        # Usuários com gerações da janela fora do índice (teto atingido)
+        self._partial = set()
+        # user_id -> {log_key: rowid}: deduplicação e remoção pelo rowid (sem varrer o FTS)
+        self._keys = {}
+        for user_id, log_key, rowid in self._conn.execute("SELECT user_id, log_key, rowid FROM history_fts"):
+            self._keys.setdefault(user_id, {})[log_key] = rowid
+
+    def _insert(self, user_id, created_at, input_text, output_text):
+        epoch = _epoch(created_at)
+        # Chave local: o mesmo log chega pelo log_generation e, depois, pelo banco
+        log_key = f"{epoch:.6f}"
+        chaves = self._keys.setdefault(user_id, {})
+        if log_key in chaves:
+            return
+        cursor = self._conn.execute(
+            "INSERT INTO history_fts (user_id, log_key, created_at, input_text, output_text) VALUES (?, ?, ?, ?, ?)",
+            (user_id, log_key, epoch, input_text or "", output_text or "")
+        )
+        chaves[log_key] = cursor.lastrowid
+
+    def _trim_user(self, user_id):
+        """Acima do teto, tira as gerações mais antigas do usuário (até 90% do teto, para não rodar a cada escrita)"""
+        chaves = self._keys.get(user_id) or {}
+        if len(chaves) <= self.max_per_user:
+            return
+        antigas = heapq.nsmallest(len(chaves) - int(self.max_per_user * 0.9), chaves, key=float)
+        self._conn.executemany("DELETE FROM history_fts WHERE rowid = ?", [(chaves.pop(chave),) for chave in antigas])
+        self._partial.add(user_id)
+
+    def _evict_expired(self):
+        """Limpeza por idade, no máximo uma vez por SEARCH_EVICT_INTERVAL_S (chamado com o lock)"""
+        if time.time() - self._last_evict < SEARCH_EVICT_INTERVAL_S:
+            return
+        limite = time.time() - self.retention_s
+        self._conn.execute("DELETE FROM history_fts WHERE created_at < ?", (limite,))
+        for user_id in list(self._keys):
+            chaves = self._keys[user_id]
+            for chave in [chave for chave in chaves if float(chave) < limite]:
+                del chaves[chave]
+            if not chaves:
+                del self._keys[user_id]
+                self._loaded.discard(user_id)
+                self._partial.discard(user_id)
+        self._last_evict = time.time()
+
+    def add(self, user_id, created_at, input_text, output_text):
+        """Indexa uma nova geração (chamado pelo log_generation) se o usuário já usa a busca"""
+        if user_id not in self._loaded:
+            return
+        with self._lock:
+            self._insert(user_id, created_at, input_text, output_text)
+            self._trim_user(user_id)
+            self._evict_expired()
+            self._conn.commit()
+
+    def ensure_user(self, user_id, loader, page_size=SEARCH_SEED_PAGE_SIZE):
+        """
+        Carrega o histórico do usuário uma única vez, em páginas até o teto.
+        loader(before, limit) devolve até limit linhas do banco, da mais recente para a mais
+        antiga, criadas antes de before (None na primeira página).
+        """
+        if user_id in self._loaded:
+            return
+
+        antes = None
+        carregadas = 0
+        parcial = False
+        while True:
+            rows = loader(antes, page_size)
+            with self._lock:
+                for row in rows:
+                    self._insert(user_id, row["created_at"], row["input_text"], row["output_text"])
+                self._conn.commit()
+            carregadas += len(rows)
+            if len(rows) < page_size:
+                break
+            if carregadas >= self.max_per_user:
+                parcial = True
+                break
+            antes = rows[-1]["created_at"]
+
+        with self._lock:
+            self._trim_user(user_id)
+            self._evict_expired()
+            self._conn.commit()
+            if parcial:
+                self._partial.add(user_id)
+            self._loaded.add(user_id)
+
+    def is_partial(self, user_id):
+        """True se parte da janela do usuário ficou fora do índice (teto por usuário)"""
+        return user_id in self._partial
+
+    def search(self, user_id, texto, since=None, limit=20):
+        """
+        Busca ranqueada (bm25) no histórico do usuário.
+        Retorna (resultados, ms); cada resultado traz created_at, trecho e textos completos.
+        """
+        consulta = build_match_query(texto)
+        if not consulta:
+            return [], 0.0
+
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT created_at, snippet(history_fts, -1, '**', '**', '…', 12), input_text, output_text"
+                " FROM history_fts"
+                " WHERE history_fts MATCH ? AND user_id = ? AND created_at >= ?"
+                " ORDER BY bm25(history_fts) LIMIT ?",
+                (consulta, user_id, _epoch(since) if since else 0, limit)
+            ).fetchall()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        resultados = [
+            {
+                "created_at": datetime.fromtimestamp(created_at, timezone.utc).isoformat(),
+                "trecho": trecho,
+                "input_text": input_text,
+                "output_text": output_text,
+            }
+            for created_at, trecho, input_text, output_text in rows
+        ]
+        return resultados, elapsed_ms
+
+    def evict_before(self, since):
+        """Remove do índice o que já saiu de qualquer janela de histórico"""
+        limite = _epoch(since)
+        with self._lock:
+            self._conn.execute("DELETE FROM history_fts WHERE created_at < ?", (limite,))
+            self._conn.commit()
+            for chaves in self._keys.values():
+                for chave in [chave for chave in chaves if float(chave) < limite]:
+                    del chaves[chave]
@@ -1,182 +1,308 @@
 import os
-from supabase import create_client, Client
+import time
+import threading
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
+from credits import FREE_RESET_INTERVAL, parse_reset_time
+from ratelimit import SlidingWindowLimiter, SqliteSlidingWindowLimiter
+from audit import create_audit_writer
+from search import HistorySearchIndex
+from metrics import metrics
+from storage import create_storage
+from textstore import TextStore, PREVIEW_CHARS
+from singleflight import register_propagator
 
 load_dotenv()
 
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key) if url and key else None
+PROFILE_CACHE_TTL_S = float(os.getenv("PROFILE_CACHE_TTL_S", "30"))
+RATE_LIMIT_MAX = int(os.getenv("RATE_LIMIT_MAX", "10"))
+RATE_LIMIT_WINDOW_S = float(os.getenv("RATE_LIMIT_WINDOW_S", "300"))
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+# Cota do modo lote: andamentos por janela do rate limit, à parte do limite interativo
+BATCH_RATE_LIMIT_MAX = int(os.getenv("BATCH_RATE_LIMIT_MAX", "50"))
+# Gerações mais recentes usadas para semear os índices locais (quase-duplicatas, busca)
+HISTORY_SEED_LIMIT = int(os.getenv("HISTORY_SEED_LIMIT", "200"))
 
+# Contador de idas ao banco por thread (cada sessão do Streamlit roda o script na sua thread)
+_local = threading.local()
+
+
+def _count_roundtrip():
+    _local.roundtrips = getattr(_local, "roundtrips", 0) + 1
+
+
+def _start_roundtrips():
+    _local.roundtrips = 0
+
+
+def _take_roundtrips():
+    return getattr(_local, "roundtrips", 0)
+
+
+def _add_roundtrips(n):
+    _local.roundtrips = getattr(_local, "roundtrips", 0) + n
+
+
+# Gerações rodam no pool do single-flight: as idas ao banco voltam para o rerun que pediu
+register_propagator(_start_roundtrips, _take_roundtrips, _add_roundtrips)
+
+
+# Supabase ou SQLite embutido (storage.py); todo acesso a dados passa por aqui
+storage = create_storage(on_roundtrip=_count_roundtrip)
+
+
+class ProfileCache:
+    """Cache curto (TTL) da linha de profiles por usuário, compartilhado no processo"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is None:
+                return None
+            fetched_at, row = entry
+            if time.monotonic() - fetched_at > self.ttl:
+                del self._rows[user_id]
+                return None
+            return dict(row)
+
+    def set(self, user_id, row):
+        with self._lock:
+            self._rows[user_id] = (time.monotonic(), dict(row))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+
+profile_cache = ProfileCache(ttl=PROFILE_CACHE_TTL_S)
+
+def _recent_generation_times(user_id, since_epoch, limit=RATE_LIMIT_MAX):
+    """Seed do rate limit: horários das gerações recentes do usuário (no máximo limit)"""
+    since = datetime.fromtimestamp(since_epoch, timezone.utc)
+    timestamps = []
+    for valor in storage.recent_generation_times(user_id, since.isoformat(), limit):
+        created_at = datetime.fromisoformat(valor)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        timestamps.append(created_at.timestamp())
+    return timestamps
+
+
+if RATE_LIMIT_DB_PATH:
+    rate_limiter = SqliteSlidingWindowLimiter(
+        RATE_LIMIT_DB_PATH, RATE_LIMIT_MAX, RATE_LIMIT_WINDOW_S, seed=_recent_generation_times
+    )
+else:
+    rate_limiter = SlidingWindowLimiter(RATE_LIMIT_MAX, RATE_LIMIT_WINDOW_S, seed=_recent_generation_times)
+
+
+def _recent_batch_times(key, since_epoch):
+    """Seed da cota do lote (chave 'lote:<user_id>'): gerações recentes de qualquer tipo, visão conservadora"""
+    return _recent_generation_times(key.split(":", 1)[1], since_epoch, BATCH_RATE_LIMIT_MAX)
+
+
+# Chaves com prefixo: o SQLite do rate limit é o mesmo arquivo do limite interativo
+if RATE_LIMIT_DB_PATH:
+    batch_rate_limiter = SqliteSlidingWindowLimiter(
+        RATE_LIMIT_DB_PATH, BATCH_RATE_LIMIT_MAX, RATE_LIMIT_WINDOW_S, seed=_recent_batch_times
+    )
+else:
+    batch_rate_limiter = SlidingWindowLimiter(BATCH_RATE_LIMIT_MAX, RATE_LIMIT_WINDOW_S, seed=_recent_batch_times)
+
+def _insert_rows(table, rows):
+    """Insert multi-linha usado pela fila de auditoria"""
+    storage.insert_rows(table, rows)
+
+
+# Busca no histórico: índice local atualizado a cada log_generation
+search_index = HistorySearchIndex(os.getenv("SEARCH_INDEX_PATH", ":memory:"))
+
+# Logs de auditoria saem do caminho da requisição (gravados em lote numa thread)
+audit_writer = create_audit_writer(_insert_rows)
+
+# Textos das gerações fora de generation_logs: gravados uma vez por conteúdo, lidos sob demanda
+text_store = TextStore(fetch=lambda hashes: storage.get_texts(hashes))
+
+
+# Cada método é medido como 'saas.<método>' (histograma + etapa do rerun)
+@metrics.instrument_class("saas")
 class SaaSLogger:
     @staticmethod
-    def is_rate_limited(user_id):
+    def get_profile(user_id, fresh=False):
         """
-        Verifica se o usuário está abusando da API (Anti-Bot).
-        Regra: Máximo de 10 requisições nos últimos 5 minutos.
+        Linha de profiles do usuário (uma consulta por TTL).
+        fresh=True ignora o cache. Retorna None se não existir ou der erro.
         """
-        if not supabase: return False
+        if not fresh:
+            cached = profile_cache.get(user_id)
+            if cached is not None:
+                return cached
 
         try:
-            # Define a janela de tempo (ex: 5 minutos atrás)
-            time_window = datetime.now(timezone.utc) - timedelta(minutes=5)
-            
-            # Conta quantas gerações esse usuário fez nessa janela
-            # count='exact', head=True -> Só conta, não baixa os dados (rápido e leve)
-            response = supabase.table("generation_logs") \
-                .select("*", count="exact", head=True) \
-                .eq("user_id", user_id) \
-                .gte("created_at", time_window.isoformat()) \
-                .execute()
-            
-            total_recentes = response.count
-
-            # LIMITE DE SEGURANÇA
-            # Se fez mais de 10 requisições em 5 minutos, trava.
-            if total_recentes >= 10:
-                print(f"🚫 Rate Limit atingido para {user_id}: {total_recentes} reqs em 5min.")
-                return True
-            
-            return False
+            row = storage.get_profile(user_id)
+            if not row:
+                return None
 
+            profile_cache.set(user_id, row)
+            return dict(row)
         except Exception as e:
-            print(f"⚠️ Erro ao verificar rate limit: {e}")
-            return False # Na dúvida, libera (fail open)
+            print(f"⚠️ Erro ao buscar perfil: {e}")
+            return None
 
     @staticmethod
-    def check_can_generate(user_id):
-        """
-        Consulta: Usuário existe? É PRO? Tem Créditos? + Rate Limit
-        """
-        if not supabase: return True 
-        
-        try:
-            # 1. NOVO: Verifica Rate Limit ANTES de tudo
-            if SaaSLogger.is_rate_limited(user_id):
-                return "rate_limit" # Retorna um código específico
+    def get_profile_by_email(email):
+        """Linha de profiles pelo email (login/cadastro, sem cache)"""
+        return storage.get_profile_by_email(email)
 
-            # Busca dados do usuário
-            response = supabase.table("profiles").select("plan_status, credits_balance").eq("id", user_id).execute()
-            data = response.data
-            
-            if not data: return False
+    @staticmethod
+    def create_profile(row):
+        """Cria o perfil de um usuário novo"""
+        storage.create_profile(row)
 
-            user = data[0]
-            status = user.get('plan_status')
-            creditos = user.get('credits_balance', 0)
+    @staticmethod
+    def reset_db_roundtrips():
+        """Zera o contador de consultas (chamado no início de cada rerun)"""
+        _local.roundtrips = 0
 
-            # 2. Se for VIP (Admin/Pro), libera
-            if status in ['pro_monthly', 'pro_annual', 'admin']:
-                return True
-            
-            # 3. Se for FREE, checa saldo
-            if status == 'free' and creditos > 0:
-                return True
-            
-            return False
+    @staticmethod
+    def db_roundtrips():
+        """Quantas idas ao banco esta thread fez desde o último reset"""
+        return getattr(_local, "roundtrips", 0)
 
-        except Exception as e:
-            print(f"⚠️ Erro de permissão: {e}")
+    @staticmethod
+    def is_rate_limited(user_id):
+        """
+        Verifica se o usuário está abusando da API (Anti-Bot).
+        Regra: Máximo de RATE_LIMIT_MAX requisições em RATE_LIMIT_WINDOW_S (padrão 10 em 5 min).
+        Contagem local (microssegundos); o banco só é consultado no cold start do usuário.
+        """
+        if rate_limiter.allow(user_id):
             return False
 
+        print(f"🚫 Rate Limit atingido para {user_id}: {RATE_LIMIT_MAX} reqs em {int(RATE_LIMIT_WINDOW_S)}s.")
+        return True
+
     @staticmethod
-    def refresh_free_credits_if_needed(user_id):
-        """Reseta créditos FREE com correção de timezone"""
-        if not supabase: return
+    def reserve_batch_quota(user_id, n):
+        """
+        Reserva n itens na cota do lote (BATCH_RATE_LIMIT_MAX por janela), todos ou nenhum.
+        Retorna (permitido, restantes).
+        """
+        chave = f"lote:{user_id}"
+        if batch_rate_limiter.allow(chave, n):
+            return True, batch_rate_limiter.remaining(chave)
+        restantes = batch_rate_limiter.remaining(chave)
+        print(f"🚫 Cota de lote atingida para {user_id}: pediu {n}, restam {restantes} em {int(RATE_LIMIT_WINDOW_S)}s.")
+        return False, restantes
+
+    @staticmethod
+    def reserve_credit(user_id, check_rate_limit=True):
+        """
+        Checa o rate limit e reserva 1 crédito de forma atômica (uma ida ao banco).
+        check_rate_limit=False: itens do lote, já contados um a um na cota do lote (reserve_batch_quota).
+        Retorna {'allowed', 'balance', 'plan_status', 'reason'}; reason: 'ok', 'rate_limit', 'no_credits' ou 'error'.
+        """
+        if check_rate_limit and SaaSLogger.is_rate_limited(user_id):
+            return {"allowed": False, "balance": None, "plan_status": None, "reason": "rate_limit"}
 
         try:
-            response = supabase.table("profiles").select("*").eq("id", user_id).single().execute()
-            if not response.data: return
+            reserva = storage.reserve_credit(user_id)
+            profile_cache.invalidate(user_id)
+        except Exception as e:
+            print(f"⚠️ Erro ao reservar crédito: {e}")
+            return {"allowed": False, "balance": None, "plan_status": None, "reason": "error"}
 
-            user = response.data
-            if user["plan_status"] != "free": return
+        if reserva["allowed"]:
+            if reserva["plan_status"] == "free":
+                print(f"📉 Crédito reservado de {user_id}. Restam: {reserva['balance']}")
+            return {"allowed": True, "balance": reserva["balance"], "plan_status": reserva["plan_status"], "reason": "ok"}
 
-            # CORREÇÃO AQUI: Agora usamos o horário COM fuso UTC
-            now = datetime.now(timezone.utc)
-            
-            should_reset = False
-            
-            if user["last_credit_reset"] is None:
-                should_reset = True
-            else:
-                # O banco já manda com fuso (+00:00), agora o 'now' também tem. Casamento perfeito.
-                last_reset = datetime.fromisoformat(user["last_credit_reset"])
-                
-                if now - last_reset >= timedelta(hours=24):
-                    should_reset = True
-
-            if should_reset:
-                supabase.table("profiles").update({
-                    "credits_balance": 3,
-                    "last_credit_reset": now.isoformat()
-                }).eq("id", user_id).execute()
-                
-        except Exception as e:
-            print(f"🔥 ERRO NO RESET: {e}")
+        return {"allowed": False, "balance": reserva["balance"], "plan_status": reserva["plan_status"], "reason": "no_credits"}
 
+    @staticmethod
+    def refund_credit(user_id):
+        """Devolve o crédito reservado quando a geração falha"""
+        try:
+            saldo = storage.refund_credit(user_id)
+            profile_cache.invalidate(user_id)
+            print(f"↩️ Crédito estornado para {user_id}. Saldo: {saldo}")
+        except Exception as e:
+            print(f"⚠️ Erro ao estornar crédito: {e}")
 
     @staticmethod
-    def log_generation(user_id, input_text, output_text, model, tokens_in, tokens_out, time_taken):
-        """Salva o log de auditoria"""
-        if not supabase: return
-        
+    def log_generation(user_id, input_text, output_text, model, tokens_in, tokens_out, time_taken, cache_hit=False, ttft=None, client_time=None, model_time=None, stages=None, tipo_andamento=None, tom_de_voz=None, route=None, route_attempts=None):
+        """Enfileira o log de auditoria (gravado em lote pelo audit_writer)"""
+        created_at = datetime.utcnow().isoformat()
         try:
-            supabase.table("generation_logs").insert({
+            search_index.add(user_id, created_at, input_text, output_text)
+        except Exception as e:
+            print(f"⚠️ Falha ao indexar geração para busca: {e}")
+
+        try:
+            # O log guarda só os hashes; cada texto distinto vai uma vez para a tabela texts
+            input_hash, texto_entrada = text_store.prepare(input_text)
+            output_hash, texto_saida = text_store.prepare(output_text)
+            descartado = False
+            for linha in (texto_entrada, texto_saida):
+                if linha is None:
+                    continue
+                if descartado or not audit_writer.enqueue("texts", linha):
+                    text_store.discard(linha)
+                    descartado = True
+            if descartado:
+                # Sem o texto o log ficaria apontando para um hash inexistente
+                print(f"⚠️ Fila de auditoria cheia: log de geração de {user_id} descartado")
+                return
+
+            audit_writer.enqueue("generation_logs", {
                 "user_id": user_id,
-                "input_text": input_text,
-                "output_text": output_text,
+                "input_hash": input_hash,
+                "output_hash": output_hash,
+                "input_preview": (input_text or "")[:PREVIEW_CHARS],
                 "model_used": model,
                 "tokens_input": tokens_in,
                 "tokens_output": tokens_out,
                 "latency_ms": int(time_taken * 1000),
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
+                "cache_hit": cache_hit,
+                "ttft_ms": int(ttft * 1000) if ttft is not None else None,
+                "client_ms": int(client_time * 1000) if client_time is not None else None,
+                "model_ms": int(model_time * 1000) if model_time is not None else None,
+                "stages": stages,
+                "tipo_andamento": tipo_andamento,
+                "tom_de_voz": tom_de_voz,
+                "route": route,
+                "route_attempts": route_attempts,
+                "created_at": created_at
+            })
         except Exception as e:
             # Log falhou? Printa no terminal mas não trava o app do usuário
             print(f"⚠️ Falha ao salvar log: {e}")
 
-    @staticmethod
-    def debit_credit(user_id):
-        """Desconta 1 crédito apenas se for plano FREE"""
-        if not supabase: return
-        
-        try:
-            # Busca status atual para garantir que não vamos descontar de PRO
-            response = supabase.table("profiles").select("plan_status, credits_balance").eq("id", user_id).execute()
-            
-            if response.data:
-                user = response.data[0]
-                
-                # Só desconta se for FREE e tiver saldo positivo
-                if user.get('plan_status') == 'free' and user.get('credits_balance', 0) > 0:
-                    novo_saldo = user['credits_balance'] - 1
-                    
-                    supabase.table("profiles").update({
-                        "credits_balance": novo_saldo
-                    }).eq("id", user_id).execute()
-                    
-                    print(f"📉 Crédito debitado de {user_id}. Restam: {novo_saldo}")
-        except Exception as e:
-            print(f"⚠️ Erro ao debitar crédito: {e}")
-
     @staticmethod
     def log_event(user_id, event_type, details=None):
         """Registra eventos de sistema (Erros, Logins, etc)"""
-        if not supabase: return
         try:
-            supabase.table("system_events").insert({
+            audit_writer.enqueue("system_events", {
                 "user_id": user_id,
                 "event_type": event_type,
                 "details": str(details),
                 "created_at": datetime.utcnow().isoformat()
-            }).execute()
+            })
         except:
             pass
 
     @staticmethod
-    def get_history(user_id, plan_status):
-        """Busca o histórico baseado no plano"""
+    def get_history(user_id, plan_status, limit=None, before=None):
+        """
+        Busca o histórico baseado no plano; limit: só as gerações mais recentes.
+        before: created_at da última linha já lida (páginas em ordem decrescente).
+        """
         try:
             # Define o limite de tempo baseado no plano
             if plan_status == 'free':
@@ -188,18 +314,72 @@ class SaaSLogger:
             # Formata para string ISO compatível com Supabase
             time_limit_str = time_limit.isoformat()
 
-            response = supabase.table("generation_logs")\
-                .select("input_text, output_text, created_at")\
-                .eq("user_id", user_id)\
-                .gte("created_at", time_limit_str)\
-                .order("created_at", desc=True)\
-                .execute()
-            
-            return response.data if response.data else []
+            return text_store.resolve_rows(storage.get_history(user_id, time_limit_str, limit, before))
         except Exception as e:
             print(f"Erro ao buscar histórico: {e}")
             return []
 
+    @staticmethod
+    def history_window_start(plan_status):
+        """Início da janela de histórico do plano (24h no FREE, 30 dias nos pagos)"""
+        if plan_status == 'free':
+            return datetime.now(timezone.utc) - timedelta(hours=24)
+        return datetime.now(timezone.utc) - timedelta(days=30)
+
+    @staticmethod
+    def get_history_page(user_id, plan_status, before=None, limit=HISTORY_PAGE_SIZE):
+        """
+        Uma página do histórico (keyset em created_at), só com as colunas de prévia.
+        before: created_at do último item já exibido. Retorna (itens, tem_mais).
+        """
+        try:
+            # Pede 1 a mais só para saber se existe próxima página
+            rows = storage.get_history_page(
+                user_id,
+                SaaSLogger.history_window_start(plan_status).isoformat(),
+                before,
+                limit + 1
+            )
+            return rows[:limit], len(rows) > limit
+        except Exception as e:
+            print(f"Erro ao buscar histórico: {e}")
+            return [], False
+
+    @staticmethod
+    def get_history_since(user_id, plan_status, since, limit=200):
+        """Itens (só prévia) criados depois de since — usado na sincronização incremental"""
+        try:
+            inicio = max(since, SaaSLogger.history_window_start(plan_status))
+            return storage.get_history_since(user_id, inicio.isoformat(), limit)
+        except Exception as e:
+            print(f"Erro ao sincronizar histórico: {e}")
+            return []
+
+    @staticmethod
+    def get_history_item(user_id, log_id):
+        """Textos completos de um item do histórico (carregado só quando aberto)"""
+        try:
+            row = storage.get_history_item(user_id, log_id)
+            if not row:
+                return None
+            text_store.resolve_rows([row])
+            if row["output_text"] is None:
+                return None
+            return {"input_text": row["input_text"], "output_text": row["output_text"]}
+        except Exception as e:
+            print(f"Erro ao buscar item do histórico: {e}")
+            return None
+
+    @staticmethod
+    def revoke_session(jti, user_id, expires_at):
+        """Registra a revogação de um token de sessão (expires_at em epoch)"""
+        storage.revoke_session(jti, user_id, datetime.fromtimestamp(expires_at, timezone.utc).isoformat())
+
+    @staticmethod
+    def get_revoked_sessions():
+        """jti de tokens revogados que ainda não expiraram"""
+        return storage.get_revoked_sessions(datetime.now(timezone.utc).isoformat())
+
     @staticmethod
     def time_until_next_reset(last_reset_str):
         """Calcula tempo restante com proteção de fuso horário"""
@@ -207,14 +387,13 @@ class SaaSLogger:
             return "agora"
 
         try:
-            # Data do último reset (Vem do banco COM fuso)
-            last_reset_dt = datetime.fromisoformat(last_reset_str)
+            # Data do último reset em UTC (datas antigas sem fuso também são UTC)
+            last_reset_dt = parse_reset_time(last_reset_str)
             
             # Próximo reset é +24h
-            next_reset = last_reset_dt + timedelta(hours=24)
+            next_reset = last_reset_dt + FREE_RESET_INTERVAL
             
-            # CORREÇÃO: Pegamos o 'agora' usando o MESMO fuso da data do banco
-            now = datetime.now(last_reset_dt.tzinfo)
+            now = datetime.now(timezone.utc)
 
             if now >= next_reset:
                 return "agora"
@@ -231,27 +410,3 @@ class SaaSLogger:
             print(f"Erro calculando tempo: {e}")
             return "em breve"
 
-    @staticmethod
-    def ensure_credit_reset_initialized(user_id):
-        """Garante que last_credit_reset nunca seja NULL"""
-        if not supabase:
-            return None
-
-        response = supabase.table("profiles") \
-            .select("last_credit_reset") \
-            .eq("id", user_id) \
-            .single() \
-            .execute()
-
-        last_reset = response.data.get("last_credit_reset")
-
-        if last_reset is None:
-            now_utc = datetime.utcnow().isoformat()
-
-            supabase.table("profiles").update({
-                "last_credit_reset": now_utc
-            }).eq("id", user_id).execute()
-
-            return now_utc
-
-        return last_reset
\ No newline at end of file
@@ -0,0 +1,123 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
+import threading
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+class SessionManager:
+    """
+    Tokens de sessão assinados (HMAC-SHA256) com expiração, validados localmente.
+    Formato: base64url(payload JSON).base64url(assinatura)
+    Revogação: lista de jti revogados, recarregada do banco a cada refresh_s (o banco só
+    devolve os que ainda não expiraram); as revogações deste processo valem até aparecerem
+    na lista do banco ou expirarem.
+    """
+
+    def __init__(self, secret, ttl_s, rotate_after_s, load_revoked=None, store_revocation=None, refresh_s=30):
+        self.secret = secret
+        self.ttl_s = ttl_s
+        self.rotate_after_s = rotate_after_s
+        self.load_revoked = load_revoked
+        self.store_revocation = store_revocation
+        self.refresh_s = refresh_s
+        self._revoked = set()
+        # jti -> exp das revogações deste processo ainda não vistas no banco
+        self._pending = {}
+        self._revoked_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _sign(self, payload_b64):
+        return _b64encode(hmac.new(self.secret, payload_b64.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id):
+        """Cria um token novo para o usuário"""
+        agora = int(time.time())
+        payload = {"uid": user_id, "iat": agora, "exp": agora + int(self.ttl_s), "jti": secrets.token_urlsafe(12)}
+        payload_b64 = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        return f"{payload_b64}.{self._sign(payload_b64)}"
+
+    def decode(self, token):
+        """Payload do token se a assinatura e a validade baterem (sem checar revogação)"""
+        if not token or token.count(".") != 1:
+            return None
+
+        payload_b64, assinatura = token.split(".")
+        if not hmac.compare_digest(assinatura, self._sign(payload_b64)):
+            return None
+
+        try:
+            payload = json.loads(_b64decode(payload_b64))
+        except Exception:
+            return None
+
+        if payload.get("exp", 0) <= time.time():
+            return None
+        return payload
+
+    def _refresh_revoked(self):
+        if not self.load_revoked or time.monotonic() - self._revoked_loaded_at < self.refresh_s:
+            return
+        self._revoked_loaded_at = time.monotonic()
+        try:
+            revogados = set(self.load_revoked())
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar sessões revogadas: {e}")
+            return
+        with self._lock:
+            agora = time.time()
+            self._pending = {
+                jti: exp for jti, exp in self._pending.items()
+                if exp > agora and jti not in revogados
+            }
+            self._revoked = revogados | set(self._pending)
+
+    def validate(self, token):
+        """Retorna o payload se o token for válido e não revogado; senão None"""
+        payload = self.decode(token)
+        if payload is None:
+            return None
+
+        self._refresh_revoked()
+        with self._lock:
+            if payload["jti"] in self._revoked:
+                return None
+        return payload
+
+    def needs_rotation(self, payload):
+        return time.time() - payload["iat"] >= self.rotate_after_s
+
+    def rotate(self, token):
+        """Emite um token novo e revoga o antigo; None se o antigo não for válido"""
+        payload = self.validate(token)
+        if payload is None:
+            return None
+        novo = self.issue(payload["uid"])
+        self.revoke(token)
+        return novo
+
+    def revoke(self, token):
+        """Revoga o token (logout); vale neste processo na hora e nos outros após o refresh"""
+        payload = self.decode(token)
+        if payload is None:
+            return
+
+        with self._lock:
+            self._revoked.add(payload["jti"])
+            self._pending[payload["jti"]] = payload["exp"]
+
+        if self.store_revocation:
+            try:
+                self.store_revocation(payload["jti"], payload["uid"], payload["exp"])
+            except Exception as e:
+                print(f"⚠️ Erro ao registrar revogação de sessão: {e}")
@@ -0,0 +1,153 @@
+import os
+import re
+import zlib
+import threading
+import unicodedata
+from collections import deque
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.8"))
+SIMILARITY_MAX_ENTRIES = int(os.getenv("SIMILARITY_MAX_ENTRIES", "300000"))
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+
+
+def _fold(texto):
+    """Minúsculas, sem acento e com números trocados por '#' (datas, fls., valores)"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\d+", "#", texto)
+
+
+def shingles(texto, n=3):
+    """Hashes (uint32) dos n-gramas de palavras do texto normalizado"""
+    palavras = re.findall(r"[\w#]+", _fold(texto))
+    if len(palavras) < n:
+        grams = [" ".join(palavras)] if palavras else []
+    else:
+        grams = [" ".join(palavras[i:i + n]) for i in range(len(palavras) - n + 1)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+
+
+class NearDuplicateIndex:
+    """
+    Índice MinHash + LSH (NumPy) para achar andamentos quase iguais já traduzidos.
+    Cada entrada é separada por usuário, tipo e tom: só compara o que é comparável.
+    A busca olha apenas os baldes LSH do texto (dict lookups), não o índice inteiro.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, max_entries=SIMILARITY_MAX_ENTRIES, seed=42):
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = {}
+        self._order = deque()
+        self._buckets = {}
+        self._per_user = {}
+        self._next_id = 0
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def signature(self, texto):
+        hashes = shingles(texto)
+        if hashes.size == 0:
+            return None
+        valores = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return valores.min(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def _band_keys(escopo, assinatura):
+        return [(escopo, i, assinatura[i * ROWS:(i + 1) * ROWS].tobytes()) for i in range(BANDS)]
+
+    def add(self, user_id, texto_processo, tipo_andamento, tom_de_voz, output_text):
+        assinatura = self.signature(texto_processo)
+        if assinatura is None:
+            return
+
+        escopo = (user_id, tipo_andamento, tom_de_voz)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (escopo, assinatura, output_text)
+            self._order.append(entry_id)
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            for chave in self._band_keys(escopo, assinatura):
+                self._buckets.setdefault(chave, deque()).append(entry_id)
+
+            while len(self._order) > self.max_entries:
+                self._evict(self._order.popleft())
+
+    def _evict(self, entry_id):
+        """Tira a entrada mais antiga do índice e dos seus baldes (chamado com o lock)"""
+        escopo, assinatura, _ = self._entries.pop(entry_id)
+        for chave in self._band_keys(escopo, assinatura):
+            ids = self._buckets[chave]
+            # Baldes em ordem de inserção: a mais antiga está na frente
+            if ids[0] == entry_id:
+                ids.popleft()
+            else:
+                ids.remove(entry_id)
+            if not ids:
+                del self._buckets[chave]
+
+        user_id = escopo[0]
+        self._per_user[user_id] -= 1
+        if not self._per_user[user_id]:
+            # Usuário saiu todo do índice: a próxima ensure_user semeia de novo
+            del self._per_user[user_id]
+            self._loaded.discard(user_id)
+
+    def ensure_user(self, user_id, loader):
+        """Carrega as gerações anteriores do usuário uma vez; loader() devolve as linhas do banco"""
+        if user_id in self._loaded:
+            return
+        for row in loader():
+            # Textos não resolvidos (linha de texts ausente) vêm como None: não há o que comparar
+            if not row.get("input_text") or not row.get("output_text"):
+                continue
+            if row.get("tipo_andamento") and row.get("tom_de_voz"):
+                self.add(user_id, row["input_text"], row["tipo_andamento"], row["tom_de_voz"], row["output_text"])
+        self._loaded.add(user_id)
+
+    def find(self, user_id, texto_processo, tipo_andamento, tom_de_voz):
+        """
+        Tradução anterior mais parecida acima do limiar.
+        Retorna {'output_text', 'similarity'} ou None.
+        """
+        assinatura = self.signature(texto_processo)
+        if assinatura is None:
+            return None
+
+        escopo = (user_id, tipo_andamento, tom_de_voz)
+        with self._lock:
+            candidatos = set()
+            for chave in self._band_keys(escopo, assinatura):
+                candidatos.update(self._buckets.get(chave, ()))
+
+            if not candidatos:
+                return None
+
+            ids = list(candidatos)
+            assinaturas = np.stack([self._entries[i][1] for i in ids])
+            saidas = [self._entries[i][2] for i in ids]
+
+        # Jaccard estimado = fração de posições iguais entre as assinaturas
+        similaridades = (assinaturas == assinatura).mean(axis=1)
+        melhor = int(similaridades.argmax())
+        if similaridades[melhor] < self.threshold:
+            return None
+        return {"output_text": saidas[melhor], "similarity": float(similaridades[melhor])}
+
+    def size(self):
+        return len(self._entries)
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from metrics import metrics
+
+load_dotenv()
+
+SINGLEFLIGHT_WORKERS = int(os.getenv("SINGLEFLIGHT_WORKERS", "16"))
+# Resultado fica disponível mais um pouco: o rerun de um duplo clique que chega logo depois
+# do fim (o primeiro rerun foi interrompido pelo Streamlit) ainda recebe o mesmo resultado
+SINGLEFLIGHT_LINGER_S = float(os.getenv("SINGLEFLIGHT_LINGER_S", "10"))
+
+# Estado por thread que segue o trabalho até o pool (rastro de etapas, idas ao banco do rerun):
+# (iniciar, finalizar, juntar); iniciar() e finalizar() -> dados rodam na thread do pool,
+# juntar(dados) na thread de quem iniciou a execução
+_propagadores = [(metrics.begin_capture, metrics.end_capture, metrics.merge_trace)]
+
+
+def register_propagator(iniciar, finalizar, juntar):
+    _propagadores.append((iniciar, finalizar, juntar))
+
+
+class _Chamada:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.partial = None
+        self.version = 0
+        self.context = []
+
+    def publish(self, texto):
+        """on_text da execução: guarda o texto parcial para quem estiver esperando"""
+        self.partial = texto
+        self.version += 1
+
+
+class SingleFlight:
+    """
+    Coalesce execuções simultâneas com a mesma chave entre as threads do processo
+    (uma por sessão do Streamlit): a primeira roda fn numa thread própria e as outras
+    esperam e recebem o mesmo resultado (ou o mesmo erro).
+    A execução não depende da sessão que a iniciou: se o rerun for interrompido
+    (duplo clique), ela termina e o próximo rerun pega o resultado.
+    """
+
+    def __init__(self, name, max_workers=SINGLEFLIGHT_WORKERS, linger_s=SINGLEFLIGHT_LINGER_S):
+        self.name = name
+        self.linger_s = linger_s
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"sf-{name}")
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def _run(self, key, chamada, fn):
+        propagadores = list(_propagadores)
+        for iniciar, _, _ in propagadores:
+            iniciar()
+        try:
+            chamada.result = fn(chamada.publish)
+        except BaseException as e:
+            chamada.error = e
+        finally:
+            chamada.context = [(juntar, finalizar()) for _, finalizar, juntar in propagadores]
+            chamada.finished_at = time.time()
+            if chamada.error is not None or not self.linger_s:
+                # Erro não fica guardado: o usuário pode tentar de novo na hora
+                with self._lock:
+                    if self._calls.get(key) is chamada:
+                        del self._calls[key]
+            chamada.done.set()
+
+    def do(self, key, fn, on_text=None, poll_s=0.1):
+        """
+        Executa fn(publicar) uma vez por chave em andamento; devolve (resultado, compartilhado).
+        on_text(texto_parcial) roda na thread de quem chamou, com o que fn publicar.
+        Quem iniciou a execução recebe no seu rerun as etapas e idas ao banco feitas no pool.
+        """
+        agora = time.time()
+        with self._lock:
+            # Limpa resultados que já passaram do tempo de espera
+            for chave, antiga in list(self._calls.items()):
+                if antiga.finished_at is not None and agora - antiga.finished_at > self.linger_s:
+                    del self._calls[chave]
+
+            chamada = self._calls.get(key)
+            compartilhado = chamada is not None
+            if compartilhado:
+                self._stats["coalesced"] += 1
+            else:
+                chamada = self._calls[key] = _Chamada()
+                self._stats["leaders"] += 1
+
+        if compartilhado:
+            metrics.inc(f"singleflight.{self.name}.coalesced")
+        else:
+            self._executor.submit(self._run, key, chamada, fn)
+
+        versao = 0
+        while not chamada.done.wait(poll_s):
+            if on_text and chamada.version != versao:
+                versao = chamada.version
+                on_text(chamada.partial)
+
+        if not compartilhado:
+            for juntar, dados in chamada.context:
+                juntar(dados)
+
+        if chamada.error is not None:
+            raise chamada.error
+        return chamada.result, compartilhado
+
+    def stats(self):
+        with self._lock:
+            em_andamento = sum(1 for chamada in self._calls.values() if chamada.finished_at is None)
+            return {"in_flight": em_andamento, **self._stats}
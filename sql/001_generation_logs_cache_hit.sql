@@ -0,0 +1,3 @@
+-- Marca gerações respondidas pelo cache de traduções (sem chamada ao Gemini)
+alter table generation_logs
+    add column if not exists cache_hit boolean not null default false;
@@ -0,0 +1,4 @@
+-- Tempo até o primeiro token (latência percebida) no modo streaming.
+-- latency_ms continua sendo o tempo total da geração.
+alter table generation_logs
+    add column if not exists ttft_ms integer;
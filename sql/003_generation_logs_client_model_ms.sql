@@ -0,0 +1,4 @@
+-- Separa o tempo de obtenção do cliente Gemini do tempo da chamada ao modelo
+alter table generation_logs
+    add column if not exists client_ms integer,
+    add column if not exists model_ms integer;
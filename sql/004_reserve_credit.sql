@@ -0,0 +1,45 @@
+-- Reserva de crédito atômica: checa o plano e debita em uma única chamada (RPC).
+-- Planos pagos são liberados sem débito; FREE só debita se ainda houver saldo.
+create or replace function reserve_credit(p_user_id text)
+returns table (allowed boolean, plan_status text, credits_balance integer)
+language plpgsql
+as $$
+begin
+    return query
+        select true, p.plan_status, p.credits_balance
+        from profiles p
+        where p.id = p_user_id
+          and p.plan_status in ('pro_monthly', 'pro_annual', 'admin');
+    if found then
+        return;
+    end if;
+
+    return query
+        update profiles p
+        set credits_balance = p.credits_balance - 1
+        where p.id = p_user_id
+          and p.plan_status = 'free'
+          and p.credits_balance > 0
+        returning true, p.plan_status, p.credits_balance;
+    if found then
+        return;
+    end if;
+
+    return query
+        select false, p.plan_status, p.credits_balance
+        from profiles p
+        where p.id = p_user_id;
+end;
+$$;
+
+-- Estorno quando a chamada ao Gemini falha (nunca passa do saldo diário do FREE)
+create or replace function refund_credit(p_user_id text)
+returns integer
+language sql
+as $$
+    update profiles
+    set credits_balance = least(credits_balance + 1, 3)
+    where id = p_user_id
+      and plan_status = 'free'
+    returning credits_balance;
+$$;
@@ -0,0 +1,8 @@
+-- Prévia do texto original para a listagem do histórico (evita baixar input_text inteiro)
+alter table generation_logs
+    add column if not exists input_preview text
+    generated always as (left(input_text, 150)) stored;
+
+-- Keyset do histórico: filtro por usuário + ordenação por created_at
+create index if not exists idx_generation_logs_user_created_at
+    on generation_logs (user_id, created_at desc);
@@ -0,0 +1,10 @@
+-- Tokens de sessão revogados (logout / rotação). Cada processo sincroniza a lista periodicamente.
+create table if not exists revoked_sessions (
+    jti text primary key,
+    user_id text not null,
+    expires_at timestamptz not null,
+    revoked_at timestamptz not null default now()
+);
+
+create index if not exists idx_revoked_sessions_expires_at
+    on revoked_sessions (expires_at);
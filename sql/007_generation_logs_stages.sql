@@ -0,0 +1,4 @@
+-- Etapas do modo documento longo (map-reduce): tokens e latência de cada chamada.
+-- Ex: [{"stage": "map", "part": 1, "tokens_in": 812, "tokens_out": 140, "ms": 2100}, ...]
+alter table generation_logs
+    add column if not exists stages jsonb;
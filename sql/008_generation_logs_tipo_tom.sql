@@ -0,0 +1,4 @@
+-- Tipo de documento e tom usados na geração (detecção de andamentos quase iguais)
+alter table generation_logs
+    add column if not exists tipo_andamento text,
+    add column if not exists tom_de_voz text;
@@ -0,0 +1,5 @@
+-- Decisão do roteador de modelos: rota escolhida e cada tentativa (fallback incluso).
+-- Ex: route = 'curto_lite', route_attempts = [{"model": "gemini-2.5-flash-lite", "ok": true, "ms": 900}]
+alter table generation_logs
+    add column if not exists route text,
+    add column if not exists route_attempts jsonb;
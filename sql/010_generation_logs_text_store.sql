@@ -0,0 +1,39 @@
+-- Textos das gerações endereçados pelo conteúdo: cada texto distinto é gravado uma vez
+-- (hash = sha256 hex do UTF-8) e generation_logs guarda só os hashes.
+-- encoding: 'raw' ou 'zlib'/'zstd' (content em base64, ver textstore.py)
+create table if not exists texts (
+    hash text primary key,
+    encoding text not null default 'raw',
+    content text not null,
+    size_bytes integer,
+    created_at timestamptz not null default now()
+);
+
+alter table generation_logs
+    add column if not exists input_hash text,
+    add column if not exists output_hash text;
+
+-- A prévia deixa de ser derivada de input_text (que vai ser apagado): passa a ser gravada pelo app
+alter table generation_logs alter column input_preview drop expression if exists;
+
+-- Backfill: textos existentes para texts, hashes nos logs
+insert into texts (hash, encoding, content, size_bytes)
+select encode(sha256(convert_to(t, 'UTF8')), 'hex'), 'raw', t, octet_length(t)
+from (
+    select input_text as t from generation_logs where input_text is not null
+    union
+    select output_text from generation_logs where output_text is not null
+) textos
+on conflict (hash) do nothing;
+
+update generation_logs set
+    input_hash = encode(sha256(convert_to(input_text, 'UTF8')), 'hex'),
+    output_hash = encode(sha256(convert_to(output_text, 'UTF8')), 'hex')
+where input_hash is null and (input_text is not null or output_text is not null);
+
+-- Os textos ficam só em texts. O espaço das linhas antigas volta depois de um VACUUM (FULL) de generation_logs.
+alter table generation_logs
+    alter column input_text drop not null,
+    alter column output_text drop not null;
+update generation_logs set input_text = null, output_text = null
+where input_text is not null or output_text is not null;
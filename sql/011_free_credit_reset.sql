@@ -0,0 +1,73 @@
+-- Reset dos créditos FREE em lote (job agendado: python main.py reset-credits),
+-- no lugar da checagem + update feitos a cada rerun da sidebar.
+
+-- Perfis FREE em ordem de id, com a data do último reset (páginas do job)
+create index if not exists idx_profiles_free_reset
+    on profiles (id, last_credit_reset)
+    where plan_status = 'free';
+
+-- Uma página: até p_limit perfis FREE com ciclo vencido (24h) e id > p_after, num único UPDATE.
+-- p_now é fixo durante a execução inteira: rodar de novo (ou retomar) não reseta ninguém duas vezes.
+-- Linhas travadas por um reserve_credit em andamento ficam para a próxima execução.
+create or replace function reset_free_credits(p_after text, p_limit integer, p_now timestamptz)
+returns table (reset_count integer, last_id text)
+language sql
+as $$
+    with pagina as (
+        select p.id
+        from profiles p
+        where p.plan_status = 'free'
+          and p.id > coalesce(p_after, '')
+          and (p.last_credit_reset is null or p.last_credit_reset <= p_now - interval '24 hours')
+        order by p.id
+        limit p_limit
+        for update skip locked
+    ), renovados as (
+        update profiles p
+        set credits_balance = 3,
+            last_credit_reset = p_now
+        from pagina
+        where p.id = pagina.id
+        returning p.id
+    )
+    select count(*)::integer, max(id) from renovados;
+$$;
+
+-- reserve_credit passa a renovar o ciclo vencido que o job ainda não pegou (no mesmo débito):
+-- o saldo mostrado pela sidebar (derivado de last_credit_reset, sem gravar) vale na hora de gerar.
+create or replace function reserve_credit(p_user_id text)
+returns table (allowed boolean, plan_status text, credits_balance integer)
+language plpgsql
+as $$
+begin
+    return query
+        select true, p.plan_status, p.credits_balance
+        from profiles p
+        where p.id = p_user_id
+          and p.plan_status in ('pro_monthly', 'pro_annual', 'admin');
+    if found then
+        return;
+    end if;
+
+    return query
+        update profiles p
+        set credits_balance = case when p.last_credit_reset is null or p.last_credit_reset <= now() - interval '24 hours'
+                                   then 3 - 1
+                                   else p.credits_balance - 1 end,
+            last_credit_reset = case when p.last_credit_reset is null or p.last_credit_reset <= now() - interval '24 hours'
+                                     then now()
+                                     else p.last_credit_reset end
+        where p.id = p_user_id
+          and p.plan_status = 'free'
+          and (p.credits_balance > 0 or p.last_credit_reset is null or p.last_credit_reset <= now() - interval '24 hours')
+        returning true, p.plan_status, p.credits_balance;
+    if found then
+        return;
+    end if;
+
+    return query
+        select false, p.plan_status, p.credits_balance
+        from profiles p
+        where p.id = p_user_id;
+end;
+$$;
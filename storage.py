@@ -0,0 +1,529 @@
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from credits import SupabaseCreditStore, FREE_DAILY_CREDITS, FREE_RESET_INTERVAL, PAID_PLANS, parse_reset_time
+from textstore import text_hash, PREVIEW_CHARS
+from metrics import metrics
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND")
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "traduzjur.db")
+
+# Contrato dos backends (SupabaseStorage e SqliteStorage têm os mesmos métodos):
+# - perfis: get_profile, get_profile_by_email, create_profile, update_profile
+# - créditos: reserve_credit, refund_credit (mesma semântica do sql/004 e sql/011),
+#   reset_free_credits(after, limit, now) para o job de reset em lote
+# - auditoria: insert_rows(tabela, linhas) para generation_logs, system_events e texts
+# - textos (endereçados pelo hash, ver textstore.py): get_texts
+# - histórico: get_history, get_history_page, get_history_since, get_history_item, recent_generation_times
+# - sessões: revoke_session, get_revoked_sessions
+# Datas entram e saem como texto ISO 8601; on_roundtrip() é chamado a cada ida ao banco.
+
+
+class LazySupabase:
+    """
+    Cliente Supabase criado no primeiro uso e compartilhado pelo processo.
+    O SDK leva ~250 ms para importar: a tela de login não paga esse custo.
+    """
+
+    def __init__(self, url, key):
+        self._url = url
+        self._key = key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self._url, self._key)
+        return self._client
+
+    def __getattr__(self, nome):
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+        return getattr(self._get(), nome)
+
+
+class SupabaseStorage:
+    """Backend Supabase (Postgres via PostgREST), para produção com várias réplicas"""
+
+    def __init__(self, client, on_roundtrip=None):
+        self.client = client
+        self.on_roundtrip = on_roundtrip
+        self.credits = SupabaseCreditStore(client, execute=self._execute)
+
+    def _execute(self, query):
+        if self.on_roundtrip:
+            self.on_roundtrip()
+        with metrics.timer("db.execute"):
+            return query.execute()
+
+    def get_profile(self, user_id):
+        response = self._execute(self.client.table("profiles").select("*").eq("id", user_id))
+        return response.data[0] if response.data else None
+
+    def get_profile_by_email(self, email):
+        response = self._execute(self.client.table("profiles").select("*").eq("email", email))
+        return response.data[0] if response.data else None
+
+    def create_profile(self, row):
+        self._execute(self.client.table("profiles").insert(row))
+
+    def update_profile(self, user_id, campos):
+        self._execute(self.client.table("profiles").update(campos).eq("id", user_id))
+
+    def reserve_credit(self, user_id):
+        return self.credits.reserve(user_id)
+
+    def refund_credit(self, user_id):
+        return self.credits.refund(user_id)
+
+    def reset_free_credits(self, after, limit, now):
+        return self.credits.reset_free(after, limit, now)
+
+    def insert_rows(self, table, rows):
+        if table == "texts":
+            # Mesmo texto já gravado (por este ou outro processo): ignora
+            self._execute(self.client.table("texts").upsert(rows, on_conflict="hash", ignore_duplicates=True))
+            return
+        self._execute(self.client.table(table).insert(rows))
+
+    def get_texts(self, hashes):
+        response = self._execute(
+            self.client.table("texts")
+            .select("hash, encoding, content")
+            .in_("hash", list(hashes))
+        )
+        return response.data or []
+
+    def recent_generation_times(self, user_id, since, limit):
+        response = self._execute(
+            self.client.table("generation_logs")
+            .select("created_at")
+            .eq("user_id", user_id)
+            .gte("created_at", since)
+            .order("created_at", desc=True)
+            .limit(limit)
+        )
+        return [row["created_at"] for row in response.data or []]
+
+    def get_history(self, user_id, since, limit=None, before=None):
+        query = (
+            self.client.table("generation_logs")
+            .select("input_hash, output_hash, created_at, tipo_andamento, tom_de_voz")
+            .eq("user_id", user_id)
+            .gte("created_at", since)
+        )
+        if before:
+            query = query.lt("created_at", before)
+        query = query.order("created_at", desc=True)
+        if limit:
+            query = query.limit(limit)
+        response = self._execute(query)
+        return response.data or []
+
+    def get_history_page(self, user_id, since, before, limit):
+        query = (
+            self.client.table("generation_logs")
+            .select("id, created_at, input_preview")
+            .eq("user_id", user_id)
+            .gte("created_at", since)
+        )
+        if before:
+            query = query.lt("created_at", before)
+        response = self._execute(query.order("created_at", desc=True).limit(limit))
+        return response.data or []
+
+    def get_history_since(self, user_id, since, limit):
+        response = self._execute(
+            self.client.table("generation_logs")
+            .select("id, created_at, input_preview")
+            .eq("user_id", user_id)
+            .gt("created_at", since)
+            .order("created_at", desc=True)
+            .limit(limit)
+        )
+        return response.data or []
+
+    def get_history_item(self, user_id, log_id):
+        response = self._execute(
+            self.client.table("generation_logs")
+            .select("input_hash, output_hash")
+            .eq("id", log_id)
+            .eq("user_id", user_id)
+            .limit(1)
+        )
+        return response.data[0] if response.data else None
+
+    def revoke_session(self, jti, user_id, expires_at):
+        self._execute(self.client.table("revoked_sessions").insert({
+            "jti": jti,
+            "user_id": user_id,
+            "expires_at": expires_at
+        }))
+
+    def get_revoked_sessions(self, now):
+        response = self._execute(
+            self.client.table("revoked_sessions")
+            .select("jti")
+            .gt("expires_at", now)
+        )
+        return [row["jti"] for row in response.data or []]
+
+
+def _utc_iso(valor):
+    """
+    Data ISO em UTC com formato fixo (microssegundos + '+00:00'), como o Postgres devolve.
+    Datas sem fuso são tratadas como UTC; o formato fixo deixa a comparação de texto igual à de datas.
+    """
+    if valor is None:
+        return None
+    data = datetime.fromisoformat(valor) if isinstance(valor, str) else valor
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    password_hash TEXT,
+    plan_status TEXT NOT NULL DEFAULT 'free',
+    credits_balance INTEGER NOT NULL DEFAULT 3,
+    last_credit_reset TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_email ON profiles (email);
+CREATE INDEX IF NOT EXISTS idx_profiles_free_reset ON profiles (id, last_credit_reset) WHERE plan_status = 'free';
+
+CREATE TABLE IF NOT EXISTS generation_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    input_hash TEXT,
+    output_hash TEXT,
+    input_preview TEXT,
+    model_used TEXT,
+    tokens_input INTEGER,
+    tokens_output INTEGER,
+    latency_ms INTEGER,
+    cache_hit INTEGER,
+    ttft_ms INTEGER,
+    client_ms INTEGER,
+    model_ms INTEGER,
+    stages TEXT,
+    tipo_andamento TEXT,
+    tom_de_voz TEXT,
+    route TEXT,
+    route_attempts TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_generation_logs_user_created_at ON generation_logs (user_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS texts (
+    hash TEXT PRIMARY KEY,
+    encoding TEXT NOT NULL DEFAULT 'raw',
+    content TEXT NOT NULL,
+    size_bytes INTEGER,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+CREATE TABLE IF NOT EXISTS system_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT,
+    event_type TEXT NOT NULL,
+    details TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_system_events_user_created_at ON system_events (user_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS revoked_sessions (
+    jti TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    revoked_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_revoked_sessions_expires_at ON revoked_sessions (expires_at);
+"""
+
+# Colunas aceitas por tabela (as linhas da auditoria vêm prontas para o Supabase)
+SQLITE_COLUNAS = {
+    "generation_logs": (
+        "user_id", "input_hash", "output_hash", "input_preview", "model_used", "tokens_input", "tokens_output",
+        "latency_ms", "cache_hit", "ttft_ms", "client_ms", "model_ms", "stages", "tipo_andamento",
+        "tom_de_voz", "route", "route_attempts", "created_at",
+    ),
+    "system_events": ("user_id", "event_type", "details", "created_at"),
+    "texts": ("hash", "encoding", "content", "size_bytes"),
+}
+SQLITE_JSON = {"stages", "route_attempts"}
+PROFILE_COLUNAS = ("id", "email", "password_hash", "plan_status", "credits_balance", "last_credit_reset")
+
+
+class SqliteStorage:
+    """
+    Backend embutido (um arquivo SQLite), para um único nó, desenvolvimento e testes.
+    WAL (leituras não esperam a escrita), índices em (user_id, created_at) e email, e SQL fixo
+    com parâmetros: o sqlite3 prepara cada comando uma vez e reaproveita do cache de statements.
+    """
+
+    def __init__(self, path=SQLITE_DB_PATH, on_roundtrip=None):
+        self.path = path
+        self.on_roundtrip = on_roundtrip
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None, cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate_inline_texts()
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _migrate_inline_texts(self):
+        """Arquivos do layout anterior (textos dentro de generation_logs): move os textos para texts"""
+        colunas = {row[1] for row in self._conn.execute("PRAGMA table_info(generation_logs)")}
+        if "input_text" not in colunas:
+            return
+
+        print(f"🔧 Migrando textos de generation_logs para a tabela texts ({self.path})")
+        self._conn.create_function("text_hash", 1, text_hash, deterministic=True)
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute("ALTER TABLE generation_logs RENAME TO generation_logs_v1")
+            self._conn.execute("DROP INDEX IF EXISTS idx_generation_logs_user_created_at")
+            # executescript faria COMMIT no meio da transação: um comando por vez
+            for comando in SQLITE_SCHEMA.split(";"):
+                if comando.strip():
+                    self._conn.execute(comando)
+            for coluna in ("input_text", "output_text"):
+                self._conn.execute(
+                    f"INSERT OR IGNORE INTO texts (hash, encoding, content, size_bytes) "
+                    f"SELECT text_hash({coluna}), 'raw', {coluna}, length(CAST({coluna} AS BLOB)) "
+                    f"FROM generation_logs_v1 WHERE {coluna} IS NOT NULL"
+                )
+            outras = [c for c in SQLITE_COLUNAS["generation_logs"] if c not in ("input_hash", "output_hash", "input_preview")]
+            self._conn.execute(
+                f"INSERT INTO generation_logs (id, input_hash, output_hash, input_preview, {', '.join(outras)}) "
+                f"SELECT id, text_hash(input_text), text_hash(output_text), substr(input_text, 1, {PREVIEW_CHARS}), {', '.join(outras)} "
+                f"FROM generation_logs_v1"
+            )
+            self._conn.execute("DROP TABLE generation_logs_v1")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _query(self, sql, params=()):
+        if self.on_roundtrip:
+            self.on_roundtrip()
+        with metrics.timer("db.execute"), self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _write(self, sql, params=(), many=False):
+        if self.on_roundtrip:
+            self.on_roundtrip()
+        with metrics.timer("db.execute"), self._lock:
+            if many:
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(sql, params)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            else:
+                self._conn.execute(sql, params)
+
+    def get_profile(self, user_id):
+        rows = self._query("SELECT * FROM profiles WHERE id = ?", (user_id,))
+        return rows[0] if rows else None
+
+    def get_profile_by_email(self, email):
+        rows = self._query("SELECT * FROM profiles WHERE email = ?", (email,))
+        return rows[0] if rows else None
+
+    def create_profile(self, row):
+        colunas = [coluna for coluna in PROFILE_COLUNAS if coluna in row]
+        self._write(
+            f"INSERT INTO profiles ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+            [row[coluna] if coluna != "last_credit_reset" else _utc_iso(row[coluna]) for coluna in colunas]
+        )
+
+    def update_profile(self, user_id, campos):
+        colunas = [coluna for coluna in PROFILE_COLUNAS if coluna in campos and coluna != "id"]
+        if not colunas:
+            return
+        valores = [campos[coluna] if coluna != "last_credit_reset" else _utc_iso(campos[coluna]) for coluna in colunas]
+        self._write(
+            f"UPDATE profiles SET {', '.join(f'{coluna} = ?' for coluna in colunas)} WHERE id = ?",
+            [*valores, user_id]
+        )
+
+    def reserve_credit(self, user_id):
+        """Débito condicional atômico (dentro do lock, numa transação)"""
+        if self.on_roundtrip:
+            self.on_roundtrip()
+        with metrics.timer("db.execute"), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT plan_status, credits_balance, last_credit_reset FROM profiles WHERE id = ?", (user_id,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return {"allowed": False, "plan_status": None, "balance": None}
+
+                status, saldo = row["plan_status"], row["credits_balance"]
+                allowed = status in PAID_PLANS
+                agora = datetime.now(timezone.utc)
+                ultimo_reset = parse_reset_time(row["last_credit_reset"])
+                if status == "free" and (ultimo_reset is None or agora - ultimo_reset >= FREE_RESET_INTERVAL):
+                    # Ciclo vencido que o job de reset ainda não pegou: renova junto com o débito
+                    saldo = FREE_DAILY_CREDITS - 1
+                    self._conn.execute(
+                        "UPDATE profiles SET credits_balance = ?, last_credit_reset = ? WHERE id = ?",
+                        (saldo, _utc_iso(agora), user_id)
+                    )
+                    allowed = True
+                elif status == "free" and saldo > 0:
+                    saldo -= 1
+                    self._conn.execute("UPDATE profiles SET credits_balance = ? WHERE id = ?", (saldo, user_id))
+                    allowed = True
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"allowed": allowed, "plan_status": status, "balance": saldo}
+
+    def refund_credit(self, user_id):
+        """Devolve o crédito reservado (só FREE, sem passar do saldo diário)"""
+        self._write(
+            "UPDATE profiles SET credits_balance = MIN(credits_balance + 1, ?) WHERE id = ? AND plan_status = 'free'",
+            (FREE_DAILY_CREDITS, user_id)
+        )
+        rows = self._query("SELECT credits_balance FROM profiles WHERE id = ? AND plan_status = 'free'", (user_id,))
+        return rows[0]["credits_balance"] if rows else None
+
+    def reset_free_credits(self, after, limit, now):
+        """
+        Uma página do reset em lote: até limit perfis FREE com ciclo vencido e id > after,
+        renovados num único UPDATE. Devolve {'reset', 'last_id'} (last_id None: acabou).
+        """
+        if self.on_roundtrip:
+            self.on_roundtrip()
+        with metrics.timer("db.execute"), self._lock:
+            rows = self._conn.execute(
+                "UPDATE profiles SET credits_balance = ?, last_credit_reset = ? WHERE id IN ("
+                "SELECT id FROM profiles WHERE plan_status = 'free' AND id > ? "
+                "AND (last_credit_reset IS NULL OR last_credit_reset <= ?) ORDER BY id LIMIT ?"
+                ") RETURNING id",
+                (FREE_DAILY_CREDITS, _utc_iso(now), after or "", _utc_iso(now - FREE_RESET_INTERVAL), limit)
+            ).fetchall()
+        return {"reset": len(rows), "last_id": max((row["id"] for row in rows), default=None)}
+
+    def insert_rows(self, table, rows):
+        colunas = SQLITE_COLUNAS[table]
+        valores = []
+        for row in rows:
+            linha = []
+            for coluna in colunas:
+                valor = row.get(coluna)
+                if coluna == "created_at":
+                    valor = _utc_iso(valor) or _utc_iso(datetime.now(timezone.utc))
+                elif coluna in SQLITE_JSON and valor is not None:
+                    valor = json.dumps(valor, ensure_ascii=False)
+                linha.append(valor)
+            valores.append(linha)
+        self._write(
+            # texts: o mesmo hash pode já estar gravado (conteúdo idêntico)
+            f"INSERT {'OR IGNORE ' if table == 'texts' else ''}INTO {table} ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+            valores,
+            many=True
+        )
+
+    def get_texts(self, hashes):
+        hashes = list(hashes)
+        return self._query(
+            f"SELECT hash, encoding, content FROM texts WHERE hash IN ({', '.join('?' for _ in hashes)})",
+            hashes
+        )
+
+    def recent_generation_times(self, user_id, since, limit):
+        rows = self._query(
+            "SELECT created_at FROM generation_logs WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, _utc_iso(since), limit)
+        )
+        return [row["created_at"] for row in rows]
+
+    def get_history(self, user_id, since, limit=None, before=None):
+        if before:
+            return self._query(
+                "SELECT input_hash, output_hash, created_at, tipo_andamento, tom_de_voz FROM generation_logs "
+                "WHERE user_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, _utc_iso(since), _utc_iso(before), limit or -1)
+            )
+        return self._query(
+            "SELECT input_hash, output_hash, created_at, tipo_andamento, tom_de_voz FROM generation_logs "
+            "WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, _utc_iso(since), limit or -1)
+        )
+
+    def get_history_page(self, user_id, since, before, limit):
+        if before:
+            return self._query(
+                "SELECT id, created_at, input_preview FROM generation_logs "
+                "WHERE user_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, _utc_iso(since), _utc_iso(before), limit)
+            )
+        return self._query(
+            "SELECT id, created_at, input_preview FROM generation_logs "
+            "WHERE user_id = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, _utc_iso(since), limit)
+        )
+
+    def get_history_since(self, user_id, since, limit):
+        return self._query(
+            "SELECT id, created_at, input_preview FROM generation_logs "
+            "WHERE user_id = ? AND created_at > ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, _utc_iso(since), limit)
+        )
+
+    def get_history_item(self, user_id, log_id):
+        rows = self._query(
+            "SELECT input_hash, output_hash FROM generation_logs WHERE id = ? AND user_id = ? LIMIT 1",
+            (log_id, user_id)
+        )
+        return rows[0] if rows else None
+
+    def revoke_session(self, jti, user_id, expires_at):
+        self._write(
+            "INSERT OR REPLACE INTO revoked_sessions (jti, user_id, expires_at) VALUES (?, ?, ?)",
+            (jti, user_id, _utc_iso(expires_at))
+        )
+
+    def get_revoked_sessions(self, now):
+        rows = self._query("SELECT jti FROM revoked_sessions WHERE expires_at > ?", (_utc_iso(now),))
+        return [row["jti"] for row in rows]
+
+
+def create_storage(on_roundtrip=None):
+    """
+    Backend escolhido por STORAGE_BACKEND ('supabase' ou 'sqlite').
+    Sem a variável: Supabase se SUPABASE_URL/SUPABASE_KEY estiverem configurados, senão SQLite local.
+    """
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    backend = STORAGE_BACKEND or ("supabase" if url and key else "sqlite")
+
+    if backend == "supabase":
+        if not (url and key):
+            raise RuntimeError("STORAGE_BACKEND=supabase exige SUPABASE_URL e SUPABASE_KEY")
+        return SupabaseStorage(LazySupabase(url, key), on_roundtrip=on_roundtrip)
+
+    if not STORAGE_BACKEND:
+        print(f"ℹ️ Supabase não configurado: usando o banco SQLite local ({SQLITE_DB_PATH}).")
+    return SqliteStorage(SQLITE_DB_PATH, on_roundtrip=on_roundtrip)
@@ -0,0 +1,158 @@
+import os
+import zlib
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Compressão dos textos guardados: "" (nenhuma), "zstd" (pacote zstandard, opcional) ou "zlib"
+TEXT_STORE_COMPRESSION = os.getenv("TEXT_STORE_COMPRESSION", "").lower()
+TEXT_STORE_MIN_COMPRESS_BYTES = int(os.getenv("TEXT_STORE_MIN_COMPRESS_BYTES", "256"))
+TEXT_CACHE_MAX = int(os.getenv("TEXT_CACHE_MAX", "4096"))
+TEXT_FETCH_BATCH = 200
+PREVIEW_CHARS = 150
+
+
+def text_hash(texto):
+    """Endereço do texto: sha256 (hex) do UTF-8; None para texto ausente"""
+    if texto is None:
+        return None
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def encode_text(texto, compression=TEXT_STORE_COMPRESSION):
+    """(encoding, content): textos pequenos ou sem compressor disponível ficam como estão"""
+    bruto = texto.encode("utf-8")
+    if not compression or len(bruto) < TEXT_STORE_MIN_COMPRESS_BYTES:
+        return "raw", texto
+
+    if compression == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            return "raw", texto
+        comprimido = zstandard.ZstdCompressor(level=10).compress(bruto)
+    elif compression == "zlib":
+        comprimido = zlib.compress(bruto, 9)
+    else:
+        return "raw", texto
+
+    # Não compensa (texto curto ou já muito variado): guarda puro
+    if len(comprimido) * 4 // 3 >= len(bruto):
+        return "raw", texto
+    # Base64 para caber numa coluna text (PostgREST/JSON)
+    return compression, base64.b64encode(comprimido).decode("ascii")
+
+
+def decode_text(encoding, content):
+    if content is None or encoding in (None, "raw"):
+        return content
+    comprimido = base64.b64decode(content)
+    if encoding == "zlib":
+        return zlib.decompress(comprimido).decode("utf-8")
+    if encoding == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("texto comprimido com zstd, mas o pacote zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(comprimido).decode("utf-8")
+    raise ValueError(f"encoding de texto desconhecido: {encoding}")
+
+
+class TextStore:
+    """
+    Textos das gerações endereçados pelo conteúdo (tabela texts): cada texto distinto
+    é gravado uma vez e os logs guardam só o hash.
+    fetch(hashes) devolve as linhas {'hash', 'encoding', 'content'} do banco; os textos
+    resolvidos ficam num LRU do processo (o conteúdo de um hash nunca muda).
+    """
+
+    def __init__(self, fetch, max_entries=TEXT_CACHE_MAX, compression=TEXT_STORE_COMPRESSION):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.compression = compression
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"written": 0, "deduplicated": 0, "bytes_raw": 0, "bytes_stored": 0, "hits": 0, "fetched": 0}
+
+    def _remember(self, chave, texto):
+        self._cache[chave] = texto
+        self._cache.move_to_end(chave)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def prepare(self, texto):
+        """
+        (hash, linha): linha é o registro da tabela texts a gravar, ou None se este processo
+        já gravou/leu o mesmo texto (no banco o insert também ignora hashes repetidos).
+        """
+        chave = text_hash(texto)
+        if chave is None:
+            return None, None
+
+        with self._lock:
+            if chave in self._cache:
+                self._cache.move_to_end(chave)
+                self._stats["deduplicated"] += 1
+                return chave, None
+            self._remember(chave, texto)
+
+        encoding, content = encode_text(texto, self.compression)
+        tamanho = len(texto.encode("utf-8"))
+        with self._lock:
+            self._stats["written"] += 1
+            self._stats["bytes_raw"] += tamanho
+            self._stats["bytes_stored"] += len(content.encode("utf-8"))
+        return chave, {"hash": chave, "encoding": encoding, "content": content, "size_bytes": tamanho}
+
+    def discard(self, linha):
+        """A linha de prepare não foi gravada (fila cheia): o hash sai do LRU e volta a ser gravado na próxima vez"""
+        with self._lock:
+            self._cache.pop(linha["hash"], None)
+            self._stats["written"] -= 1
+            self._stats["bytes_raw"] -= linha["size_bytes"]
+            self._stats["bytes_stored"] -= len(linha["content"].encode("utf-8"))
+
+    def resolve(self, hashes):
+        """{hash: texto} dos hashes pedidos; os que faltam no LRU vêm numa única consulta"""
+        resultado, faltando = {}, []
+        with self._lock:
+            for chave in dict.fromkeys(h for h in hashes if h):
+                if chave in self._cache:
+                    self._cache.move_to_end(chave)
+                    resultado[chave] = self._cache[chave]
+                    self._stats["hits"] += 1
+                else:
+                    faltando.append(chave)
+
+        for inicio in range(0, len(faltando), TEXT_FETCH_BATCH):
+            # Lotes limitados: tamanho da URL no PostgREST e de parâmetros no SQLite
+            linhas = self.fetch(faltando[inicio:inicio + TEXT_FETCH_BATCH])
+            with self._lock:
+                self._stats["fetched"] += len(linhas)
+                for linha in linhas:
+                    texto = decode_text(linha["encoding"], linha["content"])
+                    resultado[linha["hash"]] = texto
+                    self._remember(linha["hash"], texto)
+        return resultado
+
+    def resolve_rows(self, rows):
+        """Preenche input_text/output_text das linhas de log a partir de input_hash/output_hash"""
+        textos = self.resolve([h for row in rows for h in (row.get("input_hash"), row.get("output_hash"))])
+        for row in rows:
+            row["input_text"] = textos.get(row.get("input_hash"))
+            row["output_text"] = textos.get(row.get("output_hash"))
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "cached": len(self._cache)}